@@ -2,7 +2,7 @@
 import io
 import os
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 
 import streamlit as st
 
@@ -12,7 +12,7 @@ from src.config import (
     REPORTS_DIR, GRADED_COPIES_DIR
 )
 from src.grader.grade_evaluator import GradeEvaluator
-from src.utils.read_any import read_text_any
+from src.utils.read_any import read_text_any, read_text_many
 from src.reporting import (
     generate_markdown_report, generate_json_report,
     save_report_markdown, save_report_json,
@@ -40,29 +40,47 @@ def list_files(folder: Path, exts={".pdf", ".txt", ".md", ".json"}) -> List[Path
 def get_evaluator() -> GradeEvaluator:
     return GradeEvaluator()
 
+def index_uploaded_file(saved: Path, file, tag: str):
+    # Streamlit reruns the script on every interaction; only index each upload once.
+    seen = st.session_state.setdefault("indexed_uploads", set())
+    upload_key = (tag, file.file_id)
+    if upload_key in seen:
+        return
+    get_evaluator().add_file(str(saved), tag=tag)
+    seen.add(upload_key)
+
 def grade_single_submission(
     sub_path: Path,
     rubric_name: str,
     question_name: str,
+    student_text: str | None = None,
+    on_partial: Optional[Callable[[Dict], None]] = None,
 ):
     grader = get_evaluator()
 
-    student_text = read_text_any(str(sub_path))
+    if student_text is None:
+        student_text = read_text_any(str(sub_path))
 
     submission_meta = {
         "student_name": sub_path.stem,  # adjust if you parse names differently
         "filename": sub_path.name,
         "submitted_at": None,
         "rubric_text": "",
-        "student_text": student_text
+        "student_text": student_text,
+        "prompt_budget": out.get("budget"),
     }
 
-    out = grader.grade(
+    # Stream the model's JSON so scores can be shown before the feedback is finished.
+    for event in grader.grade_stream(
         student_text,
         assignment_hint=f"Use rubric {rubric_name} and question {question_name}",
         rubric_allowlist=[rubric_name],
         question_allowlist=[question_name],
-    )
+    ):
+        if "partial" not in event:
+            out = event
+        elif on_partial is not None:
+            on_partial(partial_view(event["partial"]))
 
     # Build GradeResult for reporting
     retrieved_lines = []
@@ -107,6 +125,23 @@ def grade_single_submission(
         "md": md_path,
         "graded_copy": graded_out,
         "retrieved": out["retrieved"],
+        "criteria": out["result"].get("criteria", []),
+        "ttfs_s": out["timings"]["ttfs_s"],
+    }
+
+def partial_view(partial: Dict) -> Dict:
+    """Shapes the fields streamed so far like a finished result, for progressive rendering."""
+    score = partial.get("total_score")
+    try:
+        score = float(max(0.0, min(100.0, float(score)))) if score is not None else None
+    except (TypeError, ValueError):
+        score = None
+    return {
+        "score": score,
+        "letter": None,  # assigned once the final score is clamped and normalized
+        "feedback": partial.get("overall_feedback"),
+        "criteria": [c for c in partial.get("criteria") or [] if isinstance(c, dict)],
+        "pending": True,
     }
 
 # ---------- Sidebar: Uploads ----------
@@ -117,12 +152,14 @@ with st.sidebar:
     r_file = st.file_uploader("Upload rubric", type=["pdf", "txt", "md", "json"], key="rubric_up")
     if r_file is not None:
         saved = save_uploaded_file(Path(RUBRICS_DIR), r_file)
+        index_uploaded_file(saved, r_file, tag="rubric")
         st.success(f"Rubric saved: {saved.name}")
 
     st.subheader("Question")
     q_file = st.file_uploader("Upload question", type=["pdf", "txt", "md"], key="question_up")
     if q_file is not None:
         saved = save_uploaded_file(Path(QUESTIONS_DIR), q_file)
+        index_uploaded_file(saved, q_file, tag="question")
         st.success(f"Question saved: {saved.name}")
 
     st.subheader("Student Submissions")
@@ -170,11 +207,22 @@ if sub_files:
     )
 
 def render_result_row(fname: str, result: Dict):
-    st.markdown(f"### {fname}")
+    """Renders a finished result, or a partial one (result["pending"]) while the model is still streaming."""
+    pending = result.get("pending", False)
+    st.markdown(f"### {fname}" + (" — grading…" if pending else ""))
     cols = st.columns([0.8, 0.6, 2.0])
     with cols[0]:
-        st.metric("Score", f"{result['score']:.1f}" if result['score'] is not None else "N/A")
-        st.write(f"**Grade:** {result['letter'] or 'N/A'}")
+        st.metric("Score", f"{result['score']:.1f}" if result['score'] is not None else ("…" if pending else "N/A"))
+        st.write(f"**Grade:** {result['letter'] or ('…' if pending else 'N/A')}")
+        if result.get("ttfs_s") is not None:
+            st.caption(f"First score after {result['ttfs_s']:.1f}s")
+    if pending:
+        with cols[2]:
+            for c in result.get("criteria", []):
+                st.write(f"- **{c.get('name', '?')}**: {c.get('score', '?')}")
+            if result.get("feedback"):
+                st.write(result["feedback"])
+        return
     with cols[1]:
         if result.get("json"):
             st.download_button("Download JSON", data=Path(result["json"]).read_bytes(), file_name=Path(result["json"]).name, mime="application/json")
@@ -206,14 +254,36 @@ def do_grading_for_paths(paths: List[Path]):
         return
 
     with st.spinner("Grading in progress..."):
-        for p in paths:
+        texts = read_text_many([str(p) for p in paths])
+        for p, text in zip(paths, texts):
+            with results_section:
+                slot = st.empty()
+
+            def show(result: Dict, slot=slot, name=p.name):
+                with slot.container():
+                    render_result_row(name, result)
+
             res = grade_single_submission(
                 sub_path=p,
                 rubric_name=rubric_sel,
                 question_name=question_sel,
+                student_text=text,
+                on_partial=show,
             )
-            with results_section:
-                render_result_row(p.name, res)
+            show(res)
+
+    stats = get_evaluator().stats()
+    rc = stats["retrieval_cache"]
+    st.caption(f"Retrieval cache: {rc['hits']} hits / {rc['misses']} misses")
+    lc = stats["llm_cache"]
+    if lc:
+        st.caption(f"LLM response cache: {lc['hits']} hits / {lc['misses']} misses ({lc['hit_rate']:.0%})")
+    so = stats["structured_output"]
+    if so["invalid"] or so["parse_failures"]:
+        st.caption(f"Invalid model replies: {so['failure_rate']:.0%}, repaired {so['repaired']}/{so['repairs']}")
+    sc = stats["streaming"]
+    if sc["count"]:
+        st.caption(f"Average time to first score: {sc['ttfs_avg_s']:.1f}s over {sc['count']} submission(s)")
 
 # Auto-grade immediately for newly uploaded files (if option checked)
 if auto_grade and st.session_state.get("newly_uploaded_submissions") and rubric_sel and question_sel:
@@ -0,0 +1,213 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .pipeline import Pipeline, Stage
+from .rag.ingest_cache import file_digest
+from .utils.read_any import read_text_any
+
+BATCH_STATE_VERSION = 1
+
+PENDING, IN_FLIGHT, DONE, FAILED, DEAD = "pending", "in_flight", "done", "failed", "dead"
+
+
+class BatchState:
+    """
+    Per-submission progress of a batch run, keyed by the submission's content hash and kept in
+    one JSON file (rewritten atomically on every transition). A restart skips DONE items,
+    retries FAILED ones until they have used `max_attempts`, and leaves DEAD ones (the
+    dead-letter list) alone. Items left IN_FLIGHT by a crash count as pending again.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = Path(path)
+        self.max_attempts = max(1, max_attempts)
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()  # marks arrive from the event loop and from writer threads
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == BATCH_STATE_VERSION:
+                self.items = data.get("items", {})
+        except (OSError, ValueError):
+            pass
+        for item in self.items.values():
+            if item["status"] == IN_FLIGHT:
+                item["status"] = PENDING
+
+    def todo(self, paths: List[str]) -> List[Tuple[str, str]]:
+        """(path, digest) of the submissions that still need grading, in input order."""
+        out = []
+        for p in paths:
+            digest = file_digest(p)
+            item = self.items.setdefault(digest, {"filename": Path(p).name, "status": PENDING, "attempts": 0})
+            item["filename"] = Path(p).name
+            if item["status"] == FAILED and item["attempts"] >= self.max_attempts:
+                item["status"] = DEAD
+            if item["status"] in (PENDING, FAILED):
+                out.append((p, digest))
+        self.save()
+        return out
+
+    def mark(self, digest: str, status: str, **fields) -> None:
+        with self._lock:
+            item = self.items[digest]
+            item.update(fields, status=status, updated=time.time())
+            if status == FAILED and item["attempts"] >= self.max_attempts:
+                item["status"] = DEAD
+            self.save()
+
+    def status(self, digest: str) -> str:
+        return self.items[digest]["status"]
+
+    def dead_letters(self) -> List[Dict[str, Any]]:
+        return [{"digest": d, **item} for d, item in self.items.items() if item["status"] == DEAD]
+
+    def counts(self) -> Dict[str, int]:
+        out = {s: 0 for s in (PENDING, IN_FLIGHT, DONE, FAILED, DEAD)}
+        for item in self.items.values():
+            out[item["status"]] += 1
+        return out
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": BATCH_STATE_VERSION, "items": self.items}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+
+class Throughput:
+    """Completed-items rate and ETA since the run started."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta_s(self) -> Optional[float]:
+        rate = self.rate()
+        return (self.total - self.done) / rate if rate > 0 else None
+
+    def line(self) -> str:
+        eta = self.eta_s()
+        eta_txt = f"{int(eta // 60)}m{int(eta % 60):02d}s" if eta is not None else "--"
+        return (f"{self.done}/{self.total} graded, {self.failed} failed attempts, "
+                f"{self.rate() * 60:.1f}/min, ETA {eta_txt}")
+
+
+def extract_item(item: Tuple[str, str]) -> Tuple[str, str, Optional[str], Optional[str]]:
+    """
+    (path, digest) -> (path, digest, text, error). Runs in a worker process, so a file that
+    cannot be read comes back as an error string for the grade stage to record.
+    """
+    path, digest = item
+    try:
+        return path, digest, read_text_any(path), None
+    except Exception as e:
+        return path, digest, None, f"{type(e).__name__}: {e}"
+
+
+def tracked_stages(
+    state: BatchState,
+    grade: Callable[[str], Any],
+    on_result: Callable[[str, str, Dict[str, Any]], Any],
+    on_event: Callable[[str, str, str], None],
+    workers: int = 4,
+    write_workers: int = 2,
+    extract_workers: int = 1,
+) -> List[Stage]:
+    """
+    Pipeline stages over (path, digest) items that record every transition in `state`: text
+    extraction on `extract_workers` processes, `grade(text)` (awaitable, returns a grade() dict)
+    on `workers` async workers, then `on_result(path, text, out)` (writes the outputs) on
+    `write_workers` threads, so report writing never holds up an LLM slot. An unreadable file
+    uses up an attempt like a failed grade. `on_event(path, digest, status)` follows each DONE
+    or FAILED mark (the state says whether a failure was final).
+    """
+    def mark(path: str, digest: str, status: str, **fields) -> None:
+        state.mark(digest, status, **fields)
+        if status != IN_FLIGHT:
+            on_event(path, digest, status)
+
+    async def grade_stage(item):
+        path, digest, text, error = item
+        mark(path, digest, IN_FLIGHT, attempts=state.items[digest]["attempts"] + 1)
+        try:
+            if error is not None:
+                raise ValueError(f"could not extract text: {error}")
+            return path, digest, text, await grade(text)
+        except Exception as e:
+            mark(path, digest, FAILED, error=f"{type(e).__name__}: {e}")
+            raise
+
+    def write_stage(item):
+        path, digest, text, out = item
+        try:
+            written = on_result(path, text, out)
+        except Exception as e:
+            mark(path, digest, FAILED, error=f"{type(e).__name__}: {e}")
+            raise
+        mark(path, digest, DONE, error=None, report=str(written) if written else None)
+        return path, digest
+
+    return [
+        Stage("extract", extract_item, workers=extract_workers, kind="process"),
+        Stage("grade", grade_stage, workers=workers, kind="async"),
+        Stage("write", write_stage, workers=write_workers, kind="thread"),
+    ]
+
+
+async def run_batch(
+    state: BatchState,
+    todo: List[Tuple[str, str]],
+    grade: Callable[[str], Any],
+    on_result: Callable[[str, str, Dict[str, Any]], Any],
+    workers: int = 4,
+    progress: Optional[Callable[[Throughput], None]] = None,
+    write_workers: int = 2,
+    extract_workers: int = 1,
+) -> Throughput:
+    """
+    Grades (path, digest) items (see BatchState.todo) through the tracked_stages pipeline.
+    Failed items, unreadable files included, are re-run in later rounds until the state's
+    attempt cap sends them to the dead-letter list. Per-stage stats end up in the returned
+    meter's `stages`.
+    """
+    meter = Throughput(len(todo))
+    lock = threading.Lock()
+
+    def on_event(path: str, digest: str, status: str) -> None:
+        with lock:
+            if status == DONE:
+                meter.done += 1
+            else:
+                meter.failed += 1
+                if state.status(digest) == DEAD:
+                    meter.total -= 1  # dead-lettered: no longer counts towards the ETA
+            if progress is not None:
+                progress(meter)
+
+    pipeline = Pipeline(tracked_stages(state, grade, on_result, on_event, workers, write_workers, extract_workers))
+    while todo:
+        await pipeline.run(todo)
+        todo = [item for item in todo if state.status(item[1]) == FAILED]
+    meter.stages = pipeline.stats()
+    return meter
+
+
+def print_progress(meter: Throughput) -> None:
+    if sys.stderr.isatty():
+        print("\r" + meter.line(), end="", file=sys.stderr, flush=True)
+    else:
+        print(meter.line(), file=sys.stderr, flush=True)
@@ -19,13 +19,67 @@ STUDENT_SUBMISSIONS_DIR = os.path.join(BASE_DATA_DIR, "student_submission")
 # --- RAG ---
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1200"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_BOUNDARY = os.getenv("CHUNK_BOUNDARY", "").strip().lower()  # "" (fixed windows) | sentence | paragraph
 TOP_K = int(os.getenv("TOP_K", "6"))
+RETRIEVER_ENGINE = os.getenv("RETRIEVER_ENGINE", "tfidf").strip().lower()  # tfidf | bm25
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))  # 0 = one per CPU core, 1 = serial
+INGEST_CACHE_DIR = os.getenv("INGEST_CACHE_DIR", os.path.join(BASE_DATA_DIR, "cache", "ingest")).strip()  # empty disables
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))  # 0 disables
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", os.path.join(BASE_DATA_DIR, "cache", "manifest.json")).strip()  # empty disables
+RUBRIC_CACHE_DIR = os.getenv("RUBRIC_CACHE_DIR", os.path.join(BASE_DATA_DIR, "cache", "rubrics")).strip()  # empty disables
+TFIDF_INDEX_DIR = os.getenv("TFIDF_INDEX_DIR", os.path.join(BASE_DATA_DIR, "index", "tfidf")).strip()  # empty disables
 
 # --- Grading ---
 DEFAULT_RUBRIC_NAME = os.getenv("DEFAULT_RUBRIC_NAME", "rubric.pdf")
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.0"))
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "1200"))
 TIMEOUT_S = int(os.getenv("TIMEOUT_S", "60"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))  # estimated prompt tokens per call (context window minus MAX_TOKENS), 0 = unbounded
+CONTEXT_TOKEN_SHARE = float(os.getenv("CONTEXT_TOKEN_SHARE", "0.35"))  # share of the budget left after the rubric for references
+GRADING_MODE = os.getenv("GRADING_MODE", "single").strip().lower()  # single | per_criterion (needs a parseable rubric)
+CRITERION_MAX_TOKENS = int(os.getenv("CRITERION_MAX_TOKENS", "400"))  # completion cap per criterion call
+CRITERION_PASSAGES = int(os.getenv("CRITERION_PASSAGES", "3"))  # submission passages sent per criterion
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "json_schema").strip().lower()  # json_schema | json_object | off
+REPAIR_MAX_TOKENS = int(os.getenv("REPAIR_MAX_TOKENS", "300"))  # completion cap of a field-repair call, 0 = no repair
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))  # grading calls in flight at once
+GROQ_RPM = int(os.getenv("GROQ_RPM", "0"))  # requests/minute cap, 0 = none (opt in with your plan's limit, e.g. 30 on Groq's free tier)
+GROQ_TPM = int(os.getenv("GROQ_TPM", "0"))  # tokens/minute cap (prompt + max_tokens), 0 = adopt the provider's x-ratelimit headers
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "").strip()  # JSON list of OpenAI-compatible endpoints; empty = Groq only
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1").strip() not in ("0", "false", "no")  # duplicate calls that outlive their p95
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_DATA_DIR, "cache", "llm.sqlite")).strip()  # empty disables
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "0"))  # 0 = entries never expire
+
+# --- Batch mode (main.py --batch) ---
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(LLM_CONCURRENCY)))  # submissions graded at once
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))  # attempts before a submission is dead-lettered
+BATCH_STATE_DIR = os.getenv("BATCH_STATE_DIR", os.path.join(BASE_DATA_DIR, "batch"))
+
+# --- Stage pipeline (main.py): workers per stage ---
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))  # processes parsing submission PDFs
+WRITE_WORKERS = int(os.getenv("WRITE_WORKERS", "2"))      # threads writing JSON/markdown reports
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))    # processes rendering graded copies
+
+# --- Watch mode (main.py --watch) ---
+WATCH_DEBOUNCE_S = float(os.getenv("WATCH_DEBOUNCE_S", "2.0"))  # a file must sit unchanged this long before grading
+WATCH_QUEUE_SIZE = int(os.getenv("WATCH_QUEUE_SIZE", "8"))      # settled files waiting for the pipeline; intake pauses when full
+
+# --- Shared job queue (python -m src.worker) ---
+JOBS_LEASE_S = float(os.getenv("JOBS_LEASE_S", "120"))    # a claimed job returns to the queue if its worker goes quiet this long
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))  # claims per job before it is marked dead
+JOBS_RETRY_S = float(os.getenv("JOBS_RETRY_S", "30"))        # a failed job waits this long (doubling per attempt) before a retry
+JOBS_POLL_S = float(os.getenv("JOBS_POLL_S", "0"))          # idle workers re-check this often; 0 = exit once the queue is drained
+
+# --- Grading server (python -m src.server) ---
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8765"))
+SERVER_SOCKET = os.getenv("SERVER_SOCKET", "").strip()  # Unix socket path; empty = listen on SERVER_HOST:SERVER_PORT
+SERVER_TIMEOUT_S = float(os.getenv("SERVER_TIMEOUT_S", "300"))  # client wait for one grade reply
+SERVER_UPLOADS_DIR = os.getenv("SERVER_UPLOADS_DIR", os.path.join(BASE_DATA_DIR, "uploads"))  # uploaded texts kept for their reports
+SERVER_SUBMISSIONS_DIR = os.getenv("SERVER_SUBMISSIONS_DIR", STUDENT_SUBMISSIONS_DIR).strip()  # grade requests may name paths only under here; empty = text uploads only
 
 # --- Reports ---
 REPORTS_DIR = Path(os.getenv("REPORTS_DIR", "data/reports"))
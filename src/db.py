@@ -1,7 +1,8 @@
 from __future__ import annotations
 import sqlite3
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 DB_PATH = Path("data/grades/autograder.db")
@@ -30,24 +31,55 @@ CREATE TABLE IF NOT EXISTS grades (
     report_path TEXT,
     created_at TEXT
 );
+
+-- Work queue shared by grading workers (src/worker.py). A job is one submission graded
+-- against one rubric/question pair; claiming takes a lease that the worker renews while it
+-- grades, so the job of a crashed worker becomes claimable again once the lease runs out.
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    rubric TEXT NOT NULL,
+    question TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_by TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL,
+    last_error TEXT,
+    submission_id INTEGER REFERENCES submissions(id),
+    created_at TEXT,
+    updated_at TEXT,
+    UNIQUE(digest, rubric, question)
+);
+
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs(status, lease_expires_at);
 """
 
-def _connect() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    con = sqlite3.connect(DB_PATH)
+JOB_PENDING, JOB_CLAIMED, JOB_DONE, JOB_DEAD = "pending", "claimed", "done", "dead"
+
+def _connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    path = Path(db_path or DB_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Workers contend for the jobs table; wait for the write lock instead of failing fast.
+    con = sqlite3.connect(path, timeout=30)
     con.execute("PRAGMA foreign_keys=ON;")
     return con
 
-def init_db() -> None:
-    con = _connect()
+def init_db(db_path: Optional[Path] = None) -> None:
+    con = _connect(db_path)
     try:
         con.executescript(SCHEMA_SQL)
+        columns = {row[1] for row in con.execute("PRAGMA table_info(jobs)")}
+        if "not_before" not in columns:  # queues created before retry backoff
+            con.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
         con.commit()
     finally:
         con.close()
 
-def insert_submission(student_name: str, filename: str, file_path: str, student_text: str, rubric_text: str) -> int:
-    con = _connect()
+def insert_submission(student_name: str, filename: str, file_path: str, student_text: str, rubric_text: str,
+                      db_path: Optional[Path] = None) -> int:
+    con = _connect(db_path)
     try:
         cur = con.execute(
             "INSERT INTO submissions(student_name, filename, file_path, student_text, rubric_text, submitted_at) VALUES (?,?,?,?,?,?)",
@@ -58,8 +90,9 @@ def insert_submission(student_name: str, filename: str, file_path: str, student_
     finally:
         con.close()
 
-def insert_grade(submission_id: int, score: float, letter: str, feedback: str, evidence: str, report_path: str) -> int:
-    con = _connect()
+def insert_grade(submission_id: int, score: float, letter: str, feedback: str, evidence: str, report_path: str,
+                 db_path: Optional[Path] = None) -> int:
+    con = _connect(db_path)
     try:
         cur = con.execute(
             "INSERT INTO grades(submission_id, score, letter, feedback, evidence, report_path, created_at) VALUES (?,?,?,?,?,?,?)",
@@ -98,3 +131,145 @@ def get_submission(submission_id: int) -> Optional[Dict[str, Any]]:
         return dict(zip(cols, row))
     finally:
         con.close()
+
+def enqueue_jobs(files: List[Tuple[str, str]], rubric: str, question: str, db_path: Optional[Path] = None) -> int:
+    """Queues (file_path, content digest) pairs; content already queued for this pair is skipped. Returns the number added."""
+    now = datetime.utcnow().isoformat()
+    con = _connect(db_path)
+    try:
+        before = con.total_changes
+        con.executemany(
+            "INSERT OR IGNORE INTO jobs(digest, file_path, rubric, question, created_at, updated_at) VALUES (?,?,?,?,?,?)",
+            [(digest, path, rubric, question, now, now) for path, digest in files],
+        )
+        con.commit()
+        return con.total_changes - before
+    finally:
+        con.close()
+
+def claim_job(worker_id: str, lease_s: float, max_attempts: int = 3, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    Atomically leases the oldest claimable job to `worker_id`: a pending one whose retry delay
+    (not_before) has passed, or a claimed one whose lease has expired (its worker died). Expired
+    jobs that already used `max_attempts` are marked dead instead. Returns the job row, or None
+    when nothing is claimable.
+    """
+    now = time.time()
+    con = _connect(db_path)
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        con.execute(
+            "UPDATE jobs SET status=?, last_error='lease expired', updated_at=? "
+            "WHERE status=? AND lease_expires_at < ? AND attempts >= ?",
+            (JOB_DEAD, datetime.utcnow().isoformat(), JOB_CLAIMED, now, max_attempts),
+        )
+        cur = con.execute(
+            "SELECT * FROM jobs WHERE (status=? AND (not_before IS NULL OR not_before <= ?)) "
+            "OR (status=? AND lease_expires_at < ?) ORDER BY id LIMIT 1",
+            (JOB_PENDING, now, JOB_CLAIMED, now),
+        )
+        row = cur.fetchone()
+        if row is None:
+            con.execute("COMMIT")
+            return None
+        job = dict(zip([d[0] for d in cur.description], row))
+        con.execute(
+            "UPDATE jobs SET status=?, claimed_by=?, lease_expires_at=?, attempts=attempts+1, updated_at=? WHERE id=?",
+            (JOB_CLAIMED, worker_id, now + lease_s, datetime.utcnow().isoformat(), job["id"]),
+        )
+        con.execute("COMMIT")
+        job.update(status=JOB_CLAIMED, claimed_by=worker_id, lease_expires_at=now + lease_s, attempts=job["attempts"] + 1)
+        return job
+    except Exception:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def _update_owned(job_id: int, worker_id: str, sql: str, params: tuple, db_path: Optional[Path]) -> bool:
+    """Runs an UPDATE guarded by ownership; False means the lease was lost to another worker."""
+    con = _connect(db_path)
+    try:
+        cur = con.execute(sql + " WHERE id=? AND claimed_by=? AND status=?", params + (job_id, worker_id, JOB_CLAIMED))
+        con.commit()
+        return cur.rowcount == 1
+    finally:
+        con.close()
+
+def renew_lease(job_id: int, worker_id: str, lease_s: float, db_path: Optional[Path] = None) -> bool:
+    return _update_owned(job_id, worker_id, "UPDATE jobs SET lease_expires_at=?",
+                         (time.time() + lease_s,), db_path)
+
+def complete_job(job_id: int, worker_id: str, submission_id: Optional[int] = None,
+                 db_path: Optional[Path] = None) -> bool:
+    return _update_owned(job_id, worker_id,
+                         "UPDATE jobs SET status=?, submission_id=?, lease_expires_at=NULL, last_error=NULL, updated_at=?",
+                         (JOB_DONE, submission_id, datetime.utcnow().isoformat()), db_path)
+
+def record_job_grade(job_id: int, worker_id: str, submission: Dict[str, Any], grade: Dict[str, Any],
+                     db_path: Optional[Path] = None) -> Optional[int]:
+    """
+    Completes the job and stores its submission and grade rows in one transaction, but only while
+    `worker_id` still holds the lease; a worker that lost it writes nothing. `submission` and
+    `grade` hold the insert_submission / insert_grade arguments. Returns the submission id, or
+    None when the lease was lost.
+    """
+    now = datetime.utcnow().isoformat()
+    con = _connect(db_path)
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        cur = con.execute("UPDATE jobs SET status=?, lease_expires_at=NULL, last_error=NULL, updated_at=? "
+                          "WHERE id=? AND claimed_by=? AND status=?", (JOB_DONE, now, job_id, worker_id, JOB_CLAIMED))
+        if cur.rowcount != 1:
+            con.execute("ROLLBACK")
+            return None
+        cur = con.execute(
+            "INSERT INTO submissions(student_name, filename, file_path, student_text, rubric_text, submitted_at) VALUES (?,?,?,?,?,?)",
+            (submission["student_name"], submission["filename"], submission["file_path"],
+             submission["student_text"], submission["rubric_text"], now),
+        )
+        submission_id = int(cur.lastrowid)
+        con.execute(
+            "INSERT INTO grades(submission_id, score, letter, feedback, evidence, report_path, created_at) VALUES (?,?,?,?,?,?,?)",
+            (submission_id, grade["score"], grade["letter"], grade["feedback"], grade["evidence"],
+             grade["report_path"], now),
+        )
+        con.execute("UPDATE jobs SET submission_id=? WHERE id=?", (submission_id, job_id))
+        con.execute("COMMIT")
+        return submission_id
+    except Exception:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def fail_job(job_id: int, worker_id: str, error: str, max_attempts: int = 3, db_path: Optional[Path] = None,
+             retry_after_s: float = 0.0) -> bool:
+    """Releases the job for another try after `retry_after_s`, or marks it dead once it has used `max_attempts`."""
+    return _update_owned(job_id, worker_id,
+                         "UPDATE jobs SET status=CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                         "lease_expires_at=NULL, not_before=?, last_error=?, updated_at=?",
+                         (max_attempts, JOB_DEAD, JOB_PENDING, time.time() + retry_after_s, error,
+                          datetime.utcnow().isoformat()), db_path)
+
+def next_retry_at(db_path: Optional[Path] = None) -> Optional[float]:
+    """When the earliest pending job that is waiting out a retry delay becomes claimable (epoch seconds)."""
+    con = _connect(db_path)
+    try:
+        return con.execute("SELECT MIN(not_before) FROM jobs WHERE status=? AND not_before > ?",
+                           (JOB_PENDING, time.time())).fetchone()[0]
+    finally:
+        con.close()
+
+def job_counts(db_path: Optional[Path] = None) -> Dict[str, int]:
+    con = _connect(db_path)
+    try:
+        counts = {s: 0 for s in (JOB_PENDING, JOB_CLAIMED, JOB_DONE, JOB_DEAD)}
+        counts.update(dict(con.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()))
+        return counts
+    finally:
+        con.close()
@@ -0,0 +1,75 @@
+from typing import Any, Dict, List
+
+from ..rag.retriever_bm25 import BM25Retriever
+from ..rag.text_utils import clean, iter_chunk_spans
+from .prompt_templates import PROMPT_CRITERION_HEADER, PROMPT_CRITERION_BLOCK
+from .rubric_parser import CompiledRubric, Criterion
+
+PASSAGE_SIZE = 700
+PASSAGE_OVERLAP = 100
+
+
+def _criterion_query(c: Criterion) -> str:
+    return " ".join([c.name, *c.descriptors])
+
+
+def submission_passages(text: str, rubric: CompiledRubric, k: int) -> List[List[str]]:
+    """
+    The `k` submission passages most relevant to each criterion (BM25 over overlapping windows),
+    in document order. A submission that fits in `k` windows is passed whole to every criterion.
+    """
+    text = clean(text)
+    spans = list(iter_chunk_spans(text, PASSAGE_SIZE, PASSAGE_OVERLAP))
+    if len(spans) <= k:
+        return [[text] for _ in rubric.criteria]
+    docs = [{"id": str(i), "text": text[s:e], "meta": {"path": "submission", "type": "submission"}}
+            for i, (s, e) in enumerate(spans)]
+    bm25 = BM25Retriever(docs)
+    found = bm25.search_many([_criterion_query(c) for c in rubric.criteria], k=k)
+    out = []
+    for hits in found:
+        picked = sorted(int(d["id"]) for score, d in hits if score > 0)
+        # No lexical overlap at all: show the opening of the submission rather than nothing.
+        out.append([docs[i]["text"] for i in (picked or range(k))])
+    return out
+
+
+def criterion_messages(c: Criterion, passages: List[str], ctx_block: str) -> List[Dict[str, str]]:
+    descriptors = "\n".join(f"- {d}" for d in c.descriptors) or "- (no descriptors given)"
+    user = PROMPT_CRITERION_BLOCK.format(
+        context=ctx_block,
+        name=c.name,
+        descriptors=descriptors,
+        passages="\n[...]\n".join(passages),
+    )
+    return [{"role": "system", "content": PROMPT_CRITERION_HEADER}, {"role": "user", "content": user}]
+
+
+def merge_criterion_results(rubric: CompiledRubric, parsed: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Folds per-criterion replies into the single-call result shape; total_score is the
+    rubric-weighted mean, computed here rather than by the model.
+    """
+    criteria, improvable, feedback = [], [], []
+    total = 0.0
+    for c, res in zip(rubric.criteria, parsed):
+        try:
+            score = float(max(0.0, min(100.0, float(res.get("score", 0.0)))))
+        except (TypeError, ValueError):
+            score = 0.0
+        rationale = str(res.get("rationale") or "")
+        criteria.append({"name": c.name, "score": score, "weight": c.weight, "rationale": rationale})
+        total += score * c.weight / 100.0
+        for s in res.get("improvable_sections") or []:
+            if s not in improvable:
+                improvable.append(s)
+        if rationale:
+            feedback.append(f"{c.name}: {rationale}")
+    flags = sorted({f for res in parsed for f in res.get("plagiarism_or_policy_flags") or []})
+    return {
+        "total_score": round(total, 2),
+        "criteria": criteria,
+        "overall_feedback": "\n".join(feedback),
+        "improvable_sections": improvable,
+        "plagiarism_or_policy_flags": flags,
+    }
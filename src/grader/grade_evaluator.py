@@ -1,18 +1,43 @@
 # src/grader/grade_evaluator.py
-import json
-from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 from dataclasses import dataclass, field
 
 from ..config import (
     RUBRICS_DIR, QUESTIONS_DIR, SOLUTIONS_DIR,
-    CHUNK_SIZE, CHUNK_OVERLAP, TOP_K,
-    GROQ_MODEL, TEMPERATURE, MAX_TOKENS, DEFAULT_RUBRIC_NAME
+    CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_BOUNDARY, TOP_K, INGEST_CACHE_DIR, PDF_WORKERS, TFIDF_INDEX_DIR,
+    RETRIEVAL_CACHE_SIZE, RETRIEVER_ENGINE, BM25_K1, BM25_B, MANIFEST_PATH,
+    GROQ_MODEL, TEMPERATURE, MAX_TOKENS, DEFAULT_RUBRIC_NAME, LLM_ENDPOINTS, LLM_HEDGE, RUBRIC_CACHE_DIR,
+    GRADING_MODE, CRITERION_MAX_TOKENS, CRITERION_PASSAGES, PROMPT_TOKEN_BUDGET, CONTEXT_TOKEN_SHARE,
 )
-from ..rag.ingest import load_corpus
-from ..rag.retriever_tfidf import TfidfRetriever
-from ..llm.groq_client import GroqClient
+from ..rag.ingest import load_corpus, load_file
+from ..rag.context_merge import merge_hits, render_passages
+from ..rag.retrieval_cache import RetrievalCache
+from ..rag.scanner import Manifest
+from ..llm.groq_client import AsyncGroqClient, default_response_cache
+from ..llm.provider_pool import ProviderPool, parse_endpoints
+from ..utils.aio import run_sync
+from .stream_json import IncrementalJSONParser
+from .rubric_parser import CompiledRubric, RubricCompiler
+from .structured_output import CriterionReply, GradingReply, StructuredOutput, load_object
+from .token_budget import BudgetReport, budget_context, budget_prompt
+from .criterion_grading import criterion_messages, merge_criterion_results, submission_passages
 from .prompt_templates import PROMPT_HEADER, PROMPT_CONTEXT_BLOCK, PROMPT_USER_BLOCK
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CallPlan:
+    """The LLM calls one submission needs and how to turn their replies into a grade() dict."""
+    batch: List[List[Dict[str, str]]]
+    max_tokens: Optional[int]
+    reply_model: type
+    finish: Callable[[List[str]], Dict[str, Any]]
+
 
 @dataclass
 class GradeResult:
@@ -36,26 +61,13 @@ def _letter_from_score(score: float) -> str:
 
 
 def build_context_block(hits: List[Tuple[float, Dict[str, Any]]]) -> str:
-    lines = []
-    for score, doc in hits:
-        path = doc.get("meta", {}).get("path", "?")
-        page = doc.get("meta", {}).get("page", None)
-        loc = f"{path}" + (f":p{page}" if page is not None else "")
-        lines.append(f"[score={round(score, 4)}] {loc} :: {doc.get('text', '')}")
-    return "\n---\n".join(lines)
+    # Adjacent chunks overlap by CHUNK_OVERLAP; merge them back so shared text is sent once.
+    return render_passages(merge_hits(hits))
 
 
 def parse_json_safe(s: str) -> Dict[str, Any]:
-    try:
-        return json.loads(s)
-    except json.JSONDecodeError:
-        start = s.find("{")
-        end = s.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            try:
-                return json.loads(s[start:end+1])
-            except Exception:
-                pass
+    data = load_object(s)
+    if data is None:
         return {
             "total_score": 0.0,
             "criteria": [],
@@ -63,15 +75,74 @@ def parse_json_safe(s: str) -> Dict[str, Any]:
             "improvable_sections": [],
             "plagiarism_or_policy_flags": ["JSON_PARSE_ERROR"],
         }
+    return data
+
+
+def build_retriever(corpus: List[Dict[str, Any]], fingerprint: Optional[str] = None):
+    """Retriever selected by RETRIEVER_ENGINE; engines are imported lazily (scikit-learn is slow to import)."""
+    if RETRIEVER_ENGINE == "bm25":
+        from ..rag.retriever_bm25 import BM25Retriever
+        return BM25Retriever(corpus, k1=BM25_K1, b=BM25_B)
+    if RETRIEVER_ENGINE != "tfidf":
+        raise ValueError(f"Unknown RETRIEVER_ENGINE: {RETRIEVER_ENGINE!r} (expected 'tfidf' or 'bm25')")
+    from ..rag.retriever_tfidf import TfidfRetriever
+    if TFIDF_INDEX_DIR:
+        return TfidfRetriever.load_or_build(corpus, TFIDF_INDEX_DIR, fingerprint=fingerprint)
+    return TfidfRetriever(corpus)
+
+
+def build_llm():
+    """A ProviderPool over LLM_ENDPOINTS when configured, else the single Groq client."""
+    endpoints = parse_endpoints(LLM_ENDPOINTS)
+    if endpoints:
+        return ProviderPool.from_endpoints(endpoints, TEMPERATURE, MAX_TOKENS,
+                                           cache=default_response_cache(), hedge=LLM_HEDGE)
+    return AsyncGroqClient(model=GROQ_MODEL, temperature=TEMPERATURE, max_tokens=MAX_TOKENS,
+                           cache=default_response_cache())
 
 
 class GradeEvaluator:
-    def __init__(self):
-        self.corpus: List[Dict[str, Any]] = load_corpus(
-            RUBRICS_DIR, QUESTIONS_DIR, SOLUTIONS_DIR, CHUNK_SIZE, CHUNK_OVERLAP
-        )
-        self.retriever = TfidfRetriever(self.corpus)
-        self.llm = GroqClient(model=GROQ_MODEL, temperature=TEMPERATURE, max_tokens=MAX_TOKENS)
+    def __init__(self, retriever=None, llm=None, rubrics: Optional[RubricCompiler] = None,
+                 structured: Optional[StructuredOutput] = None):
+        """
+        Ingests the knowledge folders and builds the retriever, LLM client and rubric compiler from
+        config. Any of them can be passed in instead (tests, or a host that already holds an index).
+        """
+        if retriever is None:
+            manifest = Manifest(MANIFEST_PATH or None)
+            corpus = load_corpus(
+                RUBRICS_DIR, QUESTIONS_DIR, SOLUTIONS_DIR, CHUNK_SIZE, CHUNK_OVERLAP,
+                cache_dir=INGEST_CACHE_DIR, workers=PDF_WORKERS, boundary=CHUNK_BOUNDARY, manifest=manifest,
+            )
+            fingerprint = manifest.fingerprint(
+                [RUBRICS_DIR, QUESTIONS_DIR, SOLUTIONS_DIR], extra=f"{CHUNK_SIZE}:{CHUNK_OVERLAP}:{CHUNK_BOUNDARY}"
+            )
+            try:
+                manifest.save()
+            except OSError:
+                pass
+            retriever = build_retriever(corpus, fingerprint=fingerprint)
+        self.retriever = retriever
+        self.llm = llm if llm is not None else build_llm()
+        self.retrieval_cache = RetrievalCache(RETRIEVAL_CACHE_SIZE)
+        self.rubrics = rubrics if rubrics is not None else RubricCompiler(RUBRIC_CACHE_DIR or None)
+        self.ttfs: List[float] = []  # streamed time-to-first-score per graded submission
+        self.structured = structured if structured is not None else StructuredOutput()
+
+    def add_file(self, path: str, tag: str) -> int:
+        """
+        Indexes (or re-indexes) one knowledge file in place, e.g. a freshly uploaded rubric.
+        `tag` is the corpus type: "rubric", "question" or "solution".
+        """
+        records = load_file(path, CHUNK_SIZE, CHUNK_OVERLAP, tag, cache_dir=INGEST_CACHE_DIR, boundary=CHUNK_BOUNDARY)
+        return self.retriever.update_documents(f"{tag}/{Path(path).name}", records)
+
+    def remove_file(self, path: str, tag: str) -> int:
+        return self.retriever.remove_documents(f"{tag}/{Path(path).name}")
+
+    @property
+    def corpus(self) -> List[Dict[str, Any]]:
+        return self.retriever.docs
 
     def _retrieve_by_type(
         self,
@@ -80,29 +151,61 @@ class GradeEvaluator:
         question_allow: Optional[List[str]],
         k_each: Tuple[int, int] = (4, 2)
     ) -> List[Tuple[float, Dict[str, Any]]]:
+        return self._retrieve_by_type_many([query], rubric_allow, question_allow, k_each)[0]
+
+    def _retrieve_by_type_many(
+        self,
+        queries: List[str],
+        rubric_allow: Optional[List[str]],
+        question_allow: Optional[List[str]],
+        k_each: Tuple[int, int] = (4, 2)
+    ) -> List[List[Tuple[float, Dict[str, Any]]]]:
+        """Rubric + question hits for many queries with one batched retriever call."""
         r_k, q_k = k_each
+        # A compiled rubric replaces rubric chunks (r_k == 0); skip that search entirely then.
+        groups = [(t, k, allow) for t, k, allow in (("rubric", r_k, rubric_allow), ("question", q_k, question_allow)) if k > 0]
+        filters = [{"type": t, "path_contains": allow} for t, _, allow in groups for _ in queries]
+        found = self.retriever.search_many(list(queries) * len(groups), k=max(r_k, q_k), filters=filters) if groups else []
 
-        def allow(match_list: Optional[List[str]], doc_path: str) -> bool:
-            if not match_list:
-                return True
-            return any(name.lower() in doc_path.lower() for name in match_list)
+        out = []
+        for i, query in enumerate(queries):
+            hits = [h for g, (_, k, _) in enumerate(groups) for h in found[g * len(queries) + i][:k]]
+            if not hits:
+                hits = self.retriever.search(query, k=max(r_k+q_k, TOP_K))
+            out.append(hits)
+        return out
 
-        rubric_hits = self.retriever.search_filtered(
-            query,
-            predicate=lambda d: d.get("meta", {}).get("type") == "rubric"
-                                and allow(rubric_allow, d.get("meta", {}).get("path","")),
-            k=r_k
-        )
-        question_hits = self.retriever.search_filtered(
-            query,
-            predicate=lambda d: d.get("meta", {}).get("type") == "question"
-                                and allow(question_allow, d.get("meta", {}).get("path","")),
-            k=q_k
-        )
-        hits = rubric_hits + question_hits
-        if not hits:
-            hits = self.retriever.search(query, k=max(r_k+q_k, TOP_K))
-        return hits
+    def _context_for(
+        self,
+        query: str,
+        rubric_allow: Optional[List[str]],
+        question_allow: Optional[List[str]],
+        k_each: Tuple[int, int] = (4, 2)
+    ) -> Tuple[List[Tuple[float, Dict[str, Any]]], str]:
+        """
+        Hits plus the rendered context block, memoized per (query, allowlists, k_each, index version).
+        Every submission in a batch shares the same query, so retrieval runs once per batch.
+        """
+        key = RetrievalCache.make_key(query, rubric_allow, question_allow, k_each, self.retriever.version)
+        cached = self.retrieval_cache.get(key)
+        if cached is None:
+            hits = self._retrieve_by_type(query, rubric_allow, question_allow, k_each=k_each)
+            cached = (hits, build_context_block(hits))
+            self.retrieval_cache.put(key, cached)
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        cache = getattr(self.llm, "cache", None)
+        return {
+            "retrieval_cache": self.retrieval_cache.stats(),
+            "llm_cache": cache.stats() if cache is not None else None,
+            "providers": self.llm.stats() if isinstance(self.llm, ProviderPool) else None,
+            "structured_output": self.structured.stats(),
+            "streaming": {
+                "count": len(self.ttfs),
+                "ttfs_avg_s": sum(self.ttfs) / len(self.ttfs) if self.ttfs else None,
+            },
+        }
 
     def to_grade_result(self, model_result: dict, retrieved_paths: List[str]) -> GradeResult:
         score = float(model_result.get("total_score", 0) or 0)
@@ -114,20 +217,47 @@ class GradeEvaluator:
             evidence=retrieved_paths,
         )
 
-    def grade(
+    def compiled_rubric(self, rubric_allowlist: Optional[List[str]]) -> Optional[CompiledRubric]:
+        """The structured rubric when exactly one rubric file is selected and its criteria can be parsed."""
+        if not rubric_allowlist or len(rubric_allowlist) != 1:
+            return None
+        path = Path(RUBRICS_DIR) / rubric_allowlist[0]
+        if not path.is_file():
+            return None
+        return self.rubrics.compile(str(path))
+
+    def _messages(
         self,
         submission_text: str,
-        assignment_hint: Optional[str] = None,
-        rubric_allowlist: Optional[List[str]] = None,
-        question_allowlist: Optional[List[str]] = None,
-    ) -> Dict[str, Any]:
-        """
-        Returns a dict with keys: raw_model_text, result, retrieved
-        """
+        assignment_hint: Optional[str],
+        rubric_allowlist: Optional[List[str]],
+        question_allowlist: Optional[List[str]],
+    ) -> Tuple[List[Dict[str, str]], List[Tuple[float, Dict[str, Any]]], Optional[BudgetReport]]:
         query = assignment_hint or "grading rubric and question and answer key"
-        hits = self._retrieve_by_type(query, rubric_allowlist, question_allowlist, k_each=(4, 2))
+        rubric = self.compiled_rubric(rubric_allowlist)
+        k_each = (0, 2) if rubric is not None else (4, 2)
+        hits, ctx_block = self._context_for(query, rubric_allowlist, question_allowlist, k_each=k_each)
+        rubric_text = rubric.to_prompt() if rubric is not None else "[see rubric chunks above]"
 
-        ctx_block = build_context_block(hits)
+        report = None
+        if PROMPT_TOKEN_BUDGET > 0:
+            fixed = PROMPT_HEADER + PROMPT_CONTEXT_BLOCK.format(context="", rubric=rubric_text) \
+                + PROMPT_USER_BLOCK.format(submission="")
+            # Without a compiled rubric its chunks are the rubric: always sent, never traded for references.
+            pinned = [h for h in hits if rubric is None and h[1].get("meta", {}).get("type") == "rubric"]
+            refs = [h for h in hits if not any(h is p for p in pinned)]
+            # Submission segments are ranked against the rubric (or the rubric chunks when uncompiled).
+            kept, submission_text, report = budget_prompt(
+                fixed, refs, submission_text,
+                rubric_text if rubric is not None else build_context_block(pinned),
+                PROMPT_TOKEN_BUDGET, CONTEXT_TOKEN_SHARE, pinned=pinned,
+            )
+            if len(kept) != len(refs):
+                hits = [h for h in hits if any(h is k for k in pinned + kept)]
+                ctx_block = build_context_block(hits)
+            if report.segments_dropped:
+                logger.warning("Submission cut to fit PROMPT_TOKEN_BUDGET=%d: %d of %d estimated tokens sent",
+                               PROMPT_TOKEN_BUDGET, report.submission_tokens, report.submission_tokens_in)
 
         system_msg = {"role": "system", "content": PROMPT_HEADER}
         user_msg = {
@@ -135,15 +265,81 @@ class GradeEvaluator:
             "content": (
                 PROMPT_CONTEXT_BLOCK.format(
                     context=ctx_block,
-                    rubric="[see rubric chunks above]"
+                    rubric=rubric_text
                 )
                 + "\n\n"
                 + PROMPT_USER_BLOCK.format(submission=submission_text)
             ),
         }
+        return [system_msg, user_msg], hits, report
+
+    def _plan(
+        self,
+        submission_text: str,
+        assignment_hint: Optional[str],
+        rubric_allowlist: Optional[List[str]],
+        question_allowlist: Optional[List[str]],
+    ) -> CallPlan:
+        """
+        GRADING_MODE=per_criterion with a compiled rubric gives one small call per criterion;
+        otherwise a single call.
+        """
+        if GRADING_MODE == "per_criterion":
+            rubric = self.compiled_rubric(rubric_allowlist)
+            if rubric is not None and rubric.criteria:
+                query = assignment_hint or "grading rubric and question and answer key"
+                hits, ctx_block = self._context_for(query, rubric_allowlist, question_allowlist, k_each=(0, 2))
+                report = None
+                if PROMPT_TOKEN_BUDGET > 0:
+                    # Passages are already bounded (CRITERION_PASSAGES windows); only the context needs fitting.
+                    kept, report = budget_context(hits, int(PROMPT_TOKEN_BUDGET * CONTEXT_TOKEN_SHARE))
+                    if report.context_dropped:
+                        hits, ctx_block = kept, build_context_block(kept)
+                passages = submission_passages(submission_text, rubric, k=CRITERION_PASSAGES)
+                batch = [criterion_messages(c, p, ctx_block) for c, p in zip(rubric.criteria, passages)]
+
+                def finish(raws: List[str]) -> Dict[str, Any]:
+                    merged = merge_criterion_results(rubric, [parse_json_safe(r) for r in raws])
+                    return self._finish("\n\n".join(raws), hits, result=merged, budget=report)
+
+                return CallPlan(batch, CRITERION_MAX_TOKENS, CriterionReply, finish)
+
+        messages, hits, report = self._messages(submission_text, assignment_hint, rubric_allowlist, question_allowlist)
+        return CallPlan([messages], None, GradingReply, lambda raws: self._finish(raws[0], hits, budget=report))
+
+    def _repair(self, plan: CallPlan, raws: List[Any]) -> List[Any]:
+        """Replies that fail schema validation get one follow-up call asking only for the bad fields."""
+        checks, todo = self.structured.plan_repairs(plan.batch, raws, plan.reply_model)
+        fixes = []
+        for _, messages in todo:
+            try:
+                fixes.append(self.llm.chat(messages, max_tokens=self.structured.repair_max_tokens,
+                                           response_format=self.structured.repair_format()))
+            except Exception as e:
+                fixes.append(e)
+        return self._apply_repairs(plan, raws, checks, todo, fixes)
+
+    async def _arepair(self, plan: CallPlan, raws: List[Any]) -> List[Any]:
+        checks, todo = self.structured.plan_repairs(plan.batch, raws, plan.reply_model)
+        fixes = []
+        if todo:
+            fixes = await self.llm.achat_many([m for _, m in todo], return_exceptions=True,
+                                              max_tokens=self.structured.repair_max_tokens,
+                                              response_format=self.structured.repair_format())
+        return self._apply_repairs(plan, raws, checks, todo, fixes)
+
+    def _apply_repairs(self, plan: CallPlan, raws: List[Any], checks, todo, fixes) -> List[Any]:
+        raws = list(raws)
+        for (i, _), fix in zip(todo, fixes):
+            repaired = self.structured.apply(checks[i], fix, plan.reply_model)
+            if repaired is not None:
+                raws[i] = repaired
+        return raws
 
-        raw = self.llm.chat([system_msg, user_msg])
-        result = parse_json_safe(raw)
+    def _finish(self, raw: str, hits: List[Tuple[float, Dict[str, Any]]],
+                result: Optional[Dict[str, Any]] = None, budget: Optional[BudgetReport] = None) -> Dict[str, Any]:
+        if result is None:
+            result = parse_json_safe(raw)
 
         try:
             result["total_score"] = float(max(0.0, min(100.0, result.get("total_score", 0.0))))
@@ -166,4 +362,105 @@ class GradeEvaluator:
             "raw_model_text": raw,
             "result": result,
             "retrieved": retrieved_meta,
+            "budget": budget.to_dict() if budget is not None else None,
         }
+
+    def grade(
+        self,
+        submission_text: str,
+        assignment_hint: Optional[str] = None,
+        rubric_allowlist: Optional[List[str]] = None,
+        question_allowlist: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns a dict with keys: raw_model_text, result, retrieved, budget
+        (budget records which context chunks and submission segments made it into the prompt)
+        """
+        plan = self._plan(submission_text, assignment_hint, rubric_allowlist, question_allowlist)
+        fmt = self.structured.response_format(plan.reply_model)
+        if len(plan.batch) == 1:
+            raws = [self.llm.chat(plan.batch[0], max_tokens=plan.max_tokens, response_format=fmt)]
+            return plan.finish(self._repair(plan, raws))
+
+        # Per-criterion calls run concurrently: wall time is about that of the slowest criterion.
+        async def run():
+            raws = await self.llm.achat_many(plan.batch, max_tokens=plan.max_tokens, response_format=fmt)
+            return await self._arepair(plan, raws)
+        return plan.finish(run_sync(run()))
+
+    def grade_stream(
+        self,
+        submission_text: str,
+        assignment_hint: Optional[str] = None,
+        rubric_allowlist: Optional[List[str]] = None,
+        question_allowlist: Optional[List[str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming grade(): yields {"partial": {...}} each time another field of the model's JSON
+        (total_score, each criterion, feedback, ...) completes, then the same dict grade() returns
+        plus "timings" = {"ttfs_s", "total_s"}. ttfs_s is the time until the first score arrived.
+        In per-criterion mode the concurrent calls are not streamed; the merged result is
+        yielded once as a partial, then as the final dict.
+        """
+        started = time.perf_counter()
+        plan = self._plan(submission_text, assignment_hint, rubric_allowlist, question_allowlist)
+        fmt = self.structured.response_format(plan.reply_model)
+        if len(plan.batch) > 1:
+            async def run():
+                raws = await self.llm.achat_many(plan.batch, max_tokens=plan.max_tokens, response_format=fmt)
+                return await self._arepair(plan, raws)
+            out = plan.finish(run_sync(run()))
+            total = time.perf_counter() - started
+            yield {"partial": out["result"]}
+            out["timings"] = {"ttfs_s": total, "total_s": total}
+            self.ttfs.append(total)
+            yield out
+            return
+        parser = IncrementalJSONParser()
+        ttfs = None
+        for delta in self.llm.chat_stream(plan.batch[0], response_format=fmt):
+            if not parser.feed(delta):
+                continue
+            if ttfs is None and ("total_score" in parser.partial or parser.partial.get("criteria")):
+                ttfs = time.perf_counter() - started
+            yield {"partial": parser.partial}
+        total = time.perf_counter() - started
+        out = plan.finish(self._repair(plan, [parser.text]))
+        out["timings"] = {"ttfs_s": total if ttfs is None else ttfs, "total_s": total}
+        self.ttfs.append(out["timings"]["ttfs_s"])
+        yield out
+
+    async def agrade_many(
+        self,
+        submission_texts: List[str],
+        assignment_hint: Optional[str] = None,
+        rubric_allowlist: Optional[List[str]] = None,
+        question_allowlist: Optional[List[str]] = None,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """
+        Grades every submission with the LLM calls in flight together (bounded by LLM_CONCURRENCY).
+        Results are in input order and shaped like grade(); with return_exceptions a failed
+        submission yields its exception instead of aborting the batch.
+        """
+        plans = [
+            self._plan(text, assignment_hint, rubric_allowlist, question_allowlist)
+            for text in submission_texts
+        ]
+        # Every call of every submission goes out together; replies are regrouped per submission.
+        async def run(plan: CallPlan) -> List[Any]:
+            raws = await self.llm.achat_many(plan.batch, return_exceptions=return_exceptions,
+                                             max_tokens=plan.max_tokens,
+                                             response_format=self.structured.response_format(plan.reply_model))
+            return await self._arepair(plan, raws)
+
+        replies = await asyncio.gather(*(run(plan) for plan in plans))
+        out = []
+        for raws, plan in zip(replies, plans):
+            failed = next((r for r in raws if isinstance(r, BaseException)), None)
+            out.append(failed if failed is not None else plan.finish(raws))
+        return out
+
+    def grade_many(self, submission_texts: List[str], **kwargs) -> List[Any]:
+        """Blocking wrapper around agrade_many; also safe to call from inside a running loop."""
+        return run_sync(self.agrade_many(submission_texts, **kwargs))
@@ -34,3 +34,35 @@ PROMPT_USER_BLOCK = """Student Submission:
 If the rubric defines weights, respect them. If not, split weights evenly across criteria you infer from the rubric.
 Important: respond with JSON only.
 """
+
+PROMPT_CRITERION_HEADER = """You are an impartial grading assistant. Grade ONE rubric criterion of a student's submission.
+Follow these rules:
+- Judge only the criterion given; ignore everything else.
+- Score from 0 to 100 for this criterion alone; justify it with short, specific evidence.
+- If the criterion is not evidenced in the passages, score it low and state what was missing.
+- Return ONLY valid JSON as specified below (no extra prose).
+
+JSON schema:
+{
+  "score": float,
+  "rationale": str,
+  "improvable_sections": [str]
+}"""
+
+PROMPT_CRITERION_BLOCK = """Reference Materials (Top Passages):
+{context}
+
+Criterion: {name}
+{descriptors}
+
+Relevant Passages From The Student Submission:
+{passages}
+
+Important: respond with JSON only.
+"""
+
+PROMPT_REPAIR = """Your JSON reply had missing or invalid fields: {fields}.
+Return ONLY a JSON object containing exactly these fields, valid against this schema:
+{schema}
+Keep the grading you already gave; do not repeat the other fields.
+"""
@@ -0,0 +1,309 @@
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..rag.ingest_cache import file_digest
+from ..utils.read_any import read_text_any
+
+# Bump when the compiled layout or the parsing rules change so cached rubrics are recompiled.
+RUBRIC_FORMAT_VERSION = 3
+
+_NAME_KEYS = ("name", "criterion", "title", "label")
+_WEIGHT_KEYS = ("weight", "points", "marks", "max_score", "max_points", "score")
+_DESC_KEYS = ("descriptors", "description", "levels", "details", "expectations")
+
+# "Clarity (20 points)", "Correctness: 30%", "Analysis - 25 marks", "- Style [10]"
+_WEIGHTED_LINE = re.compile(
+    r"^(?P<name>[^\d:|][^:|]*?)\s*(?:[:\-–—]\s*|\(|\[)\s*(?P<w>\d+(?:\.\d+)?)"
+    r"(?P<range>\s*(?:[\-–—]|to)\s*\d+(?:\.\d+)?)?\s*"
+    r"(?P<unit>%|pts?|points?|marks?)?\s*[)\]]?\s*[:\-–—]?\s*(?P<rest>.*)$",
+    re.IGNORECASE,
+)
+_BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)]|[a-z][.)]|#{1,6})\s+", re.IGNORECASE)
+# Lines that carry a number but are not criteria: "Total: 100 points", "Due: 10/14/2025".
+_NOT_CRITERION = re.compile(r"^(?:grand\s+)?(?:total|sum|due|date|deadline|points?|marks?|score|max(?:imum)?|out\s+of)\b",
+                            re.IGNORECASE)
+_STATED_TOTAL = re.compile(r"^(?:grand\s+)?(?:total|points?|marks?|max(?:imum)?(?:\s+\w+)?|out\s+of)\b[^\d/]*"
+                           r"(?P<w>\d+(?:\.\d+)?)(?![/\d])", re.IGNORECASE)
+_DATE_TAIL = re.compile(r"^[/.\-]\d")
+# Performance levels inside a criterion ("Excellent (36-40): insightful"), not criteria themselves.
+_BAND = re.compile(r"^(?:excellent|exemplary|outstanding|very\s+good|good|proficient|satisfactory|adequate|fair|"
+                   r"developing|emerging|beginning|needs\s+improvement|poor|weak|unsatisfactory|insufficient|"
+                   r"missing|fail(?:ing)?|[a-f][+-]?)$", re.IGNORECASE)
+# Grading rules that carry a number: "Late penalty: 10% per day", "Bonus: 5 points".
+_RULE = re.compile(r"\b(?:penalt(?:y|ies)|deduct\w*|late|per\s+(?:day|hour|week)|bonus|extra\s+credit)\b",
+                   re.IGNORECASE)
+_TITLE = re.compile(r"\b(?:rubric|assignment|essay|project|homework|exam|total)\b", re.IGNORECASE)
+
+
+@dataclass
+class Criterion:
+    name: str
+    weight: float                      # percent of the total; weights of a rubric sum to 100
+    descriptors: List[str] = field(default_factory=list)
+
+
+@dataclass
+class CompiledRubric:
+    title: str
+    criteria: List[Criterion]
+    digest: str = ""
+
+    def to_prompt(self) -> str:
+        """Compact, deterministic rendering for the grading prompt."""
+        lines = [f"{self.title} — criteria and weights (total 100):"]
+        for i, c in enumerate(self.criteria, start=1):
+            line = f"{i}. {c.name} ({c.weight:g}%)"
+            if c.descriptors:
+                line += ": " + "; ".join(c.descriptors)
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"title": self.title, "digest": self.digest, "criteria": [asdict(c) for c in self.criteria]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompiledRubric":
+        return cls(title=data["title"], digest=data.get("digest", ""),
+                   criteria=[Criterion(**c) for c in data["criteria"]])
+
+
+def _first(d: Dict[str, Any], keys) -> Any:
+    for k in keys:
+        if d.get(k) not in (None, ""):
+            return d[k]
+    return None
+
+
+def _as_descriptors(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value.strip()] if value.strip() else []
+    if isinstance(value, dict):
+        return [f"{k}: {v}" if not isinstance(v, (dict, list)) else f"{k}: {json.dumps(v, ensure_ascii=False)}"
+                for k, v in value.items()]
+    if isinstance(value, list):
+        out = []
+        for v in value:
+            if isinstance(v, dict):
+                label = _first(v, ("level", "label", "name", "score", "points"))
+                desc = _first(v, ("description", "descriptor", "text"))
+                out.append(f"{label}: {desc}" if label is not None and desc else str(desc or label or v))
+            else:
+                out.append(str(v))
+        return [d for d in out if d.strip()]
+    return [str(value)]
+
+
+def _weight(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        m = re.search(r"\d+(?:\.\d+)?", value)
+        return float(m.group()) if m else None
+    return None
+
+
+def _normalize(criteria: List[Criterion]) -> List[Criterion]:
+    """Scales weights to sum to 100; criteria without a weight share whatever is left (or split evenly)."""
+    if not criteria:
+        return criteria
+    known = sum(c.weight for c in criteria if c.weight > 0)
+    unknown = [c for c in criteria if c.weight <= 0]
+    if known <= 0:
+        for c in criteria:
+            c.weight = 100.0 / len(criteria)
+    else:
+        if unknown:
+            # Treat unweighted criteria as average-weight ones.
+            avg = known / (len(criteria) - len(unknown))
+            for c in unknown:
+                c.weight = avg
+        total = sum(c.weight for c in criteria)
+        for c in criteria:
+            c.weight = c.weight * 100.0 / total
+    for c in criteria:
+        c.weight = round(c.weight, 2)
+    return criteria
+
+
+def parse_json_rubric(data: Any) -> List[Criterion]:
+    if isinstance(data, dict):
+        items = _first(data, ("criteria", "rubric", "items", "rows"))
+        if items is None:
+            # {"Clarity": 20, "Depth": {"weight": 30, "description": "..."}}
+            items = [{"name": k, **(v if isinstance(v, dict) else {"weight": v})} for k, v in data.items()]
+        data = items
+    if isinstance(data, dict):
+        data = [{"name": k, **(v if isinstance(v, dict) else {"weight": v})} for k, v in data.items()]
+    criteria = []
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, str):
+            criteria.append(Criterion(item.strip(), 0.0))
+            continue
+        if not isinstance(item, dict):
+            continue
+        name = _first(item, _NAME_KEYS)
+        if not name:
+            continue
+        weight = _weight(_first(item, _WEIGHT_KEYS))
+        criteria.append(Criterion(str(name).strip(), weight or 0.0, _as_descriptors(_first(item, _DESC_KEYS))))
+    return criteria
+
+
+def _parse_table(lines: List[str]) -> List[Criterion]:
+    """Markdown/pipe tables: the first column is the criterion, a numeric column the weight."""
+    rows = [[c.strip() for c in ln.strip().strip("|").split("|")] for ln in lines if ln.count("|") >= 2]
+    rows = [r for r in rows if not all(re.fullmatch(r":?-{2,}:?", c or "--") for c in r)]
+    if len(rows) < 2:
+        return []
+    header = [h.lower() for h in rows[0]]
+    w_col = next((i for i, h in enumerate(header) if any(k in h for k in ("weight", "point", "mark", "%"))), None)
+    criteria = []
+    for r in rows[1:]:
+        if not r or not r[0] or _NOT_CRITERION.match(r[0]):
+            continue
+        weight = _weight(r[w_col]) if w_col is not None and w_col < len(r) else None
+        desc = [c for i, c in enumerate(r[1:], start=1) if i != w_col and c]
+        criteria.append(Criterion(r[0], weight or 0.0, desc))
+    return criteria
+
+
+def _stated_total(lines: List[str]) -> Optional[float]:
+    """The total a rubric announces ("Total: 100 points", "| Total | 100 |"), if any."""
+    for ln in lines:
+        m = _STATED_TOTAL.match(_BULLET.sub("", ln.replace("|", " ")).strip().strip("*_").strip())
+        if m:
+            return float(m.group("w"))
+    return None
+
+
+def _line_kind(line: str) -> str:
+    if line.lstrip().startswith("#"):
+        return "heading"
+    return "item" if _BULLET.match(line) else "plain"
+
+
+def _parse_lines(lines: List[str]) -> List[Criterion]:
+    criteria: List[Criterion] = []
+    head: Optional[Tuple[int, str]] = None  # (indent, kind) of the line that opened the current criterion
+    for ln in lines:
+        indent, kind = len(ln) - len(ln.lstrip()), _line_kind(ln)
+        stripped = _BULLET.sub("", ln).strip().strip("*_").strip()
+        # Deeper lines, and list items under a heading or plain line, belong to the criterion above.
+        nested = head is not None and (indent > head[0] or (kind == "item" and head[1] != "item"))
+        m = None if nested else _WEIGHTED_LINE.match(stripped)
+        name = m.group("name").strip().strip("*_ ") if m else ""
+        if m and _RULE.search(stripped):
+            head = None  # a grading rule ends the criterion before it
+            continue
+        # A bare "Word: number" is only a weight inside a list; elsewhere it needs a unit.
+        if (m and len(name) <= 80 and (m.group("unit") or kind != "plain") and not m.group("range")
+                and not _NOT_CRITERION.match(name) and not _BAND.match(name)
+                and not _DATE_TAIL.match(m.group("rest"))):
+            rest = m.group("rest").strip()
+            criteria.append(Criterion(name, float(m.group("w")), [rest] if rest else []))
+            head = (indent, kind)
+        elif head is not None and stripped:
+            criteria[-1].descriptors.append(stripped)
+    return criteria
+
+
+def parse_text_rubric(text: str) -> List[Criterion]:
+    """
+    Criteria from free-form rubric text (txt, md or text extracted from a PDF): a criterion is a
+    line that carries a weight ("Clarity (20 points)", "- Correctness: 30%", "## Analysis [25]");
+    the lines beneath it, performance bands ("Excellent (36-40)") included, become its
+    descriptors. Unless the weights add up to the stated total (100 when none is stated),
+    nothing is returned and callers use the rubric chunks instead.
+    """
+    lines = [ln.rstrip() for ln in text.splitlines() if ln.strip()]
+    criteria = _parse_table(lines) or _parse_lines(lines)
+    total = _stated_total(lines)
+    # "Essay Rubric (100 points)": a title carrying the total, not a criterion.
+    if len(criteria) > 1 and _TITLE.search(criteria[0].name) and total in (None, criteria[0].weight) \
+            and abs(criteria[0].weight - sum(c.weight for c in criteria[1:])) <= 0.5:
+        total, criteria = criteria[0].weight, criteria[1:]
+    if not criteria or any(c.weight <= 0 for c in criteria) \
+            or abs(sum(c.weight for c in criteria) - (total or 100.0)) > 0.5:
+        return []
+    return criteria
+
+
+class RubricCompiler:
+    """
+    Compiles rubric files into CompiledRubric once per content hash. Results are memoized in
+    memory and, with `cache_dir`, as small JSON files so later runs skip the parse (and the PDF
+    extraction) entirely. compile() returns None when no criteria can be recognized; callers
+    then fall back to retrieving rubric chunks.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memo: Dict[str, Optional[CompiledRubric]] = {}
+
+    def compile(self, path: str) -> Optional[CompiledRubric]:
+        try:
+            digest = file_digest(path)
+        except OSError:
+            return None
+        if digest in self._memo:
+            return self._memo[digest]
+        rubric = self._load(digest)
+        if rubric is None:
+            rubric = compile_rubric(path, digest)
+            self._store(digest, rubric)
+        self._memo[digest] = rubric
+        return rubric
+
+    def _entry_path(self, digest: str) -> Optional[Path]:
+        return self.cache_dir / f"{digest}.json" if self.cache_dir else None
+
+    def _load(self, digest: str) -> Optional[CompiledRubric]:
+        p = self._entry_path(digest)
+        if p is None:
+            return None
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != RUBRIC_FORMAT_VERSION or not data.get("rubric"):
+                return None
+            return CompiledRubric.from_dict(data["rubric"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _store(self, digest: str, rubric: Optional[CompiledRubric]) -> None:
+        p = self._entry_path(digest)
+        if p is None or rubric is None:
+            return
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": RUBRIC_FORMAT_VERSION, "rubric": rubric.to_dict()}, f, ensure_ascii=False)
+            os.replace(tmp, p)
+        except OSError:
+            pass
+
+
+def compile_rubric(path: str, digest: str = "") -> Optional[CompiledRubric]:
+    p = Path(path)
+    try:
+        text = read_text_any(str(p))
+    except Exception:
+        return None
+    criteria: List[Criterion] = []
+    if p.suffix.lower() == ".json":
+        try:
+            criteria = parse_json_rubric(json.loads(text))
+        except ValueError:
+            criteria = []
+    if not criteria:
+        criteria = parse_text_rubric(text)
+    if not criteria:
+        return None
+    return CompiledRubric(title=p.stem, criteria=_normalize(criteria), digest=digest)
@@ -0,0 +1,109 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IncrementalJSONParser:
+    """
+    Parses a streamed JSON object as it arrives and exposes the fields completed so far in
+    `partial`. A top-level field appears as soon as its value is closed, and elements of a
+    top-level array of objects (e.g. "criteria") appear one by one as each object closes.
+    Every character is scanned once; only finished values are handed to json.loads.
+    Text before the first "{" (prose, markdown fences) is skipped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.partial: Dict[str, Any] = {}
+        self.done = False
+        self._pos = 0
+        self._started = False
+        self._stack: List[str] = []
+        self._in_str = False
+        self._escape = False
+        self._str_start = 0
+        self._key: Optional[str] = None
+        self._after_colon = False
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> bool:
+        """Consumes the next piece of text; returns True if `partial` gained anything."""
+        self.text += chunk
+        changed = False
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            ch = text[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append("{")
+                continue
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                    if len(self._stack) == 1 and not self._after_colon:
+                        self._key = self._loads(text[self._str_start:i + 1])
+                continue
+
+            depth = len(self._stack)
+            if depth == 1 and self._after_colon and self._value_start is None and not ch.isspace():
+                self._value_start = i
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch in "{[":
+                if depth == 1 and ch == "[" and self._key is not None:
+                    self.partial[self._key] = []
+                    changed = True
+                if depth == 2 and self._stack[-1] == "[" and ch == "{":
+                    self._item_start = i
+                self._stack.append(ch)
+            elif ch in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and self._stack[-1] == "[" and self._item_start is not None:
+                    # An object inside a top-level array just closed.
+                    item = self._loads(text[self._item_start:i + 1])
+                    if item is not None and isinstance(self.partial.get(self._key), list):
+                        self.partial[self._key].append(item)
+                        changed = True
+                    self._item_start = None
+                elif depth == 1:
+                    changed |= self._finish_value(text[self._value_start:i + 1])
+                elif depth == 0:
+                    changed |= self._finish_value(text[self._value_start:i] if self._value_start is not None else "")
+                    self.done = True
+            elif ch == ":" and depth == 1:
+                self._after_colon = True
+                self._value_start = None
+            elif ch == "," and depth == 1:
+                changed |= self._finish_value(text[self._value_start:i] if self._value_start is not None else "")
+        self._pos = len(text)
+        return changed
+
+    def _finish_value(self, raw: str) -> bool:
+        """Closes the current top-level field; containers may already have been closed by their bracket."""
+        key, self._key = self._key, None
+        self._after_colon = False
+        self._value_start = None
+        raw = raw.strip()
+        if key is None or not raw:
+            return False
+        value = self._loads(raw)
+        if value is None and raw != "null":
+            return False
+        self.partial[key] = value
+        return True
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
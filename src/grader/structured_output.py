@@ -0,0 +1,175 @@
+import json
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import orjson
+from pydantic import BaseModel, ValidationError, create_model
+
+from ..config import REPAIR_MAX_TOKENS, STRUCTURED_OUTPUT
+from .prompt_templates import PROMPT_REPAIR
+
+
+class CriterionScore(BaseModel):
+    name: str
+    score: float
+    rationale: str
+
+
+class GradingReply(BaseModel):
+    """The reply PROMPT_HEADER asks for."""
+    total_score: float
+    criteria: List[CriterionScore]
+    overall_feedback: str
+    improvable_sections: List[str] = []
+    plagiarism_or_policy_flags: List[str] = []
+
+
+class CriterionReply(BaseModel):
+    """The reply PROMPT_CRITERION_HEADER asks for."""
+    score: float
+    rationale: str
+    improvable_sections: List[str] = []
+
+
+@lru_cache(maxsize=None)
+def _schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    return model.model_json_schema()
+
+
+def load_object(text: str) -> Optional[Dict[str, Any]]:
+    """The JSON object in a reply; tolerates prose or markdown fences around it."""
+    candidates = [text]
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+    for c in candidates:
+        try:
+            value = orjson.loads(c)
+        except orjson.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+@dataclass
+class Checked:
+    data: Dict[str, Any]                      # validated (or best-effort) fields
+    invalid: List[str] = field(default_factory=list)  # top-level fields that are missing or malformed
+    parsed: bool = True                       # False: the reply held no JSON object at all
+
+    @property
+    def ok(self) -> bool:
+        return not self.invalid
+
+
+def check_reply(text: str, model: Type[BaseModel]) -> Checked:
+    data = load_object(text)
+    if data is None:
+        return Checked({}, list(model.model_fields), parsed=False)
+    try:
+        return Checked({**data, **model.model_validate(data).model_dump()})
+    except ValidationError as e:
+        bad = {str(err["loc"][0]) for err in e.errors() if err.get("loc")}
+        return Checked(data, [f for f in model.model_fields if f in bad])
+
+
+class StructuredOutput:
+    """
+    Schema-constrained replies: builds the response_format for a reply model, validates replies
+    with orjson + pydantic, and plans small follow-up calls that re-ask only for the fields that
+    failed validation. Counts parse failures, schema failures and repair outcomes.
+    """
+
+    def __init__(self, mode: str = STRUCTURED_OUTPUT, repair_max_tokens: int = REPAIR_MAX_TOKENS):
+        self.mode = mode
+        self.repair_max_tokens = repair_max_tokens
+        self.replies = 0
+        self.parse_failures = 0
+        self.invalid = 0
+        self.repairs = 0
+        self.repaired = 0
+        self._lock = threading.Lock()
+
+    def response_format(self, model: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+        if self.mode == "json_schema":
+            return {"type": "json_schema", "json_schema": {"name": model.__name__, "schema": _schema(model)}}
+        if self.mode == "json_object":
+            return {"type": "json_object"}
+        return None
+
+    def repair_format(self) -> Optional[Dict[str, Any]]:
+        # The repaired field set differs per reply, so repairs share the generic JSON mode.
+        return {"type": "json_object"} if self.mode != "off" else None
+
+    def check(self, text: str, model: Type[BaseModel]) -> Checked:
+        checked = check_reply(text, model)
+        with self._lock:
+            self.replies += 1
+            self.parse_failures += not checked.parsed
+            self.invalid += checked.parsed and not checked.ok
+        return checked
+
+    def plan_repairs(self, batch: List[List[Dict]], raws: List[Any],
+                     model: Type[BaseModel]) -> Tuple[List[Optional[Checked]], List[Tuple[int, List[Dict]]]]:
+        """
+        Checks every reply (exceptions are skipped) and returns (checks, [(index, repair messages)]).
+        A repair replays the conversation with the bad reply and asks only for the failed fields.
+        """
+        checks: List[Optional[Checked]] = []
+        todo = []
+        for i, raw in enumerate(raws):
+            if not isinstance(raw, str):
+                checks.append(None)
+                continue
+            checked = self.check(raw, model)
+            checks.append(checked)
+            if not checked.ok and self.repair_max_tokens > 0:
+                todo.append((i, self.repair_messages(batch[i], raw, checked.invalid, model)))
+        with self._lock:
+            self.repairs += len(todo)
+        return checks, todo
+
+    @staticmethod
+    def repair_messages(messages: List[Dict], reply: str, fields: List[str],
+                        model: Type[BaseModel]) -> List[Dict[str, str]]:
+        schema = _schema(model)
+        subset = {"type": "object", "required": fields,
+                  "properties": {f: schema["properties"][f] for f in fields}}
+        if "$defs" in schema:
+            subset["$defs"] = schema["$defs"]
+        prompt = PROMPT_REPAIR.format(fields=", ".join(fields), schema=json.dumps(subset, ensure_ascii=False))
+        return [*messages, {"role": "assistant", "content": reply}, {"role": "user", "content": prompt}]
+
+    def apply(self, checked: Checked, patch: Any, model: Type[BaseModel]) -> Optional[str]:
+        """The repaired reply as JSON text, or None if the patch did not make it valid."""
+        if not isinstance(patch, str):
+            return None
+        fix = load_object(patch)
+        if fix is None:
+            return None
+        fields = {f: model.model_fields[f] for f in checked.invalid}
+        partial = create_model(f"{model.__name__}Repair", **{f: (info.annotation, ...) for f, info in fields.items()})
+        try:
+            fix = partial.model_validate(fix).model_dump()
+            merged = model.model_validate({**checked.data, **fix}).model_dump()
+        except ValidationError:
+            return None
+        with self._lock:
+            self.repaired += 1
+        return orjson.dumps({**checked.data, **merged}).decode()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.replies
+            return {
+                "replies": n,
+                "parse_failures": self.parse_failures,
+                "invalid": self.invalid,
+                "repairs": self.repairs,
+                "repaired": self.repaired,
+                "failure_rate": (self.parse_failures + self.invalid) / n if n else 0.0,
+                "repair_rate": self.repaired / self.repairs if self.repairs else 0.0,
+            }
@@ -0,0 +1,188 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence, Tuple
+
+from ..rag.retriever_bm25 import BM25Retriever
+from ..rag.text_utils import doc_text, iter_chunk_spans
+from ..utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+Hit = Tuple[float, Dict[str, Any]]
+
+SEGMENT_CHARS = 1200
+SEGMENT_SEPARATOR = "\n[...]\n"
+# Upper bound on the per-source framing build_context_block adds ("[score=..] path:pN :: ", "---").
+# Hits are sized before overlapping ones are merged, so the estimate errs on the safe side.
+HIT_OVERHEAD_TOKENS = 16
+
+
+@dataclass
+class Allocation:
+    fixed: int          # system prompt, templates and rubric (text or chunks): always sent
+    context: int
+    submission: int
+
+
+@dataclass
+class BudgetReport:
+    budget: int
+    fixed_tokens: int
+    context_tokens: int = 0
+    submission_tokens: int = 0
+    context_included: List[str] = field(default_factory=list)
+    context_dropped: List[str] = field(default_factory=list)
+    context_pinned: List[str] = field(default_factory=list)  # rubric chunks, counted in fixed_tokens
+    submission_tokens_in: int = 0
+    segments_kept: List[Tuple[int, int]] = field(default_factory=list)  # char spans of the submission
+    segments_dropped: int = 0
+
+    @property
+    def over_budget(self) -> bool:
+        return self.fixed_tokens + self.context_tokens + self.submission_tokens > self.budget
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "fixed_tokens": self.fixed_tokens,
+            "over_budget": self.over_budget,
+            "context": {"tokens": self.context_tokens, "included": self.context_included,
+                        "dropped": self.context_dropped, "pinned": self.context_pinned},
+            "submission": {"tokens_in": self.submission_tokens_in, "tokens_kept": self.submission_tokens,
+                           "segments_kept": [list(s) for s in self.segments_kept],
+                           "segments_dropped": self.segments_dropped,
+                           "truncated": self.submission_tokens < self.submission_tokens_in},
+        }
+
+
+def _hit_tokens(hit: Hit) -> int:
+    return estimate_tokens(doc_text(hit[1])) + HIT_OVERHEAD_TOKENS
+
+
+def allocate(budget: int, fixed: int, context_wanted: int, submission_wanted: int,
+             context_share: float) -> Allocation:
+    """
+    Splits what is left after the fixed parts: reference context may take up to `context_share`
+    of it, the submission gets the rest, and whichever side needs less hands its slack to the other.
+    """
+    avail = max(0, budget - fixed)
+    context = min(context_wanted, int(avail * context_share))
+    submission = min(submission_wanted, avail - context)
+    context = min(context_wanted, avail - submission)
+    return Allocation(fixed, context, submission)
+
+
+def fit_context(hits: List[Hit], budget: int) -> Tuple[List[Hit], List[Hit]]:
+    """Keeps hits in rank order while they fit; returns (included, dropped)."""
+    included, dropped = [], []
+    used = 0
+    for hit in hits:
+        cost = _hit_tokens(hit)
+        if used + cost <= budget:
+            included.append(hit)
+            used += cost
+        else:
+            dropped.append(hit)
+    return included, dropped
+
+
+def fit_submission(text: str, budget: int, query: str) -> Tuple[str, List[Tuple[int, int]], int]:
+    """
+    Returns (text to send, kept char spans, number of dropped segments). A submission over budget
+    is cut into sentence-aligned segments; the opening segment is always kept, the rest are
+    ranked against `query` (the rubric) with BM25 and added best-first while they fit, then
+    emitted in document order with a "[...]" marker at each gap.
+    """
+    if estimate_tokens(text) <= budget:
+        return text, [(0, len(text))], 0
+    spans = list(iter_chunk_spans(text, SEGMENT_CHARS, 0, boundary="sentence"))
+    sep = estimate_tokens(SEGMENT_SEPARATOR)
+    costs = [estimate_tokens(text[s:e]) + sep for s, e in spans]
+
+    order = [0]
+    if len(spans) > 1:
+        docs = [{"id": str(i), "text": text[s:e], "meta": {"path": "submission", "type": "submission"}}
+                for i, (s, e) in enumerate(spans)]
+        ranked = BM25Retriever(docs[1:]).search(query, k=len(docs) - 1) if query.strip() else []
+        ranked_ids = [int(d["id"]) for score, d in ranked if score > 0]
+        seen = set(ranked_ids)
+        # Segments sharing no terms with the rubric follow in document order.
+        order += ranked_ids + [i for i in range(1, len(spans)) if i not in seen]
+
+    if costs[0] > budget:
+        # Even the opening segment is too big: hard-cut it to the budget.
+        end = spans[0][0] + max(0, budget - sep) * CHARS_PER_TOKEN
+        return text[spans[0][0]:end], [(spans[0][0], end)], len(spans)
+    # The opening is reserved first, so later segments can never crowd it out.
+    kept, used = [0], costs[0]
+    for i in order[1:]:
+        if used + costs[i] <= budget:
+            kept.append(i)
+            used += costs[i]
+    kept.sort()
+    pieces, out_spans = [], []
+    for n, i in enumerate(kept):
+        if n and kept[n - 1] != i - 1:
+            pieces.append(SEGMENT_SEPARATOR)
+        elif n:
+            pieces.append(" ")
+        pieces.append(text[spans[i][0]:spans[i][1]])
+        out_spans.append(spans[i])
+    if kept[-1] != len(spans) - 1:
+        pieces.append(SEGMENT_SEPARATOR)
+    return "".join(pieces), out_spans, len(spans) - len(kept)
+
+
+def _hit_id(hit: Hit) -> str:
+    doc = hit[1]
+    return str(doc.get("id") or doc.get("meta", {}).get("path", "?"))
+
+
+def budget_prompt(
+    fixed_text: str,
+    hits: List[Hit],
+    submission_text: str,
+    query: str,
+    budget: int,
+    context_share: float = 0.35,
+    pinned: Sequence[Hit] = (),
+) -> Tuple[List[Hit], str, BudgetReport]:
+    """
+    Fits reference hits and the submission around the always-sent `fixed_text` (system prompt,
+    templates, rubric) and `pinned` hits (rubric chunks standing in for a compiled rubric).
+    Returns (reference hits to render besides the pinned ones, submission text to send, report).
+    """
+    fixed = estimate_tokens(fixed_text) + sum(_hit_tokens(h) for h in pinned)
+    context_wanted = sum(_hit_tokens(h) for h in hits)
+    submission_wanted = estimate_tokens(submission_text)
+    alloc = allocate(budget, fixed, context_wanted, submission_wanted, context_share)
+
+    included, dropped = fit_context(hits, alloc.context)
+    context_tokens = sum(_hit_tokens(h) for h in included)
+    # Context that came in under its allocation frees room for the submission.
+    sub_budget = max(0, budget - fixed - context_tokens)
+    sub_text, spans, n_dropped = fit_submission(submission_text, sub_budget, query)
+
+    report = BudgetReport(
+        budget=budget,
+        fixed_tokens=fixed,
+        context_tokens=context_tokens,
+        submission_tokens=estimate_tokens(sub_text),
+        context_included=[_hit_id(h) for h in included],
+        context_dropped=[_hit_id(h) for h in dropped],
+        context_pinned=[_hit_id(h) for h in pinned],
+        submission_tokens_in=submission_wanted,
+        segments_kept=spans,
+        segments_dropped=n_dropped,
+    )
+    return included, sub_text, report
+
+
+def budget_context(hits: List[Hit], budget: int) -> Tuple[List[Hit], BudgetReport]:
+    """Context-only variant for prompts whose other parts are already bounded (per-criterion calls)."""
+    included, dropped = fit_context(hits, budget)
+    report = BudgetReport(
+        budget=budget,
+        fixed_tokens=0,
+        context_tokens=sum(_hit_tokens(h) for h in included),
+        context_included=[_hit_id(h) for h in included],
+        context_dropped=[_hit_id(h) for h in dropped],
+    )
+    return included, report
@@ -1,27 +1,359 @@
+import asyncio
+import json
+import httpx
 import requests
-from typing import List, Dict
-from ..config import GROQ_API_KEY, GROQ_BASE_URL, TIMEOUT_S
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt
+from ..config import (
+    GROQ_API_KEY, GROQ_BASE_URL, TIMEOUT_S, LLM_CONCURRENCY, GROQ_RPM, GROQ_TPM, LLM_MAX_RETRIES,
+    LLM_CACHE_PATH, LLM_CACHE_MAX_MB, LLM_CACHE_TTL_S,
+)
+from ..utils.tokens import estimate_message_tokens
+from .rate_limiter import RateLimiter, is_retryable, retry_wait
+from .response_cache import ResponseCache
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_cache: Optional[ResponseCache] = None
+
+
+def default_limiter() -> RateLimiter:
+    """One limiter per process, so every client draws on the same provider budget."""
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = RateLimiter(rpm=GROQ_RPM, tpm=GROQ_TPM)
+    return _shared_limiter
+
+
+def default_response_cache() -> Optional[ResponseCache]:
+    """The on-disk reply cache from LLM_CACHE_PATH, or None when caching is disabled."""
+    global _shared_cache
+    if _shared_cache is None and LLM_CACHE_PATH:
+        _shared_cache = ResponseCache(LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_MB << 20, ttl_s=LLM_CACHE_TTL_S)
+    return _shared_cache
+
+
+def _headers(api_key: str) -> Dict[str, str]:
+    headers = {"Content-Type": "application/json"}
+    if api_key:  # local OpenAI-compatible servers often run without auth
+        headers["Authorization"] = f"Bearer {api_key}"
+    return headers
+
+
+def _sse_delta(line: str) -> Tuple[bool, str, Optional[int]]:
+    """
+    (done, text, total tokens) for one server-sent-events line of a streamed chat completion.
+    Usage arrives once, on the last chunk: top-level with stream_options.include_usage, or under
+    x_groq on Groq.
+    """
+    if not line or not line.startswith("data:"):
+        return False, "", None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return True, "", None
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return False, "", None
+    usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or {}
+    choices = chunk.get("choices") or [{}]
+    return False, (choices[0].get("delta") or {}).get("content") or "", usage.get("total_tokens")
+
+
+def _valid_reply(reply: str, response_format: Optional[Dict]) -> bool:
+    """A reply worth replaying: non-empty and, when JSON was asked for, a JSON object with the schema's required keys."""
+    if not reply.strip():
+        return False
+    if not response_format:
+        return True
+    start, end = reply.find("{"), reply.rfind("}")
+    try:
+        value = json.loads(reply[start:end + 1]) if start != -1 and end > start else None
+    except ValueError:
+        return False
+    if not isinstance(value, dict):
+        return False
+    schema = (response_format.get("json_schema") or {}).get("schema") or {}
+    return all(k in value for k in schema.get("required", ()))
+
 
 class GroqClient:
-    def __init__(self, model: str, temperature: float = 0.0, max_tokens: int = 1000):
+    """Client for Groq or any other OpenAI-compatible /chat/completions endpoint (`base_url`)."""
+
+    def __init__(self, model: str, temperature: float = 0.0, max_tokens: int = 1000,
+                 limiter: Optional[RateLimiter] = None, max_retries: int = LLM_MAX_RETRIES,
+                 cache: Optional[ResponseCache] = None, base_url: str = GROQ_BASE_URL,
+                 api_key: str = GROQ_API_KEY):
         self.model = model
+        self.base_url = base_url.rstrip("/")
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.limiter = limiter or default_limiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        # Cleared the first time the endpoint rejects a response_format; the prompt still asks for JSON.
+        self.structured = True
+        # One session per client: keeps the TCP/TLS connection alive between calls.
+        self.session = requests.Session()
+        self.headers = _headers(api_key)
+        self.session.headers.update(self.headers)
 
-    def chat(self, messages: List[Dict]) -> str:
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json",
-        }
+    def _payload(self, messages: List[Dict], stream: bool = False, max_tokens: Optional[int] = None,
+                 response_format: Optional[Dict] = None) -> Dict[str, Any]:
         payload = {
             "model": self.model,
             "messages": messages,
             "temperature": self.temperature,
-            "max_tokens": self.max_tokens,
-            "stream": False
+            "max_tokens": max_tokens or self.max_tokens,
+            "stream": stream
         }
-        url = f"{GROQ_BASE_URL}/chat/completions"
-        resp = requests.post(url, json=payload, headers=headers, timeout=TIMEOUT_S)
+        if stream:
+            payload["stream_options"] = {"include_usage": True}  # so the limiter can settle the reservation
+        if response_format and self.structured:
+            payload["response_format"] = response_format
+        return payload
+
+    def _format_rejected(self, resp, response_format: Optional[Dict], estimated: int) -> bool:
+        """
+        True (and structured output switched off) if the endpoint answered 400 to a request that
+        carried a response_format and its error names that parameter; other 400s are left to _check.
+        The rejected call's token reservation is returned; the caller re-acquires for the re-post.
+        """
+        if resp.status_code != 400 or not response_format or not self.structured:
+            return False
+        body = resp.text.lower()
+        if "response_format" not in body and "json_schema" not in body:
+            return False
+        self.structured = False
+        self.limiter.settle(estimated, 0)
+        return True
+
+    def _post(self, url: str, estimated: int, **kwargs) -> requests.Response:
+        """session.post that returns the reservation when no response arrives (connect error, timeout)."""
+        try:
+            return self.session.post(url, timeout=TIMEOUT_S, **kwargs)
+        except requests.RequestException:
+            self.limiter.settle(estimated, 0)
+            raise
+
+    def _estimate(self, messages: List[Dict], max_tokens: Optional[int] = None) -> int:
+        # Providers charge the completion budget against TPM up front.
+        return estimate_message_tokens(messages) + (max_tokens or self.max_tokens)
+
+    def _retry_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            retry=retry_if_exception(is_retryable),
+            wait=retry_wait(),
+            stop=stop_after_attempt(self.max_retries + 1),
+            reraise=True,
+        )
+
+    def _check(self, resp, estimated: int) -> None:
+        """Feeds rate-limit headers back to the limiter and raises on an error status."""
+        self.limiter.observe(resp.headers)
+        if resp.status_code == 429:
+            self.limiter.backoff(resp.headers)
+        if resp.status_code >= 400:
+            self.limiter.settle(estimated, 0)  # nothing was generated: give the reservation back
         resp.raise_for_status()
+
+    def _handle(self, resp, estimated: int, key: Optional[str] = None,
+                response_format: Optional[Dict] = None) -> str:
+        self._check(resp, estimated)
         data = resp.json()
-        return data["choices"][0]["message"]["content"]
+        self.limiter.settle(estimated, (data.get("usage") or {}).get("total_tokens"))
+        choice = data["choices"][0]
+        # A reply cut off at max_tokens (or filtered) is not the answer to this request.
+        complete = choice.get("finish_reason") in (None, "stop")
+        return self._remember(key, choice["message"]["content"], response_format, complete)
+
+    def _cache_key(self, messages: List[Dict], max_tokens: Optional[int] = None,
+                   response_format: Optional[Dict] = None) -> Optional[str]:
+        # Sampled replies differ run to run; only greedy decoding is safe to replay.
+        if self.cache is None or self.temperature != 0:
+            return None
+        if response_format and self.structured:
+            messages = [*messages, {"response_format": response_format}]
+        return ResponseCache.make_key(self.model, self.temperature, max_tokens or self.max_tokens, messages)
+
+    def _cached(self, key: Optional[str]) -> Optional[str]:
+        return self.cache.get(key) if key else None
+
+    def _remember(self, key: Optional[str], reply: str, response_format: Optional[Dict] = None,
+                  complete: bool = True) -> str:
+        """Caches only whole replies that pass _valid_reply, so a bad one is asked for again next run."""
+        if key and complete and _valid_reply(reply, response_format):
+            self.cache.put(key, reply)
+        return reply
+
+    def chat(self, messages: List[Dict], max_tokens: Optional[int] = None,
+             response_format: Optional[Dict] = None) -> str:
+        """
+        `max_tokens` overrides the client's completion cap for this call; `response_format`
+        (e.g. a json_schema) is sent while the endpoint accepts it.
+        """
+        key = self._cache_key(messages, max_tokens, response_format)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        url = f"{self.base_url}/chat/completions"
+        estimated = self._estimate(messages, max_tokens)
+        for attempt in Retrying(**self._retry_kwargs()):
+            with attempt:
+                self.limiter.acquire(estimated)
+                resp = self._post(url, estimated, json=self._payload(messages, max_tokens=max_tokens,
+                                                                     response_format=response_format))
+                if self._format_rejected(resp, response_format, estimated):
+                    self.limiter.acquire(estimated)
+                    resp = self._post(url, estimated, json=self._payload(messages, max_tokens=max_tokens))
+                return self._handle(resp, estimated, key, response_format)
+
+    def chat_stream(self, messages: List[Dict], response_format: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Yields the reply in pieces as the provider streams it (SSE). Failures before the first
+        byte are retried like chat(); a cached reply is yielded in one piece.
+        """
+        key = self._cache_key(messages, response_format=response_format)
+        cached = self._cached(key)
+        if cached is not None:
+            yield cached
+            return
+        url = f"{self.base_url}/chat/completions"
+        estimated = self._estimate(messages)
+        resp = None
+        for attempt in Retrying(**self._retry_kwargs()):
+            with attempt:
+                self.limiter.acquire(estimated)
+                resp = self._post(url, estimated, json=self._payload(messages, stream=True, response_format=response_format),
+                                  stream=True)
+                if self._format_rejected(resp, response_format, estimated):
+                    resp.close()
+                    self.limiter.acquire(estimated)
+                    resp = self._post(url, estimated, json=self._payload(messages, stream=True), stream=True)
+                try:
+                    self._check(resp, estimated)
+                except Exception:
+                    resp.close()
+                    raise
+        parts = []
+        done = False
+        used = None
+        try:
+            with resp:
+                for line in resp.iter_lines(decode_unicode=True):
+                    done, delta, total = _sse_delta(line)
+                    if done:
+                        break
+                    used = total if total is not None else used
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        finally:
+            self.limiter.settle(estimated, used)
+        # A stream that dropped before [DONE] is a truncated reply: use it, but don't replay it.
+        self._remember(key, "".join(parts), response_format, complete=done)
+
+
+class AsyncGroqClient(GroqClient):
+    """
+    Async counterpart of GroqClient on a pooled httpx.AsyncClient (HTTP keep-alive).
+    At most `concurrency` requests are in flight at once; achat_many fans a batch out under that bound.
+    The pool and semaphore belong to one event loop and are recreated if used from a new one
+    (e.g. successive asyncio.run calls); the replaced pool is closed. Blocking callers go through
+    utils.aio.run_sync, whose single background loop keeps one pool for the whole process.
+    """
+
+    def __init__(self, model: str, temperature: float = 0.0, max_tokens: int = 1000,
+                 concurrency: int = LLM_CONCURRENCY, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 limiter: Optional[RateLimiter] = None, max_retries: int = LLM_MAX_RETRIES,
+                 cache: Optional[ResponseCache] = None, base_url: str = GROQ_BASE_URL,
+                 api_key: str = GROQ_API_KEY):
+        super().__init__(model, temperature, max_tokens, limiter=limiter, max_retries=max_retries,
+                         cache=cache, base_url=base_url, api_key=api_key)
+        self.concurrency = max(1, concurrency)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                self._discard(self._client, self._loop, loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=TIMEOUT_S,
+                limits=httpx.Limits(max_connections=self.concurrency,
+                                    max_keepalive_connections=self.concurrency),
+                transport=self._transport,
+            )
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    def _discard(client: httpx.AsyncClient, owner: Optional[asyncio.AbstractEventLoop],
+                 loop: asyncio.AbstractEventLoop) -> None:
+        """Closes a pool replaced by a newer loop's, on its own loop if that one is still running."""
+        if owner is not None and owner.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), owner)
+            return
+
+        async def close() -> None:
+            try:
+                await client.aclose()
+            except Exception:
+                pass  # its loop is gone; the sockets go with the client
+
+        loop.create_task(close())
+
+    async def _apost(self, client: httpx.AsyncClient, estimated: int, **kwargs) -> httpx.Response:
+        """client.post that returns the reservation when no response arrives (connect error, timeout)."""
+        try:
+            return await client.post("/chat/completions", **kwargs)
+        except httpx.TransportError:
+            self.limiter.settle(estimated, 0)
+            raise
+
+    async def achat(self, messages: List[Dict], max_tokens: Optional[int] = None,
+                    response_format: Optional[Dict] = None) -> str:
+        key = self._cache_key(messages, max_tokens, response_format)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        client = self._http()
+        estimated = self._estimate(messages, max_tokens)
+        async for attempt in AsyncRetrying(**self._retry_kwargs()):
+            with attempt:
+                delay = self.limiter.reserve(estimated)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                async with self._sem:
+                    resp = await self._apost(client, estimated, json=self._payload(
+                        messages, max_tokens=max_tokens, response_format=response_format))
+                    if self._format_rejected(resp, response_format, estimated):
+                        delay = self.limiter.reserve(estimated)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        resp = await self._apost(client, estimated, json=self._payload(messages, max_tokens=max_tokens))
+                return self._handle(resp, estimated, key, response_format)
+
+    async def achat_many(self, batch: List[List[Dict]], return_exceptions: bool = False,
+                         max_tokens: Optional[int] = None,
+                         response_format: Optional[Dict] = None) -> List[Union[str, BaseException]]:
+        """Replies in input order. With return_exceptions, a failed call yields its exception instead of raising."""
+        return await asyncio.gather(*(self.achat(m, max_tokens, response_format) for m in batch),
+                                    return_exceptions=return_exceptions)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    async def __aenter__(self) -> "AsyncGroqClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from ..config import LLM_CONCURRENCY, LLM_MAX_RETRIES
+from ..utils.aio import run_sync
+from .groq_client import AsyncGroqClient
+from .rate_limiter import RateLimiter
+from .response_cache import ResponseCache
+
+
+def valid_json_reply(reply: str) -> bool:
+    """True if the reply contains a JSON object (the grading prompt asks for nothing else)."""
+    start, end = reply.find("{"), reply.rfind("}")
+    if start == -1 or end <= start:
+        return False
+    try:
+        return isinstance(json.loads(reply[start:end + 1]), dict)
+    except ValueError:
+        return False
+
+
+@dataclass
+class Endpoint:
+    name: str
+    base_url: str
+    model: str
+    api_key: str = ""
+    rpm: int = 0
+    tpm: int = 0
+
+
+def parse_endpoints(raw: str) -> List[Endpoint]:
+    """
+    Endpoints from a JSON list, e.g. LLM_ENDPOINTS='[{"name": "groq", "base_url": "...",
+    "model": "...", "api_key_env": "GROQ_API_KEY", "rpm": 30, "tpm": 6000}]'.
+    "api_key_env" names an environment variable so keys stay out of the list itself.
+    """
+    endpoints = []
+    for i, item in enumerate(json.loads(raw) if raw else []):
+        api_key = item.get("api_key") or os.getenv(item.get("api_key_env", ""), "")
+        endpoints.append(Endpoint(
+            name=item.get("name") or f"endpoint{i}",
+            base_url=item["base_url"],
+            model=item["model"],
+            api_key=api_key,
+            rpm=int(item.get("rpm", 0)),
+            tpm=int(item.get("tpm", 0)),
+        ))
+    return endpoints
+
+
+class EndpointHealth:
+    """
+    Rolling latency and error window for one endpoint. Failures count less as they age
+    (`half_life_s`), so an endpoint that had a bad minute drifts back into rotation, and one
+    with no successful call for `reprobe_s` is tried again as if new.
+    """
+
+    def __init__(self, window: int = 100, half_life_s: float = 60.0, reprobe_s: float = 300.0,
+                 unknown_latency_s: float = 2.0, clock: Callable[[], float] = time.monotonic):
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)  # (time, ok)
+        self.in_flight = 0
+        self.half_life_s = half_life_s
+        self.reprobe_s = reprobe_s
+        self.unknown_latency_s = unknown_latency_s  # assumed until a call succeeds
+        self.clock = clock
+
+    def record(self, latency_s: Optional[float], ok: bool) -> None:
+        if ok and latency_s is not None:
+            self.latencies.append(latency_s)
+        self.outcomes.append((self.clock(), ok))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return sum(not ok for _, ok in self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def recent_error_rate(self) -> float:
+        """Error rate with each outcome weighted by its age, shrunk towards 0 by one notional success."""
+        now = self.clock()
+        failed = total = 0.0
+        for t, ok in self.outcomes:
+            w = 0.5 ** ((now - t) / self.half_life_s)
+            total += w
+            failed += w * (not ok)
+        return failed / (total + 1.0)
+
+    def cost(self) -> float:
+        """
+        Lower is healthier: median latency inflated by recent errors and by work already queued
+        here. An endpoint with nothing to go on is probed first, but only while idle: each call
+        already in flight there counts `unknown_latency_s`, so a burst does not all land on it.
+        """
+        if not self.outcomes:
+            return self.unknown_latency_s * self.in_flight  # untried
+        p50 = self.percentile(0.5)
+        if p50 is None:
+            if self.clock() - self.outcomes[-1][0] > self.reprobe_s:
+                # Failed a while ago and never answered since: worth one more look.
+                return self.unknown_latency_s * self.in_flight
+            p50 = self.unknown_latency_s
+        return p50 * (1 + 4 * self.recent_error_rate()) * (1 + self.in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"p50_s": self.percentile(0.5), "p95_s": self.percentile(0.95),
+                "error_rate": self.error_rate, "calls": len(self.outcomes)}
+
+
+class ProviderPool:
+    """
+    Routes chat calls over several OpenAI-compatible endpoints, each with its own pooled client.
+    Every call goes to the endpoint with the lowest EndpointHealth.cost; a failed or invalid
+    reply fails over to the next one. With hedging on, if the primary has not answered by its
+    own rolling p95 a duplicate goes to the runner-up and the first valid reply wins.
+    Exposes the same chat / achat / achat_many / chat_stream surface as AsyncGroqClient.
+    """
+
+    def __init__(self, clients: Dict[str, AsyncGroqClient], hedge: bool = True, hedge_min_samples: int = 5,
+                 validate: Callable[[str], bool] = valid_json_reply, cache: Optional[ResponseCache] = None):
+        if not clients:
+            raise ValueError("ProviderPool needs at least one endpoint")
+        self.clients = clients
+        self.health = {name: EndpointHealth() for name in clients}
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.validate = validate
+        self.cache = cache
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_endpoints(cls, endpoints: Sequence[Endpoint], temperature: float, max_tokens: int,
+                       cache: Optional[ResponseCache] = None, hedge: bool = True,
+                       concurrency: int = LLM_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES) -> "ProviderPool":
+        # Retries are per endpoint and kept short: failing over to a sibling beats waiting out a backoff.
+        clients = {
+            ep.name: AsyncGroqClient(ep.model, temperature, max_tokens, concurrency=concurrency,
+                                     limiter=RateLimiter(rpm=ep.rpm, tpm=ep.tpm),
+                                     max_retries=min(max_retries, 1), cache=cache,
+                                     base_url=ep.base_url, api_key=ep.api_key)
+            for ep in endpoints
+        }
+        return cls(clients, hedge=hedge, cache=cache)
+
+    def ranked(self, exclude: Sequence[str] = ()) -> List[str]:
+        with self._lock:
+            names = [n for n in self.clients if n not in exclude]
+            return sorted(names, key=lambda n: self.health[n].cost())
+
+    async def _call(self, name: str, messages: List[Dict], max_tokens: Optional[int],
+                    response_format: Optional[Dict] = None) -> str:
+        health = self.health[name]
+        with self._lock:
+            health.in_flight += 1
+        started = time.perf_counter()
+        ok = False
+        cancelled = False
+        try:
+            reply = await self.clients[name].achat(messages, max_tokens, response_format)
+            ok = self.validate(reply)
+            if not ok:
+                raise ValueError(f"{name}: reply is not valid JSON")
+            return reply
+        except asyncio.CancelledError:
+            cancelled = True  # lost a hedge race; says nothing about the endpoint's health
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                health.in_flight -= 1
+                if not cancelled:
+                    health.record(elapsed if ok else None, ok)
+
+    def _hedge_after(self, name: str) -> Optional[float]:
+        health = self.health[name]
+        if not self.hedge or len(self.clients) < 2 or len(health.latencies) < self.hedge_min_samples:
+            return None
+        return health.percentile(0.95)
+
+    async def achat(self, messages: List[Dict], max_tokens: Optional[int] = None,
+                    response_format: Optional[Dict] = None) -> str:
+        tried: List[str] = []
+        pending: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch() -> bool:
+            order = self.ranked(exclude=tried)
+            if not order:
+                return False
+            tried.append(order[0])
+            pending[asyncio.ensure_future(self._call(order[0], messages, max_tokens, response_format))] = order[0]
+            return True
+
+        launch()
+        try:
+            while pending:
+                primary = next(iter(pending.values()))
+                timeout = self._hedge_after(primary) if len(pending) == 1 and len(tried) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slower than its own p95: race a duplicate on the next-best endpoint.
+                    if launch():
+                        hedged = True
+                        self.hedges += 1
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged and name != tried[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                if not pending:
+                    launch()  # fail over
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error or RuntimeError("no endpoint available")
+
+    async def achat_many(self, batch: List[List[Dict]], return_exceptions: bool = False,
+                         max_tokens: Optional[int] = None, response_format: Optional[Dict] = None) -> List[Any]:
+        return await asyncio.gather(*(self.achat(m, max_tokens, response_format) for m in batch),
+                                    return_exceptions=return_exceptions)
+
+    def chat(self, messages: List[Dict], max_tokens: Optional[int] = None,
+             response_format: Optional[Dict] = None) -> str:
+        return run_sync(self.achat(messages, max_tokens, response_format))
+
+    def chat_stream(self, messages: List[Dict], response_format: Optional[Dict] = None) -> Iterator[str]:
+        """Streams from the healthiest endpoint (no hedging: the first bytes are already on screen)."""
+        name = self.ranked()[0]
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield from self.clients[name].chat_stream(messages, response_format)
+            ok = True
+        finally:
+            with self._lock:
+                self.health[name].record(time.perf_counter() - started if ok else None, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoints": {name: h.stats() for name, h in self.health.items()},
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
@@ -0,0 +1,181 @@
+import email.utils
+import random
+import re
+import threading
+import time
+from typing import Any, Mapping, Optional
+
+import httpx
+import requests
+
+# Provider statuses worth retrying: throttled, or a transient server-side failure.
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket: `capacity` units, refilled at capacity/`period_s` per second.
+    reserve() always books the units and returns how long the caller must wait before using
+    them, so concurrent callers are paced in arrival order instead of racing on retries.
+    """
+
+    def __init__(self, capacity: float, period_s: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period_s
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single request larger than the bucket would otherwise never fit.
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def clamp(self, remaining: float, now: float) -> None:
+        """Never believe we have more left than the provider says we do."""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    def resize(self, capacity: float, period_s: float = 60.0) -> None:
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period_s
+        self.level = min(self.level, self.capacity)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from provider reset/retry headers: "7.66s", "2m59.56s", "120ms", "30"."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Retry-After as delta-seconds or an HTTP date."""
+    raw = headers.get("retry-after")
+    seconds = parse_duration(raw)
+    if seconds is not None or not raw:
+        return seconds
+    try:
+        when = email.utils.parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _response(exc: BaseException) -> Any:
+    return getattr(exc, "response", None)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (httpx.TransportError, requests.ConnectionError, requests.Timeout)):
+        return True
+    resp = _response(exc)
+    return resp is not None and resp.status_code in RETRY_STATUSES
+
+
+class RateLimiter:
+    """
+    Paces calls against requests-per-minute and tokens-per-minute budgets (0 disables one).
+    Callers reserve their estimated tokens up front and sleep the returned delay; responses
+    feed back the provider's x-ratelimit-* headers and actual usage, and a 429 pauses
+    everyone until its Retry-After has passed. Without a configured token budget, the limit
+    the provider advertises in its headers is adopted on the first response.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Books one request of `tokens` and returns the seconds to wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            return delay
+
+    def acquire(self, tokens: int) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Returns an over-estimate to the token bucket (or charges an under-estimate)."""
+        if self.tokens is None or actual is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if actual < estimated:
+                self.tokens.refund(estimated - actual, now)
+            else:
+                self.tokens.reserve(actual - estimated, now)
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Syncs the token budget with x-ratelimit-* response headers, when the provider sends them."""
+        limit = headers.get("x-ratelimit-limit-tokens")
+        remaining = headers.get("x-ratelimit-remaining-tokens")
+        if self.tokens is None and not limit:
+            return
+        with self._lock:
+            try:
+                if self.tokens is None:
+                    if float(limit) <= 0:
+                        return
+                    self.tokens = TokenBucket(float(limit))
+                elif limit and float(limit) > 0 and float(limit) != self.tokens.capacity:
+                    self.tokens.resize(float(limit))
+                if remaining is not None:
+                    self.tokens.clamp(float(remaining), time.monotonic())
+            except ValueError:
+                pass
+
+    def backoff(self, headers: Mapping[str, str]) -> Optional[float]:
+        """After a 429: pause every caller until the provider's reset time. Returns the pause, if known."""
+        delay = retry_after(headers)
+        if delay is None:
+            delay = parse_duration(headers.get("x-ratelimit-reset-tokens")) \
+                or parse_duration(headers.get("x-ratelimit-reset-requests"))
+        with self._lock:
+            self.throttled += 1
+            if delay:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+
+def retry_wait(max_backoff_s: float = 30.0, base_s: float = 0.5):
+    """
+    tenacity `wait` callable: full-jitter exponential backoff, but never sooner than the
+    provider's Retry-After when the failure carried one.
+    """
+    def wait(retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        resp = _response(exc) if exc is not None else None
+        hinted = retry_after(resp.headers) if resp is not None else None
+        if hinted:
+            # Small spread so callers released by the same Retry-After don't arrive together.
+            return hinted + random.uniform(0, base_s)
+        return random.uniform(0, min(max_backoff_s, base_s * 2 ** retry_state.attempt_number))
+    return wait
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key      TEXT PRIMARY KEY,
+    codec    TEXT NOT NULL,
+    body     BLOB NOT NULL,
+    size     INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def _compress(text: str):
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=6).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def _decompress(codec: str, body: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    return zlib.decompress(body).decode("utf-8")
+
+
+class ResponseCache:
+    """
+    SQLite store of LLM replies keyed by a hash of the full request (see make_key).
+    Bodies are zstd-compressed (zlib when zstandard is missing). When the stored bytes exceed
+    `max_bytes` the least recently read entries are evicted; `ttl_s` > 0 expires old entries.
+    Only deterministic (temperature 0) calls should be cached; see GroqClient.
+    `clock` supplies wall-clock seconds for ttl and recency (tests pass a fake one).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 << 20, ttl_s: float = 0.0,
+                 clock: Callable[[], float] = time.time):
+        self.path = Path(path)
+        self.clock = clock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, messages: List[Dict[str, Any]]) -> str:
+        raw = json.dumps([model, float(temperature), int(max_tokens), messages],
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = self.clock()
+        with self._lock:
+            row = self._db.execute("SELECT codec, body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_s > 0 and now - row[2] > self.ttl_s:
+                self._delete(key)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                value = _decompress(row[0], row[1])
+            except (ValueError, zlib.error):
+                self._delete(key)
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        codec, body = _compress(value)
+        now = self.clock()
+        with self._lock:
+            self._delete(key)
+            self._db.execute(
+                "INSERT INTO responses (key, codec, body, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, codec, body, len(body), now, now),
+            )
+            self._bytes += len(body)
+            self._evict()
+
+    def _delete(self, key: str) -> None:
+        row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._bytes -= row[0]
+
+    def _evict(self) -> None:
+        if self.ttl_s > 0:
+            cutoff = self.clock() - self.ttl_s
+            expired = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?",
+                                       (cutoff,)).fetchone()[0]
+            self._db.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            self._bytes -= expired
+        while self._bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            for key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "bytes": self._bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
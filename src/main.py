@@ -1,10 +1,17 @@
 import argparse
+import asyncio
+import hashlib
+import sys
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 from src.config import (
     RUBRICS_DIR, QUESTIONS_DIR, STUDENT_SUBMISSIONS_DIR,
-    REPORTS_DIR, GRADED_COPIES_DIR
+    REPORTS_DIR, GRADED_COPIES_DIR, BATCH_WORKERS, BATCH_MAX_ATTEMPTS, BATCH_STATE_DIR,
+    LLM_CONCURRENCY, EXTRACT_WORKERS, WRITE_WORKERS, RENDER_WORKERS, WATCH_DEBOUNCE_S, WATCH_QUEUE_SIZE
 )
+from src.batch import BatchState, print_progress, run_batch
+from src.pipeline import Pipeline, Stage, format_stage_stats
+from src.watcher import SubmissionWatcher
 from src.utils.file_select import list_files, pick_one, pick_many
 from src.utils.read_any import read_text_any
 from src.grader.grade_evaluator import GradeEvaluator
@@ -17,6 +24,114 @@ from src.reporting import (
 def filenames_only(paths: List[str]) -> List[str]:
     return [Path(p).name for p in paths]
 
+def write_reports(grader: GradeEvaluator, idx: Union[int, str], sub_p: Path, student_text: str,
+                  out: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    """Writes the JSON/markdown reports for one graded submission; returns what the graded copy needs."""
+    submission_meta = {
+        "student_name": sub_p.stem,  # adjust if you have a mapping
+        "filename": sub_p.name,
+        "submitted_at": None,
+        "rubric_text": "",           # PDFs shown via retrieved; keep empty
+        "student_text": student_text,
+        "prompt_budget": out.get("budget"),
+    }
+
+    # Convert to GradeResult and include evidence (paths + pages)
+    retrieved_lines = []
+    for r in out["retrieved"]:
+        p = r.get("path", "?")
+        pg = r.get("page", None)
+        sc = r.get("score", 0.0)
+        loc = f"{p}" + (f":p{pg}" if pg else "")
+        retrieved_lines.append(f"[{sc:.4f}] {loc}")
+
+    grade_result = grader.to_grade_result(out["result"], retrieved_lines)
+
+    # Reports
+    json_str = generate_json_report(submission_meta, grade_result)
+    json_path = save_report_json(idx, json_str)
+
+    md_path = None
+    if not args.no_markdown:
+        md = generate_markdown_report(submission_meta, grade_result)
+        md_path = save_report_markdown(idx, md)
+
+    # Graded copy (appendix)
+    appendix = build_appendix_text(submission_meta, grade_result, out["retrieved"])
+    graded_name = sub_p.stem + "__GRADED" + sub_p.suffix
+    graded_out = GRADED_COPIES_DIR / graded_name
+    if sub_p.suffix.lower() != ".pdf":
+        graded_out = graded_out.with_suffix(sub_p.suffix)
+
+    return {"sub_path": sub_p, "json_path": json_path, "md_path": md_path, "appendix": appendix,
+            "graded_out": graded_out, "grade_result": grade_result}
+
+
+def render_graded_copy(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Renders the graded copy; module-level so the pipeline can run it in a worker process."""
+    sub_p = job["sub_path"]
+    if sub_p.suffix.lower() == ".pdf":
+        create_graded_copy_from_pdf(sub_p, job["appendix"], job["graded_out"])
+    else:
+        create_graded_copy_from_text(sub_p, job["appendix"], job["graded_out"])
+    return job
+
+
+def extract_submission(job: Dict[str, Any]) -> Dict[str, Any]:
+    job["text"] = read_text_any(job["path"])
+    return job
+
+
+def print_outputs(job: Dict[str, Any], args: argparse.Namespace) -> None:
+    grade_result = job["grade_result"]
+    if args.print_only:
+        print(f"\n=== {job['sub_path'].name} ===")
+        print(f"Score: {grade_result.score}")
+        print(f"Grade: {grade_result.grade}")
+        print(grade_result.feedback or "")
+    else:
+        print(f"Wrote: {job['json_path']}")
+        if job["md_path"]:
+            print(f"Wrote: {job['md_path']}")
+        print(f"Wrote graded copy: {job['graded_out']}")
+
+
+def write_outputs(grader: GradeEvaluator, idx: Union[int, str], sub_p: Path, student_text: str,
+                  out: Dict[str, Any], args: argparse.Namespace, quiet: bool = False) -> Path:
+    """Reports plus graded copy for one submission, in the calling thread."""
+    job = render_graded_copy(write_reports(grader, idx, sub_p, student_text, out, args))
+    if args.print_only or not quiet:
+        print_outputs(job, args)
+    return job["json_path"]
+
+
+def grading_pipeline(grader: GradeEvaluator, rubric_name: str, question_name: str,
+                     args: argparse.Namespace) -> Pipeline:
+    """
+    extract (processes) -> grade (async LLM calls) -> report (threads) -> graded copy (processes).
+    PDF parsing and reportlab rendering overlap with the network wait instead of taking turns.
+    """
+    async def grade(job: Dict[str, Any]) -> Dict[str, Any]:
+        (job["out"],) = await grader.agrade_many(
+            [job["text"]],
+            assignment_hint=f"Use rubric {rubric_name} and question {question_name}",
+            rubric_allowlist=[rubric_name],
+            question_allowlist=[question_name],
+        )
+        return job
+
+    def report(job: Dict[str, Any]) -> Dict[str, Any]:
+        # Only what the renderer needs crosses to its process.
+        return write_reports(grader, job["idx"], Path(job["path"]), job["text"], job["out"], args)
+
+    return Pipeline([
+        Stage("extract", extract_submission, workers=EXTRACT_WORKERS, kind="process"),
+        Stage("grade", grade, workers=LLM_CONCURRENCY, kind="async"),
+        Stage("report", report, workers=WRITE_WORKERS, kind="thread"),
+        Stage("graded_copy", render_graded_copy, workers=RENDER_WORKERS, kind="process"),
+    ])
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--rubric", default="", help="Rubric filename (inside data/rubrics). If omitted, interactive select.")
@@ -24,7 +139,14 @@ def main():
     parser.add_argument("--subs", default="", help="Comma-separated submission filenames (inside data/student_submission), or omit for interactive multi-select.")
     parser.add_argument("--print_only", action="store_true", help="Only print results to console (still writes graded copy).")
     parser.add_argument("--no_markdown", action="store_true", help="Skip markdown report generation.")
+    parser.add_argument("--batch", action="store_true", help="Headless, resumable run: needs --rubric and --question; --subs defaults to every submission.")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Submissions graded at once in --batch mode.")
+    parser.add_argument("--max_attempts", type=int, default=BATCH_MAX_ATTEMPTS, help="Attempts per submission before it is dead-lettered (--batch).")
+    parser.add_argument("--state", default="", help="Batch state file (default: one per rubric/question pair in data/batch).")
+    parser.add_argument("--watch", action="store_true", help="Daemon: grade files as they land in data/student_submission (needs --rubric and --question).")
     args = parser.parse_args()
+    if (args.batch or args.watch) and not (args.rubric and args.question):
+        parser.error("--batch and --watch need --rubric and --question")
 
     rubrics = list_files(RUBRICS_DIR)
     questions = list_files(QUESTIONS_DIR)
@@ -55,75 +177,137 @@ def main():
             if not match:
                 raise FileNotFoundError(f"Submission not found: {w}")
             chosen_subs.append(match)
+    elif args.batch or args.watch:
+        chosen_subs = submissions
     else:
         chosen_subs = pick_many(submissions, prompt="Select student submissions")
 
     rubric_name = Path(rubric_path).name
     question_name = Path(question_path).name
 
-    rubric_allow = [rubric_name]
-    question_allow = [question_name]
 
     grader = GradeEvaluator()
 
-    for idx, sub_path in enumerate(chosen_subs, start=1):
-        sub_p = Path(sub_path)
-        student_text = read_text_any(sub_path)
+    if args.watch:
+        run_watch_mode(grader, rubric_name, question_name, args)
+        print_stats(grader)
+        return
+    if args.batch:
+        run_batch_mode(grader, chosen_subs, rubric_name, question_name, args)
+        print_stats(grader)
+        return
+
+    # Submissions stream through the stages; each stage works on a different submission at once.
+    pipeline = grading_pipeline(grader, rubric_name, question_name, args)
+    jobs = [{"idx": idx, "path": p} for idx, p in enumerate(chosen_subs, start=1)]
+    for sub_path, job in zip(chosen_subs, asyncio.run(pipeline.run(jobs))):
+        if isinstance(job, Exception):
+            print(f"Failed to grade {Path(sub_path).name}: {job}")
+            continue
+        print_outputs(job, args)
+
+    for line in format_stage_stats(pipeline.stats()):
+        print(line)
+    print_stats(grader)
+
+
+def batch_state(rubric_name: str, question_name: str, args: argparse.Namespace) -> BatchState:
+    pair = hashlib.sha256(f"{rubric_name}\0{question_name}".encode("utf-8")).hexdigest()[:16]
+    return BatchState(args.state or str(Path(BATCH_STATE_DIR) / f"state_{pair}.json"), max_attempts=args.max_attempts)
+
 
-        submission_meta = {
-            "student_name": sub_p.stem,  # adjust if you have a mapping
-            "filename": sub_p.name,
-            "submitted_at": None,
-            "rubric_text": "",           # PDFs shown via retrieved; keep empty
-            "student_text": student_text
-        }
+def run_watch_mode(grader: GradeEvaluator, rubric_name: str, question_name: str, args: argparse.Namespace) -> None:
+    """Grades every new or changed submission until Ctrl+C; shares its state file with --batch."""
+    state = batch_state(rubric_name, question_name, args)
 
-        out = grader.grade(
-            student_text,
+    async def grade(text: str) -> Dict[str, Any]:
+        (out,) = await grader.agrade_many(
+            [text],
             assignment_hint=f"Use rubric {rubric_name} and question {question_name}",
-            rubric_allowlist=rubric_allow,
-            question_allowlist=question_allow,
+            rubric_allowlist=[rubric_name],
+            question_allowlist=[question_name],
         )
+        return out
 
-        # Convert to GradeResult and include evidence (paths + pages)
-        retrieved_lines = []
-        for r in out["retrieved"]:
-            p = r.get("path", "?")
-            pg = r.get("page", None)
-            sc = r.get("score", 0.0)
-            loc = f"{p}" + (f":p{pg}" if pg else "")
-            retrieved_lines.append(f"[{sc:.4f}] {loc}")
+    def on_result(path: str, text: str, out: Dict[str, Any]) -> Path:
+        # Named by content, apart from the positional --batch reports: stable across runs and restarts.
+        idx = "watch_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        return write_outputs(grader, idx, Path(path), text, out, args, quiet=True)
 
-        grade_result = grader.to_grade_result(out["result"], retrieved_lines)
+    def on_event(path: str, status: str, latency_s: float, error: Optional[str]) -> None:
+        name = Path(path).name
+        if status == "done":
+            print(f"Graded {name} ({latency_s:.1f}s after it settled)")
+        elif status == "dead":
+            print(f"Gave up on {name} after {args.max_attempts} attempts: {error}")
+        else:
+            print(f"Failed {name}: {error}; will retry")
 
-        # Reports
-        json_str = generate_json_report(submission_meta, grade_result)
-        json_path = save_report_json(idx, json_str)
+    watcher = SubmissionWatcher(
+        STUDENT_SUBMISSIONS_DIR, state, grade, on_result, workers=args.workers,
+        write_workers=WRITE_WORKERS, extract_workers=EXTRACT_WORKERS, quiet_s=WATCH_DEBOUNCE_S,
+        queue_size=WATCH_QUEUE_SIZE, on_event=on_event,
+    )
+    print(f"Watching {STUDENT_SUBMISSIONS_DIR} (Ctrl+C to stop); state in {state.path}")
+    try:
+        asyncio.run(watcher.run())
+    except KeyboardInterrupt:
+        pass
+    for line in format_stage_stats(watcher.pipeline.stats()):
+        print(line)
 
-        if not args.no_markdown:
-            md = generate_markdown_report(submission_meta, grade_result)
-            md_path = save_report_markdown(idx, md)
 
-        # Graded copy (appendix)
-        appendix = build_appendix_text(submission_meta, grade_result, out["retrieved"])
-        graded_name = sub_p.stem + "__GRADED" + sub_p.suffix
-        graded_out = GRADED_COPIES_DIR / graded_name
+def run_batch_mode(grader: GradeEvaluator, chosen_subs: List[str], rubric_name: str,
+                   question_name: str, args: argparse.Namespace) -> None:
+    state = batch_state(rubric_name, question_name, args)
+    pending = state.todo(chosen_subs)
+    skipped = len(chosen_subs) - len(pending)
+    print(f"Batch: {len(pending)} to grade, {skipped} already done or dead-lettered")
 
-        if sub_p.suffix.lower() == ".pdf":
-            create_graded_copy_from_pdf(sub_p, appendix, graded_out)
-        else:
-            create_graded_copy_from_text(sub_p, appendix, graded_out.with_suffix(sub_p.suffix))
+    # Report numbering follows the submission's position in the full list, so reruns overwrite in place.
+    index = {p: i for i, p in enumerate(chosen_subs, start=1)}
 
-        if args.print_only:
-            print(f"\n=== {sub_p.name} ===")
-            print(f"Score: {grade_result.score}")
-            print(f"Grade: {grade_result.grade}")
-            print(grade_result.feedback or "")
-        else:
-            print(f"Wrote: {json_path}")
-            if not args.no_markdown:
-                print(f"Wrote: {md_path}")
-            print(f"Wrote graded copy: {graded_out}")
+    async def grade(text: str) -> Dict[str, Any]:
+        (out,) = await grader.agrade_many(
+            [text],
+            assignment_hint=f"Use rubric {rubric_name} and question {question_name}",
+            rubric_allowlist=[rubric_name],
+            question_allowlist=[question_name],
+        )
+        return out
+
+    def on_result(path: str, text: str, out: Dict[str, Any]) -> Path:
+        return write_outputs(grader, index[path], Path(path), text, out, args, quiet=True)
+
+    meter = asyncio.run(run_batch(state, pending, grade, on_result, workers=args.workers,
+                                  progress=print_progress, write_workers=WRITE_WORKERS,
+                                  extract_workers=EXTRACT_WORKERS))
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    counts = state.counts()
+    print(f"Batch finished: {counts['done']} done, {counts['dead']} dead-lettered, "
+          f"{meter.rate() * 60:.1f} submissions/min; state in {state.path}")
+    for line in format_stage_stats(meter.stages):
+        print(line)
+    for item in state.dead_letters():
+        print(f"Dead letter: {item['filename']} after {item['attempts']} attempts ({item.get('error')})")
+
+
+def print_stats(grader: GradeEvaluator) -> None:
+    stats = grader.stats()
+    rc = stats["retrieval_cache"]
+    print(f"Retrieval cache: {rc['hits']} hits, {rc['misses']} misses")
+    lc = stats["llm_cache"]
+    if lc:
+        print(f"LLM response cache: {lc['hits']} hits, {lc['misses']} misses ({lc['hit_rate']:.0%} hit rate)")
+    if stats["providers"]:
+        for name, ep in stats["providers"]["endpoints"].items():
+            p50 = f"{ep['p50_s']:.2f}s" if ep["p50_s"] is not None else "n/a"
+            print(f"Endpoint {name}: {ep['calls']} calls, p50 {p50}, {ep['error_rate']:.0%} errors")
+    so = stats["structured_output"]
+    if so["replies"]:
+        print(f"Structured output: {so['failure_rate']:.0%} of {so['replies']} replies invalid, "
+              f"{so['repaired']}/{so['repairs']} repaired")
 
 if __name__ == "__main__":
     main()
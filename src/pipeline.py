@@ -0,0 +1,172 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Union
+
+KINDS = ("async", "thread", "process")
+
+
+@dataclass
+class Stage:
+    """
+    One step of a Pipeline. `fn(item) -> item` runs on `workers` concurrent workers:
+    awaited on the event loop ("async", for network calls), in a thread pool ("thread",
+    for file writes) or in a process pool ("process", for CPU work; `fn` and items must
+    pickle). The queue in front of a stage holds at most `queue_size` items (default
+    2 * workers), so a slow stage holds back the ones before it instead of piling up memory.
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    kind: str = "thread"
+    queue_size: int = 0
+
+    def __post_init__(self):
+        if self.kind not in KINDS:
+            raise ValueError(f"Stage {self.name}: kind must be one of {KINDS}")
+        self.workers = max(1, self.workers)
+        self.queue_size = self.queue_size or 2 * self.workers
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    failed: int = 0
+    busy_s: float = 0.0
+    depth_sum: int = 0
+    depth_max: int = 0
+    samples: int = 0
+
+    def sample(self, depth: int) -> None:
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.samples += 1
+
+
+class _Failed:
+    """Carries an item's exception past the remaining stages to its result slot."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues, every stage working at once.
+    run() returns one result per input item, in input order; an item whose stage raised
+    yields that exception and skips the stages after it. stats() reports per stage the
+    average and peak depth of its input queue and its utilization (busy time over
+    workers * wall time): the bottleneck is the stage near 100% with a full queue in front.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.stats_by_stage: Dict[str, StageStats] = {s.name: StageStats() for s in stages}
+        self.wall_s = 0.0
+
+    def _executor(self, stage: Stage) -> Optional[Executor]:
+        if stage.kind == "process":
+            return ProcessPoolExecutor(max_workers=stage.workers)
+        if stage.kind == "thread":
+            return ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=f"stage-{stage.name}")
+        return None
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterable[Any]], collect: bool = True) -> List[Any]:
+        """
+        `items` may be an async iterable (e.g. a queue fed by a file watcher); the feeder then
+        waits for each item, and a full first queue pauses the source. With collect=False the
+        last stage's outputs are dropped as they finish (long-running feeds) and [] is returned.
+        """
+        loop = asyncio.get_running_loop()
+        queues = [asyncio.Queue(maxsize=s.queue_size) for s in self.stages]
+        executors = [self._executor(s) for s in self.stages]
+        results: Dict[int, Any] = {}
+        started = time.perf_counter()
+
+        async def worker(i: int) -> None:
+            stage, stats, q = self.stages[i], self.stats_by_stage[self.stages[i].name], queues[i]
+            nxt = queues[i + 1] if i + 1 < len(queues) else None
+            while True:
+                stats.sample(q.qsize())
+                entry = await q.get()
+                if entry is _DONE:
+                    return
+                idx, item = entry
+                if not isinstance(item, _Failed):
+                    t0 = time.perf_counter()
+                    try:
+                        if stage.kind == "async":
+                            item = await stage.fn(item)
+                        else:
+                            item = await loop.run_in_executor(executors[i], stage.fn, item)
+                        stats.processed += 1
+                    except Exception as e:
+                        stats.failed += 1
+                        item = _Failed(e)
+                    stats.busy_s += time.perf_counter() - t0
+                if nxt is not None:
+                    await nxt.put((idx, item))
+                elif collect:
+                    results[idx] = item.error if isinstance(item, _Failed) else item
+
+        async def stage_group(i: int) -> None:
+            await asyncio.gather(*(worker(i) for _ in range(self.stages[i].workers)))
+            if i + 1 < len(queues):
+                for _ in range(self.stages[i + 1].workers):
+                    await queues[i + 1].put(_DONE)
+
+        async def feed() -> int:
+            n = 0
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await queues[0].put((n, item))
+                    n += 1
+            else:
+                for n, item in enumerate(items, start=1):
+                    await queues[0].put((n - 1, item))
+            for _ in range(self.stages[0].workers):
+                await queues[0].put(_DONE)
+            return n
+
+        try:
+            count, *_ = await asyncio.gather(feed(), *(stage_group(i) for i in range(len(self.stages))))
+        finally:
+            for ex in executors:
+                if ex is not None:
+                    ex.shutdown(wait=False, cancel_futures=True)
+            self.wall_s += time.perf_counter() - started
+        return [results[i] for i in range(count)] if collect else []
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for stage in self.stages:
+            st = self.stats_by_stage[stage.name]
+            out[stage.name] = {
+                "kind": stage.kind,
+                "workers": stage.workers,
+                "processed": st.processed,
+                "failed": st.failed,
+                "utilization": st.busy_s / (stage.workers * self.wall_s) if self.wall_s > 0 else 0.0,
+                "queue_avg": st.depth_sum / st.samples if st.samples else 0.0,
+                "queue_max": st.depth_max,
+                "queue_size": stage.queue_size,
+            }
+        return out
+
+    def bottleneck(self) -> Optional[str]:
+        stats = self.stats()
+        return max(stats, key=lambda n: stats[n]["utilization"]) if stats else None
+
+
+def format_stage_stats(stats: Dict[str, Dict[str, Any]]) -> List[str]:
+    return [
+        f"Stage {name} ({s['kind']} x{s['workers']}): {s['processed']} done, {s['failed']} failed, "
+        f"{s['utilization']:.0%} busy, queue avg {s['queue_avg']:.1f}/max {s['queue_max']} of {s['queue_size']}"
+        for name, s in stats.items()
+    ]
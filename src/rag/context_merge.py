@@ -0,0 +1,103 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .text_utils import doc_text
+
+Hit = Tuple[float, Dict[str, Any]]
+
+SHINGLE_WORDS = 5
+# A passage whose shingles are this much contained in an already kept passage adds nothing new.
+DUPLICATE_CONTAINMENT = 0.8
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class Passage:
+    path: str
+    page: Optional[int]
+    score: float                        # best score among the merged hits
+    text: str
+    ids: List[str] = field(default_factory=list)
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+def _shingles(text: str) -> Set[int]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _spans(group: List[Hit]) -> List[Passage]:
+    """Merges overlapping or touching offset spans of one page back into single passages."""
+    score0, doc0 = group[0]
+    meta0 = doc0.get("meta", {})
+    source = doc0.get("source")
+    if source is None:
+        return [Passage(meta0.get("path", "?"), meta0.get("page"), s, doc_text(d), [d.get("id", "")])
+                for s, d in group]
+    ordered = sorted(group, key=lambda h: h[1]["meta"].get("start", 0))
+    out: List[Passage] = []
+    for score, doc in ordered:
+        start, end = doc["meta"].get("start", 0), doc["meta"].get("end", len(source))
+        last = out[-1] if out else None
+        if last is not None and start <= last.end:
+            last.end = max(last.end, end)
+            last.score = max(last.score, score)
+            last.ids.append(doc.get("id", ""))
+        else:
+            out.append(Passage(meta0.get("path", "?"), meta0.get("page"), score, "", [doc.get("id", "")], start, end))
+    for p in out:
+        p.text = source[p.start:p.end]
+    return out
+
+
+def merge_hits(hits: List[Hit]) -> List[Passage]:
+    """
+    Groups hits by page (the shared `source` buffer, else path/page), merges overlapping chunk
+    spans of a page into one passage and drops passages that near-duplicate a better one.
+    Passages come back best score first.
+    """
+    groups: Dict[Any, List[Hit]] = {}
+    for score, doc in hits:
+        meta = doc.get("meta", {})
+        source = doc.get("source")
+        if source is not None:
+            key = (meta.get("path"), meta.get("page"))           # one source buffer per page
+        else:
+            key = ("text", doc.get("id"), id(doc))   # standalone record, nothing to merge with
+        groups.setdefault(key, []).append((score, doc))
+
+    passages = [p for group in groups.values() for p in _spans(group)]
+    passages.sort(key=lambda p: -p.score)
+    kept: List[Passage] = []
+    seen: List[Set[int]] = []
+    for p in passages:
+        sh = _shingles(p.text)
+        if not sh:
+            continue
+        if any(len(sh & other) >= DUPLICATE_CONTAINMENT * len(sh) for other in seen):
+            continue
+        kept.append(p)
+        seen.append(sh)
+    return kept
+
+
+def render_passages(passages: List[Passage]) -> str:
+    """
+    One "[score=..] path:pN ::" header per page, in the block layout the prompt has always used;
+    separate passages of the same page follow it in offset order, joined by "[...]".
+    """
+    by_loc: Dict[Tuple[str, Optional[int]], List[Passage]] = {}
+    for p in passages:
+        by_loc.setdefault((p.path, p.page), []).append(p)
+    lines = []
+    for (path, page), ps in by_loc.items():
+        ps.sort(key=lambda p: p.start or 0)
+        loc = f"{path}" + (f":p{page}" if page is not None else "")
+        score = max(p.score for p in ps)
+        lines.append(f"[score={round(score, 4)}] {loc} :: " + " [...] ".join(p.text for p in ps))
+    return "\n---\n".join(lines)
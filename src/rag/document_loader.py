@@ -1,6 +1,8 @@
 from pathlib import Path
 from typing import List, Tuple
-import re
+from fnmatch import fnmatch
+from .text_utils import clean, iter_chunk_spans
+from .scanner import scan_tree
 
 try:
     from pypdf import PdfReader
@@ -14,17 +16,8 @@ except Exception:
 
 
 def _chunk_text(text: str, chunk_size: int = 800, overlap: int = 120, min_chars: int = 120) -> List[str]:
-    text = re.sub(r"\s+", " ", text).strip()
-    chunks: List[str] = []
-    i = 0
-    L = len(text)
-    step = max(1, chunk_size - overlap)
-    while i < L:
-        chunk = text[i:i+chunk_size]
-        if len(chunk) >= min_chars:
-            chunks.append(chunk)
-        i += step
-    return chunks
+    text = clean(text)
+    return [text[s:e] for s, e in iter_chunk_spans(text, chunk_size, overlap) if e - s >= min_chars]
 
 
 def load_file(path: Path) -> str:
@@ -80,21 +73,22 @@ def load_corpus(
         root = Path(root)
         if not root.exists():
             continue
-        for pattern in glob_patterns:
-            for f in root.rglob(pattern):
-                if not f.is_file():
+        # Single walk per root; patterns are matched against each file name.
+        for path, _, _ in scan_tree(str(root)):
+            f = Path(path)
+            if not any(fnmatch(f.name, pattern) for pattern in glob_patterns):
+                continue
+            try:
+                raw = load_file(f)
+                if not raw.strip():
                     continue
-                try:
-                    raw = load_file(f)
-                    if not raw.strip():
-                        continue
-                    chunks = _chunk_text(raw, chunk_size, overlap, min_chars)
-                    if not chunks:
-                        continue
-                    rel = f.relative_to(root).as_posix() if f.is_relative_to(root) else f.as_posix()
-                    for n, ch in enumerate(chunks):
-                        doc_id = f"{rel}::chunk_{n}"
-                        all_chunks.append((doc_id, ch))
-                except Exception:
+                chunks = _chunk_text(raw, chunk_size, overlap, min_chars)
+                if not chunks:
                     continue
+                rel = f.relative_to(root).as_posix() if f.is_relative_to(root) else f.as_posix()
+                for n, ch in enumerate(chunks):
+                    doc_id = f"{rel}::chunk_{n}"
+                    all_chunks.append((doc_id, ch))
+            except Exception:
+                continue
     return all_chunks
@@ -0,0 +1,134 @@
+"""
+Versioned on-disk layout for retrieval indexes:
+
+    <index_dir>/meta.json              format version, corpus manifest, params, extra state
+    <index_dir>/<name>.npy             dense arrays (e.g. document frequencies)
+    <index_dir>/<name>.data.npy        CSR matrix arrays, memory-mapped on load
+    <index_dir>/<name>.indices.npy
+    <index_dir>/<name>.indptr.npy
+    <index_dir>/docs.jsonl             chunk metadata table, one record per matrix row
+    <index_dir>/sources.jsonl          page buffers shared by chunk records (docs hold an index)
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .text_utils import doc_text
+
+INDEX_FORMAT_VERSION = 5
+
+_CSR_PARTS = ("data", "indices", "indptr")
+
+
+def corpus_manifest(docs: Iterable[Dict[str, Any]], params: Optional[Dict[str, Any]] = None) -> str:
+    """Digest of everything that feeds the index; a change means the index must be rebuilt."""
+    h = hashlib.sha256()
+    h.update(json.dumps(params or {}, sort_keys=True).encode("utf-8"))
+    for d in docs:
+        meta = d.get("meta", {})
+        h.update(json.dumps(
+            [d.get("id"), meta.get("path"), meta.get("type"), meta.get("page"), doc_text(d)],
+            ensure_ascii=False,
+        ).encode("utf-8"))
+    return h.hexdigest()
+
+
+def read_meta(index_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(Path(index_dir) / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != INDEX_FORMAT_VERSION:
+        return None
+    return meta
+
+
+def save_index(
+    index_dir: str,
+    matrices: Dict[str, csr_matrix],
+    arrays: Dict[str, np.ndarray],
+    docs: List[Dict[str, Any]],
+    manifest: str,
+    params: Dict[str, Any],
+    extra: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Writes into a sibling temp dir and swaps it in, so readers never see a half-written index."""
+    target = Path(index_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+
+    shapes = {}
+    for name, m in matrices.items():
+        m = csr_matrix(m)
+        shapes[name] = list(m.shape)
+        for part in _CSR_PARTS:
+            np.save(tmp / f"{name}.{part}.npy", getattr(m, part))
+    for name, a in arrays.items():
+        np.save(tmp / f"{name}.npy", np.asarray(a))
+    # Chunks of one page share a source string; write each source once.
+    source_ids: Dict[int, int] = {}
+    with open(tmp / "sources.jsonl", "w", encoding="utf-8") as sf, \
+            open(tmp / "docs.jsonl", "w", encoding="utf-8") as f:
+        for d in docs:
+            if isinstance(d.get("source"), str):
+                src = d["source"]
+                if id(src) not in source_ids:
+                    source_ids[id(src)] = len(source_ids)
+                    sf.write(json.dumps(src, ensure_ascii=False) + "\n")
+                d = {**d, "source": source_ids[id(src)]}
+            f.write(json.dumps(d, ensure_ascii=False) + "\n")
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "version": INDEX_FORMAT_VERSION,
+            "manifest": manifest,
+            "params": params,
+            "matrices": shapes,
+            "arrays": sorted(arrays),
+            "extra": extra or {},
+        }, f)
+
+    old = target.with_name(f"{target.name}.old-{os.getpid()}")
+    if target.exists():
+        os.replace(target, old)
+    os.replace(tmp, target)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _load_csr(base: Path, name: str, shape: List[int], mmap: bool) -> csr_matrix:
+    # Copy-on-write maps: pages are shared with the file until something writes to them.
+    mode = "c" if mmap else None
+    parts = {part: np.load(base / f"{name}.{part}.npy", mmap_mode=mode) for part in _CSR_PARTS}
+    # Assign the arrays directly; the csr_matrix constructor would copy them into memory.
+    m = csr_matrix(tuple(shape), dtype=parts["data"].dtype)
+    m.data, m.indices, m.indptr = parts["data"], parts["indices"], parts["indptr"]
+    m.has_canonical_format = True
+    return m
+
+
+def load_index(index_dir: str, mmap: bool = True, with_docs: bool = True) -> Dict[str, Any]:
+    """Returns {"meta", "matrices", "arrays", "docs"}; raises if the index is missing or stale."""
+    base = Path(index_dir)
+    meta = read_meta(index_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No index (format v{INDEX_FORMAT_VERSION}) at {base}")
+    matrices = {name: _load_csr(base, name, shape, mmap) for name, shape in meta["matrices"].items()}
+    arrays = {name: np.load(base / f"{name}.npy") for name in meta["arrays"]}
+    docs = None
+    if with_docs:
+        with open(base / "sources.jsonl", "r", encoding="utf-8") as f:
+            sources = [json.loads(line) for line in f if line.strip()]
+        with open(base / "docs.jsonl", "r", encoding="utf-8") as f:
+            docs = [json.loads(line) for line in f if line.strip()]
+        for d in docs:
+            if "source" in d:
+                d["source"] = sources[d["source"]]
+    return {"meta": meta, "matrices": matrices, "arrays": arrays, "docs": docs}
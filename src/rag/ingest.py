@@ -1,76 +1,175 @@
 from pathlib import Path
-from typing import Dict, List
-from .text_utils import clean, chunk_text
-from .pdf_utils import extract_pdf_pages
+from typing import Dict, List, Optional
+from .text_utils import clean, iter_chunk_spans
+from .pdf_utils import extract_pdf_pages, extract_pdf_pages_many
+from .ingest_cache import IngestCache, file_digest
+from .scanner import Manifest, scan_tree
 import json
 
 ALLOWED_EXT = {".pdf", ".txt", ".md", ".json"}
 
-def _load_dir(folder: str, chunk_size: int, overlap: int, tag: str) -> List[Dict]:
-    records: List[Dict] = []
-    if not folder:
-        return records
-    base = Path(folder)
-    if not base.exists():
-        return records
+def _failed(e: BaseException) -> Dict:
+    return {"sources": [], "chunks": [], "error": f"{type(e).__name__}: {e}"}
 
-    rid = 0
-    for p in base.rglob("*"):
-        if p.is_dir() or p.suffix.lower() not in ALLOWED_EXT:
-            continue
+def _extract_file(p: Path, chunk_size: int, overlap: int, pages: Optional[List[Dict]] = None,
+                  boundary: str = "") -> Dict:
+    """
+    Extracts one file into {"sources": [...], "chunks": [...]}.
+    Each source is a whitespace-normalized page (or the whole text file); chunks are
+    (source, start, end) offsets into it plus page/note, never copies of the text.
+    Ids and paths are assigned by the caller.
+    PDFs may pass already-extracted `pages` (from the process pool).
+    A file that could not be read comes back empty with an "error" and is not cached.
+    """
+    keep_paragraphs = boundary == "paragraph"
+    sources: List[str] = []
+    chunks: List[Dict] = []
 
-        rel = f"{tag}/{p.name}"
+    def add_source(text: str, **meta):
+        sources.append(text)
+        for start, end in iter_chunk_spans(text, chunk_size, overlap, boundary or None):
+            chunks.append({"source": len(sources) - 1, "start": start, "end": end, **meta})
 
-        if p.suffix.lower() == ".pdf":
+    if p.suffix.lower() == ".pdf":
+        if pages is None:
             try:
                 pages = extract_pdf_pages(str(p))
-            except Exception:
-                pages = []
-            for pg in pages:
-                page_text = clean(pg["text"])
-                if not page_text.strip():
-                    records.append({
-                        "id": f"{tag}-{rid}",
-                        "text": "",
-                        "meta": {"path": rel, "page": pg["page_index"] + 1, "type": tag, "note": "EMPTY_OR_SCANNED"}
-                    })
-                    rid += 1
-                    continue
-                for ch in chunk_text(page_text, chunk_size, overlap):
-                    records.append({
-                        "id": f"{tag}-{rid}",
-                        "text": ch,
-                        "meta": {"path": rel, "page": pg["page_index"] + 1, "type": tag}
-                    })
-                    rid += 1
-            continue
-
-        # text-like
+            except Exception as e:
+                return _failed(e)
+        for pg in pages:
+            page_text = clean(pg["text"], keep_paragraphs=keep_paragraphs)
+            if not page_text:
+                chunks.append({"page": pg["page_index"] + 1, "note": "EMPTY_OR_SCANNED"})
+                continue
+            add_source(page_text, page=pg["page_index"] + 1)
+        return {"sources": sources, "chunks": chunks}
+
+    # text-like
+    try:
+        raw = p.read_text(encoding="utf-8", errors="ignore")
+    except Exception as e:
+        return _failed(e)
+    if p.suffix.lower() == ".json":
         try:
-            raw = p.read_text(encoding="utf-8", errors="ignore")
+            raw = json.dumps(json.loads(raw), ensure_ascii=False, indent=2)
         except Exception:
-            raw = ""
-        if p.suffix.lower() == ".json":
-            try:
-                raw = json.dumps(json.loads(raw), ensure_ascii=False, indent=2)
-            except Exception:
-                pass
-        text = clean(raw)
-        for ch in chunk_text(text, chunk_size, overlap):
-            records.append({
-                "id": f"{tag}-{rid}",
-                "text": ch,
-                "meta": {"path": rel, "type": tag}
-            })
-            rid += 1
+            pass
+    add_source(clean(raw, keep_paragraphs=keep_paragraphs))
+    return {"sources": sources, "chunks": chunks}
+
+
+def _cache_key(p: Path, chunk_size: int, overlap: int, boundary: str,
+               cache: Optional[IngestCache], digest: Optional[str] = None) -> Optional[str]:
+    if cache is None:
+        return None
+    try:
+        return cache.key_for(digest or file_digest(str(p)), chunk_size, overlap, boundary)
+    except OSError:
+        return None
+
+
+def _store(cache: Optional[IngestCache], key: Optional[str], entry: Dict) -> None:
+    # A failed extraction is retried next time rather than remembered as an empty file.
+    if cache is None or not key or entry.get("error"):
+        return
+    try:
+        cache.put(key, entry)
+    except OSError:
+        pass
+
+
+def _load_dir(folder: str, chunk_size: int, overlap: int, tag: str,
+              cache: Optional[IngestCache] = None, workers: int = 1, boundary: str = "",
+              manifest: Optional[Manifest] = None) -> List[Dict]:
+    if not folder:
+        return []
+    base = Path(folder)
+    if not base.exists():
+        return []
+
+    # One directory walk; with a manifest, unchanged files reuse their recorded hash.
+    if manifest is not None:
+        files = [Path(f) for f in manifest.refresh(folder, ALLOWED_EXT).files]
+    else:
+        files = [Path(f) for f, _, _ in scan_tree(folder, ALLOWED_EXT)]
+
+    # Resolve cache hits first so only the misses go through PDF extraction.
+    keys = [
+        _cache_key(p, chunk_size, overlap, boundary, cache, digest=manifest.digest(str(p)) if manifest else None)
+        for p in files
+    ]
+    entries: List[Optional[Dict]] = [cache.get(k) if k else None for k in keys]
+
+    missing_pdfs = [i for i, p in enumerate(files) if entries[i] is None and p.suffix.lower() == ".pdf"]
+    extracted = extract_pdf_pages_many(
+        [str(files[i]) for i in missing_pdfs], workers=workers, return_exceptions=True
+    )
+    pdf_pages = {i: pages for i, pages in zip(missing_pdfs, extracted)}
+
+    for i, p in enumerate(files):
+        if isinstance(pdf_pages.get(i), BaseException):
+            entries[i] = _failed(pdf_pages[i])
+        elif entries[i] is None:
+            entries[i] = _extract_file(p, chunk_size, overlap, pages=pdf_pages.get(i), boundary=boundary)
+            _store(cache, keys[i], entries[i])
+
+    records: List[Dict] = []
+    for p, entry in zip(files, entries):
+        records += _entry_records(entry, f"{tag}/{p.name}", tag, id_start=len(records))
     return records
 
 
+def _entry_records(entry: Dict, rel: str, tag: str, id_start: int = 0, id_prefix: str = "") -> List[Dict]:
+    """
+    Chunk records for one cache entry. Chunks of the same page share one `source` string
+    and carry meta.start/meta.end; use text_utils.doc_text to get a chunk's text.
+    """
+    sources = entry["sources"]
+    records: List[Dict] = []
+    for n, ch in enumerate(entry["chunks"], start=id_start):
+        meta = {"path": rel, "type": tag}
+        if "page" in ch:
+            meta["page"] = ch["page"]
+        if "note" in ch:
+            meta["note"] = ch["note"]
+        rec = {"id": f"{tag}-{id_prefix}{n}", "meta": meta}
+        if "source" in ch:
+            meta["start"], meta["end"] = ch["start"], ch["end"]
+            rec["source"] = sources[ch["source"]]
+        else:
+            rec["text"] = ""
+        records.append(rec)
+    return records
+
+
+def load_file(path: str, chunk_size: int, overlap: int, tag: str,
+              cache_dir: Optional[str] = None, boundary: str = "") -> List[Dict]:
+    """
+    Records for a single file, for incremental index updates.
+    Ids are namespaced by file name so they cannot collide with the bulk-loaded ids.
+    """
+    p = Path(path)
+    cache = IngestCache(cache_dir) if cache_dir else None
+    key = _cache_key(p, chunk_size, overlap, boundary, cache)
+    entry = cache.get(key) if key else None
+    if entry is None:
+        entry = _extract_file(p, chunk_size, overlap, boundary=boundary)
+        _store(cache, key, entry)
+    return _entry_records(entry, f"{tag}/{p.name}", tag, id_prefix=f"{p.name}-")
+
+
 def load_corpus(rubrics_dir: str, questions_dir: str, solutions_dir: str,
-                chunk_size: int, overlap: int) -> List[Dict]:
+                chunk_size: int, overlap: int, cache_dir: Optional[str] = None,
+                workers: int = 1, boundary: str = "", manifest: Optional[Manifest] = None) -> List[Dict]:
+    """
+    Chunk records for every knowledge file. Pass a Manifest to skip re-hashing unchanged
+    files; the caller owns saving it.
+    """
+    cache = IngestCache(cache_dir) if cache_dir else None
+    opts = dict(cache=cache, workers=workers, boundary=boundary, manifest=manifest)
     corpus: List[Dict] = []
-    corpus += _load_dir(rubrics_dir, chunk_size, overlap, tag="rubric")
-    corpus += _load_dir(questions_dir, chunk_size, overlap, tag="question")
+    corpus += _load_dir(rubrics_dir, chunk_size, overlap, tag="rubric", **opts)
+    corpus += _load_dir(questions_dir, chunk_size, overlap, tag="question", **opts)
     if solutions_dir:
-        corpus += _load_dir(solutions_dir, chunk_size, overlap, tag="solution")
+        corpus += _load_dir(solutions_dir, chunk_size, overlap, tag="solution", **opts)
     return corpus
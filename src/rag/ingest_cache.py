@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+# Bump when the layout of a cache entry changes so stale entries are ignored.
+CACHE_VERSION = 2
+
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IngestCache:
+    """
+    On-disk cache of extracted pages and chunk records, one JSON file per entry.
+    Entries are keyed by file content hash plus chunk settings, so renaming a file
+    still hits and changing CHUNK_SIZE / CHUNK_OVERLAP / CHUNK_BOUNDARY misses.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, digest: str, chunk_size: int, overlap: int, boundary: str = "") -> str:
+        raw = f"v{CACHE_VERSION}:{digest}:{chunk_size}:{overlap}:{boundary}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        p = self._entry_path(key)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry.get("version") != CACHE_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict) -> None:
+        p = self._entry_path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**entry, "version": CACHE_VERSION}, f, ensure_ascii=False)
+        os.replace(tmp, p)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,46 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+Partitions = Dict[str, Dict[str, np.ndarray]]
+
+
+def build_partitions(docs: List[Dict[str, Any]]) -> Partitions:
+    """Row ids grouped by meta.type and by meta.path."""
+    by_type: Dict[str, List[int]] = {}
+    by_path: Dict[str, List[int]] = {}
+    for i, d in enumerate(docs):
+        meta = d.get("meta", {})
+        by_type.setdefault(meta.get("type"), []).append(i)
+        by_path.setdefault(meta.get("path", ""), []).append(i)
+    return {
+        "type": {t: np.asarray(rows, dtype=np.int64) for t, rows in by_type.items()},
+        "path": {p: np.asarray(rows, dtype=np.int64) for p, rows in by_path.items()},
+    }
+
+
+def filter_key(filters: Optional[Dict[str, Any]]):
+    if not filters:
+        return None
+    return (filters.get("type"), tuple(filters.get("path_contains") or ()))
+
+
+def rows_for(partitions: Partitions, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """
+    Row ids matching `filters`, or None for "all rows". Supported keys:
+      type:          exact meta.type
+      path_contains: list of names; a row matches if any is a case-insensitive
+                     substring of meta.path (empty list = no constraint)
+    Only the distinct paths are scanned, never the individual chunks.
+    """
+    if not filters:
+        return None
+    rows = None
+    doc_type = filters.get("type")
+    if doc_type is not None:
+        rows = partitions["type"].get(doc_type, np.empty(0, dtype=np.int64))
+    names = [n.lower() for n in (filters.get("path_contains") or [])]
+    if names:
+        parts = [r for p, r in partitions["path"].items() if any(n in p.lower() for n in names)]
+        path_rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        rows = path_rows if rows is None else np.intersect1d(rows, path_rows, assume_unique=True)
+    return rows
@@ -1,13 +1,86 @@
-from typing import List, Dict
+import os
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Optional, Sequence, Tuple, Union
 from pypdf import PdfReader
 
-def extract_pdf_pages(path: str) -> List[Dict]:
-    pages = []
+# Files longer than this are split into page ranges so one big PDF can use several cores.
+PAGES_PER_TASK = 32
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _extract_range(path: str, start: int = 0, stop: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """Extracts pages [start, stop) and returns them with the document's page count."""
     reader = PdfReader(path)
-    for i, page in enumerate(reader.pages):
+    n = len(reader.pages)
+    stop = n if stop is None else min(stop, n)
+    pages = []
+    for i in range(start, stop):
         try:
-            txt = page.extract_text() or ""
+            txt = reader.pages[i].extract_text() or ""
         except Exception:
             txt = ""
         pages.append({"page_index": i, "text": txt})
-    return pages
+    return pages, n
+
+
+def extract_pdf_pages(path: str, workers: int = 1, pages_per_task: int = PAGES_PER_TASK) -> List[Dict]:
+    if workers == 1:
+        return _extract_range(path)[0]
+    return extract_pdf_pages_many([path], workers=workers, pages_per_task=pages_per_task)[0]
+
+
+def extract_pdf_pages_many(
+    paths: Sequence[str],
+    workers: Optional[int] = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    return_exceptions: bool = False,
+) -> List[Union[List[Dict], BaseException]]:
+    """
+    Extracts many PDFs on a process pool, results in the order of `paths`.
+    Each file starts as one task covering its first `pages_per_task` pages; longer
+    files fan out into further page-range tasks once their page count is known.
+    With return_exceptions=True a failed file yields its exception instead of raising.
+    """
+    paths = [str(p) for p in paths]
+    workers = _resolve_workers(workers)
+    results: List[Union[List[Dict], BaseException, None]] = [None] * len(paths)
+
+    if workers == 1 or not paths:
+        for i, p in enumerate(paths):
+            try:
+                results[i] = _extract_range(p)[0]
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+        return results
+
+    step = max(1, pages_per_task)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        heads: Dict[Future, int] = {pool.submit(_extract_range, p, 0, step): i for i, p in enumerate(paths)}
+        tails: Dict[int, List[Future]] = {}
+        for fut, i in heads.items():
+            try:
+                pages, n = fut.result()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+                continue
+            results[i] = pages
+            if n > step:
+                tails[i] = [pool.submit(_extract_range, paths[i], s, s + step) for s in range(step, n, step)]
+        for i, futs in tails.items():
+            try:
+                for fut in futs:
+                    results[i].extend(fut.result()[0])
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+    return results
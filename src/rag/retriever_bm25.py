@@ -0,0 +1,331 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Callable, Any, Optional, Union
+import numpy as np
+from .text_utils import doc_text
+from .partitions import Partitions, build_partitions, rows_for
+
+Doc = Dict[str, Any]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had has
+have having he her here hers him his how i if in into is it its itself just me more most my no nor
+not now of off on once only or other our ours out over own same she should so some such than that
+the their theirs them then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    return [t for t in _TOKEN_RE.findall(text) if len(t) > 1 and t not in STOP_WORDS]
+
+
+def _grow(a: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """`a` with room for at least `size` entries (capacity doubles, so appends are amortized O(1))."""
+    if size <= a.size:
+        return a
+    out = np.full(max(size, 2 * a.size), fill, dtype=a.dtype)
+    out[:a.size] = a
+    return out
+
+
+@dataclass(eq=False)
+class _Segment:
+    """
+    Postings of the contiguous rows [start, start + len(docs)); doc ids inside are global rows,
+    ascending within a term. Terms added to the vocabulary after the segment was built simply
+    have no postings in it. Segments are never modified; removed rows are tombstoned globally.
+    """
+    start: int
+    docs: List[Doc]
+    offsets: np.ndarray
+    post_docs: np.ndarray
+    post_tfs: np.ndarray
+    _partitions: Optional[Partitions] = None
+
+    @classmethod
+    def build(cls, start: int, docs: List[Doc], doc_terms: List[Tuple[np.ndarray, np.ndarray]], n_terms: int) -> "_Segment":
+        lens = np.fromiter((t.size for t, _ in doc_terms), dtype=np.int64, count=len(doc_terms))
+        if lens.sum():
+            terms = np.concatenate([t for t, _ in doc_terms])
+            tfs = np.concatenate([f for _, f in doc_terms])
+        else:
+            terms = np.empty(0, dtype=np.int32)
+            tfs = np.empty(0, dtype=np.int32)
+        rows = np.repeat(np.arange(start, start + len(doc_terms), dtype=np.int64), lens)
+        order = np.argsort(terms, kind="stable")  # stable keeps rows ascending per term
+        df = np.bincount(terms, minlength=n_terms)
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        return cls(start, docs, offsets, rows[order], tfs[order])
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.docs)
+
+    @property
+    def partitions(self) -> Partitions:
+        if self._partitions is None:
+            self._partitions = build_partitions(self.docs)
+        return self._partitions
+
+    def postings(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        if t + 1 >= self.offsets.size:
+            return self.post_docs[:0], self.post_tfs[:0]
+        lo, hi = self.offsets[t], self.offsets[t + 1]
+        return self.post_docs[lo:hi], self.post_tfs[lo:hi]
+
+
+class BM25Retriever:
+    """
+    Okapi BM25 over compact array-backed postings, split into row segments (one per
+    add_documents call, merged log-structured style) so adding or removing a file costs in
+    proportion to that file. Corpus statistics (df, document count, total length) are kept
+    incrementally and idf / length normalization are applied at query time; removed rows are
+    tombstoned and only compacted once they outnumber the live ones.
+
+    Top-k uses term-at-a-time MaxScore: terms are visited by decreasing score upper bound, and
+    once the bounds of the remaining terms cannot lift an unseen document past the current
+    k-th score, those terms are no longer scanned. Their postings are only probed, by binary
+    search, for the few documents still in contention.
+    Same search / search_filtered / search_many interface as TfidfRetriever.
+    """
+
+    def __init__(self, docs: List[Doc], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.version = 0
+        self.segments: List[_Segment] = []
+        self._rows: List[Doc] = []  # every row ever added since the last compaction, dead or alive
+        # Per-row (term ids, tfs); kept so merges and removals never re-tokenize.
+        self._doc_terms: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.df = np.zeros(0, dtype=np.int64)
+        self.max_tf = np.zeros(0, dtype=np.int32)
+        self.min_len = np.zeros(0, dtype=np.float32)
+        self.n_docs = 0
+        self.total_len = 0.0
+        self._where: Dict[str, List[np.ndarray]] = {}  # meta.path -> rows
+        self._docs: Optional[List[Doc]] = None
+        self.add_documents(docs)
+
+    # ---------- index build ----------
+    def _analyze(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        ids = [self.vocab.setdefault(t, len(self.vocab)) for t in tokenize(text)]
+        if not ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        terms, tfs = np.unique(np.asarray(ids, dtype=np.int32), return_counts=True)
+        return terms, tfs.astype(np.int32)
+
+    def _changed(self):
+        self._docs = None
+        self.version += 1
+
+    @property
+    def docs(self) -> List[Doc]:
+        """Live documents in row order."""
+        if self._docs is None:
+            self._docs = [d for d, a in zip(self._rows, self.alive) if a]
+        return self._docs
+
+    def add_documents(self, docs: List[Doc]) -> int:
+        if not docs:
+            return 0
+        start = len(self._rows)
+        analyzed = [self._analyze(doc_text(d)) for d in docs]
+        end = start + len(docs)
+        n_terms = len(self.vocab)
+        self.alive = _grow(self.alive, end, False)
+        self.doc_len = _grow(self.doc_len, end)
+        self.df = _grow(self.df, n_terms)
+        self.max_tf = _grow(self.max_tf, n_terms)
+        self.min_len = _grow(self.min_len, n_terms, np.inf)
+        lens = np.fromiter((t.size for t, _ in analyzed), dtype=np.int64, count=len(analyzed))
+        dl = np.fromiter((f.sum() for _, f in analyzed), dtype=np.float32, count=len(analyzed))
+        if lens.sum():
+            terms = np.concatenate([t for t, _ in analyzed])
+            tfs = np.concatenate([f for _, f in analyzed])
+            self.df[:n_terms] += np.bincount(terms, minlength=n_terms)
+            # Bounds only ever loosen when rows go away, so they need no upkeep on removal.
+            np.maximum.at(self.max_tf, terms, tfs)
+            np.minimum.at(self.min_len, terms, np.repeat(dl, lens))
+        self.alive[start:end] = True
+        self.doc_len[start:end] = dl
+        self.total_len += float(dl.sum())
+        for row, d in enumerate(docs, start=start):
+            self._where.setdefault(d.get("meta", {}).get("path", ""), []).append(np.array([row]))
+        self._rows.extend(docs)
+        self._doc_terms.extend(analyzed)
+        self.n_docs += len(docs)
+        self.segments.append(_Segment.build(start, list(docs), analyzed, n_terms))
+        while len(self.segments) >= 2 and len(self.segments[-2].docs) <= 2 * len(self.segments[-1].docs):
+            a, b = self.segments[-2:]
+            self.segments[-2:] = [_Segment.build(a.start, a.docs + b.docs, self._doc_terms[a.start:b.end], n_terms)]
+        self._changed()
+        return len(docs)
+
+    def remove_documents(self, path: str) -> int:
+        rows = self._where.pop(path, [])
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        rows = rows[self.alive[rows]]
+        if rows.size == 0:
+            return 0
+        for row in rows.tolist():
+            self.df[self._doc_terms[row][0]] -= 1
+        self.alive[rows] = False
+        self.total_len -= float(self.doc_len[rows].sum())
+        self.n_docs -= rows.size
+        if 2 * self.n_docs < len(self._rows):
+            self._compact()
+        self._changed()
+        return int(rows.size)
+
+    def _compact(self) -> None:
+        """Drops tombstoned rows and renumbers; amortized over the removals that made them."""
+        keep = np.flatnonzero(self.alive[:len(self._rows)])
+        docs = [self._rows[i] for i in keep]
+        doc_terms = [self._doc_terms[i] for i in keep]
+        self._rows, self._doc_terms = docs, doc_terms
+        self.alive = np.ones(len(docs), dtype=bool)
+        self.doc_len = np.asarray([float(f.sum()) for _, f in doc_terms], dtype=np.float32)
+        self._where = {}
+        for row, d in enumerate(docs):
+            self._where.setdefault(d.get("meta", {}).get("path", ""), []).append(np.array([row]))
+        self.segments = [_Segment.build(0, docs, doc_terms, len(self.vocab))] if docs else []
+
+    def update_documents(self, path: str, docs: List[Doc]) -> int:
+        self.remove_documents(path)
+        return self.add_documents(docs)
+
+    # ---------- query ----------
+    def _query_terms(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        ids = [self.vocab[t] for t in tokenize(query) if t in self.vocab]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        terms, qtf = np.unique(np.asarray(ids, dtype=np.int64), return_counts=True)
+        return terms, qtf.astype(np.float32)
+
+    def _postings(self, t: int, allowed: Optional[np.ndarray]):
+        for seg in self.segments:
+            docs, tfs = seg.postings(t)
+            if docs.size and allowed is not None:
+                sel = allowed[docs]
+                docs, tfs = docs[sel], tfs[sel]
+            if docs.size:
+                yield seg, docs, tfs
+
+    def _scores(self, query: str, k: int, allowed: Optional[np.ndarray]) -> np.ndarray:
+        """
+        BM25 score of every row (dead rows score 0). `allowed` is a boolean row mask (None = every
+        row). Terms are scored in decreasing order of their upper bound; after each fully scanned
+        term the k-th best score so far (theta) is compared with what the remaining terms could
+        still add. Once that is less, no unseen document can make the top-k, so the remaining
+        terms only probe the postings of the documents in contention.
+        """
+        acc = np.zeros(len(self._rows), dtype=np.float32)
+        terms, qtf = self._query_terms(query)
+        if terms.size == 0 or self.n_docs == 0:
+            return acc
+        avgdl = self.total_len / self.n_docs or 1.0
+        idf = np.log1p((self.n_docs - self.df[terms] + 0.5) / (self.df[terms] + 0.5)).astype(np.float32)
+        mtf = self.max_tf[terms].astype(np.float32)
+        # Largest tf with the shortest length seen for the term: a bound even if no row has both.
+        bounds = qtf * idf * mtf * (self.k1 + 1.0) / (mtf + self.k1 * (1.0 - self.b + self.b * self.min_len[terms] / avgdl))
+        order = np.argsort(-bounds)
+        terms, qtf, idf, bounds = terms[order], qtf[order], idf[order], bounds[order]
+        rest = np.concatenate([np.cumsum(bounds[::-1])[::-1][1:], [0.0]])
+
+        def impacts(i: int, docs: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / avgdl)
+            return qtf[i] * idf[i] * tf * (self.k1 + 1.0) / (tf + norm)
+
+        touched: List[np.ndarray] = []
+        cand: Optional[np.ndarray] = None  # sorted rows still in contention, once pruning starts
+        for i, t in enumerate(terms):
+            if cand is None:
+                for _, docs, tfs in self._postings(t, allowed):
+                    acc[docs] += impacts(i, docs, tfs)
+                    touched.append(docs)
+                if rest[i] <= 0 or k <= 0 or not touched:
+                    continue
+                seen = np.unique(np.concatenate(touched))
+                if seen.size < k:
+                    continue
+                theta = np.partition(acc[seen], seen.size - k)[seen.size - k]
+                if rest[i] < theta:
+                    cand = seen[acc[seen] + rest[i] >= theta]
+                continue
+            for seg in self.segments:
+                lo, hi = np.searchsorted(cand, [seg.start, seg.end])
+                if lo == hi:
+                    continue
+                docs, tfs = seg.postings(t)
+                if docs.size == 0:
+                    continue
+                probe = cand[lo:hi]
+                pos = np.minimum(np.searchsorted(docs, probe), docs.size - 1)
+                hit = docs[pos] == probe
+                if hit.any():
+                    acc[probe[hit]] += impacts(i, probe[hit], tfs[pos[hit]])
+            if rest[i] > 0:
+                theta = np.partition(acc[cand], cand.size - k)[cand.size - k]
+                cand = cand[acc[cand] + rest[i] >= theta]
+        return acc
+
+    def _allowed(self, rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if rows is None:
+            return None if self.n_docs == len(self._rows) else self.alive[:len(self._rows)]
+        allowed = np.zeros(len(self._rows), dtype=bool)
+        allowed[rows] = True
+        return allowed
+
+    def _rows_for(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Live rows matching `filters` (see partitions.rows_for), or None for every live row."""
+        if not filters:
+            return None
+        parts = []
+        for seg in self.segments:
+            local = rows_for(seg.partitions, filters)
+            parts.append(seg.start + (np.arange(len(seg.docs)) if local is None else local))
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        return rows[self.alive[rows]]
+
+    def _topk(self, scores: np.ndarray, k: int, rows: Optional[np.ndarray]) -> List[Tuple[float, Doc]]:
+        cand = np.flatnonzero(self.alive[:scores.size]) if rows is None else rows
+        k = min(k, cand.size)
+        if k <= 0:
+            return []
+        vals = scores[cand]
+        sel = np.argpartition(-vals, k - 1)[:k] if vals.size > k else np.arange(vals.size)
+        sel = sel[np.lexsort((sel, -vals[sel]))]
+        return [(float(vals[i]), self._rows[cand[i]]) for i in sel]
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 6,
+        filters: Union[None, Dict[str, Any], List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[List[Tuple[float, Doc]]]:
+        per_query = filters if isinstance(filters, list) else [filters] * len(queries)
+        out = []
+        for query, f in zip(queries, per_query):
+            rows = self._rows_for(f)
+            out.append(self._topk(self._scores(query, k, self._allowed(rows)), k, rows))
+        return out
+
+    def search_partitioned(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[float, Doc]]:
+        return self.search_many([query], k=k, filters=filters)[0]
+
+    def search(self, query: str, k: int = 6) -> List[Tuple[float, Doc]]:
+        return self.search_many([query], k=k)[0]
+
+    def search_filtered(self, query: str, predicate: Callable[[Doc], bool], k: int) -> List[Tuple[float, Doc]]:
+        rows = np.asarray([i for i, (d, a) in enumerate(zip(self._rows, self.alive)) if a and predicate(d)], dtype=np.int64)
+        return self._topk(self._scores(query, k, self._allowed(rows)), k, rows)
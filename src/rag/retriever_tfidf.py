@@ -1,31 +1,349 @@
-from typing import List, Dict, Tuple, Callable, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Callable, Any, Optional, Union
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from .text_utils import doc_text
+from .partitions import Partitions, build_partitions, filter_key, rows_for
+from .index_store import corpus_manifest, read_meta, save_index, load_index
 
 Doc = Dict[str, Any]
 
+# Hashed vocabulary: terms map to columns without a fitted dictionary, so documents
+# can be added or removed without refitting. Raw counts are kept; idf comes from
+# the maintained document frequencies.
+VECTORIZER_PARAMS = dict(
+    strip_accents="unicode",
+    lowercase=True,
+    stop_words="english",
+    ngram_range=(1, 2),
+    n_features=2 ** 20,
+    alternate_sign=False,
+    norm=None,
+)
+
+@dataclass(eq=False)
+class _Segment:
+    """
+    Rows added together (one file, or the whole corpus at build/load time). The matrices are
+    never modified: removed rows are tombstoned in `alive` and dropped when segments merge.
+    """
+    docs: List[Doc]
+    tf: csr_matrix  # raw term counts; idf is applied to the query and the row norms
+    alive: np.ndarray
+    live: int
+    _partitions: Optional[Partitions] = None
+    _partition_cache: Dict[Tuple, Tuple[Optional[np.ndarray], csr_matrix]] = field(default_factory=dict)
+    _squares: Optional[csr_matrix] = None
+    _norms: Tuple[int, Optional[np.ndarray]] = (-1, None)
+
+    @classmethod
+    def build(cls, docs: List[Doc], tf: csr_matrix) -> "_Segment":
+        return cls(docs, tf, np.ones(len(docs), dtype=bool), len(docs))
+
+    def norms(self, idf: np.ndarray, version: int) -> np.ndarray:
+        """L2 norms of the idf-weighted rows; recomputed (one sparse product) when df has changed."""
+        if self._norms[0] != version:
+            if self._squares is None:
+                self._squares = self.tf.multiply(self.tf).tocsr().astype(np.float64)
+            norms = np.sqrt(self._squares @ (idf * idf))
+            norms[norms == 0] = 1.0
+            self._norms = (version, norms)
+        return self._norms[1]
+
+    @property
+    def partitions(self) -> Partitions:
+        if self._partitions is None:
+            self._partitions = build_partitions(self.docs)
+        return self._partitions
+
+    def view(self, filters: Optional[Dict[str, Any]]) -> Tuple[Optional[np.ndarray], csr_matrix]:
+        """(local row ids or None for all, their rows); tombstones are filtered after scoring."""
+        key = filter_key(filters)
+        if key is None:
+            return None, self.tf
+        hit = self._partition_cache.get(key)
+        if hit is None:
+            local = rows_for(self.partitions, filters)
+            hit = (local, self.tf[local])
+            self._partition_cache[key] = hit
+        return hit
+
+    def live_rows(self, local: Optional[np.ndarray]) -> np.ndarray:
+        local = np.arange(len(self.docs)) if local is None else local
+        return local if self.live == len(self.docs) else local[self.alive[local]]
+
+
 class TfidfRetriever:
+    """
+    The corpus is a list of row segments, one per add_documents call, so adding or removing a
+    file costs in proportion to that file: a new segment is appended, removed rows are
+    tombstoned, and df is adjusted by the file's own terms. Document rows are raw term counts:
+    scoring applies the current idf to the query and divides by the idf-weighted row norms,
+    which gives the cosine of TfidfVectorizer rows without rewriting stored rows when df
+    changes (only the per-row norms are recomputed). Small trailing segments are merged
+    log-structured style, keeping the segment count logarithmic in the corpus size.
+    """
+
     def __init__(self, docs: List[Doc]):
-        self.docs = docs
-        self.texts = [d["text"] for d in docs]
-        self.vectorizer = TfidfVectorizer(
-            strip_accents="unicode",
-            lowercase=True,
-            stop_words="english",
-            ngram_range=(1, 2),
-            max_features=100_000,
+        self.vectorizer = HashingVectorizer(**VECTORIZER_PARAMS)
+        n_features = VECTORIZER_PARAMS["n_features"]
+        self.segments: List[_Segment] = []
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.version = 0
+        self._where: Dict[str, List[Tuple[_Segment, np.ndarray]]] = {}  # meta.path -> rows per segment
+        self._docs: Optional[List[Doc]] = None
+        self.add_documents(docs)
+
+    # ---------- weighting ----------
+    @property
+    def idf(self) -> np.ndarray:
+        # Same smoothing as sklearn's TfidfVectorizer(smooth_idf=True).
+        return np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0
+
+    def _weigh_query(self, counts: csr_matrix, idf: np.ndarray) -> csr_matrix:
+        q = counts.astype(np.float64, copy=True)
+        q.data *= idf[q.indices] * (self.df[q.indices] > 0)  # unseen terms are outside the vocabulary
+        q.eliminate_zeros()
+        q = normalize(q, norm="l2", copy=False)
+        q.data *= idf[q.indices]  # the documents' idf, applied here instead of to every stored row
+        return q
+
+    def _changed(self):
+        self._docs = None
+        self.version += 1
+
+    @property
+    def docs(self) -> List[Doc]:
+        """Live documents in row order; rebuilt lazily after the corpus changes."""
+        if self._docs is None:
+            self._docs = [d for seg in self.segments for d, a in zip(seg.docs, seg.alive) if a]
+        return self._docs
+
+    @property
+    def matrix(self) -> csr_matrix:
+        """Term counts of the live documents in `docs` order (compacts the segments)."""
+        self._compact()
+        return self.segments[0].tf if self.segments else csr_matrix((0, self.df.shape[0]), dtype=np.int64)
+
+    # ---------- metadata partitions ----------
+    def rows_for(self, filters: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """Row ids (positions in `docs`) matching `filters`; see partitions.rows_for."""
+        if not filters:
+            return None
+        out, offset = [], 0
+        for seg in self.segments:
+            position = np.cumsum(seg.alive) - 1
+            out.append(offset + position[seg.live_rows(rows_for(seg.partitions, filters))])
+            offset += seg.live
+        return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
+
+    # ---------- incremental updates ----------
+    def _index(self, seg: _Segment) -> None:
+        for path, local in seg.partitions["path"].items():
+            self._where.setdefault(path, []).append((seg, local))
+
+    def _merge(self, olds: List[_Segment]) -> _Segment:
+        """One segment holding the live rows of `olds`, in order; replaces them in the path index."""
+        keep = [seg.alive if seg.live < len(seg.docs) else slice(None) for seg in olds]
+        merged = _Segment.build(
+            [d for seg in olds for d, a in zip(seg.docs, seg.alive) if a],
+            vstack([seg.tf[k] for seg, k in zip(olds, keep)], format="csr"),
+        )
+        gone = set(map(id, olds))
+        for path in merged.partitions["path"]:
+            self._where[path] = [(s, r) for s, r in self._where.get(path, []) if id(s) not in gone]
+        self._index(merged)
+        return merged
+
+    def _compact(self) -> None:
+        if len(self.segments) > 1 or (self.segments and self.segments[0].live < len(self.segments[0].docs)):
+            self.segments = [self._merge(self.segments)]
+
+    def add_documents(self, docs: List[Doc]) -> int:
+        if not docs:
+            return 0
+        counts = self.vectorizer.transform(doc_text(d) for d in docs)
+        self.df += np.bincount(counts.indices, minlength=self.df.shape[0])
+        self.n_docs += len(docs)
+        seg = _Segment.build(list(docs), counts)
+        self._index(seg)
+        self.segments.append(seg)
+        # Fold the newest segment into its predecessor while they are of similar size, so every
+        # row is rewritten O(log n) times in total and searches visit O(log n) segments.
+        while len(self.segments) >= 2 and self.segments[-2].live <= 2 * self.segments[-1].live:
+            self.segments[-2:] = [self._merge(self.segments[-2:])]
+        self._changed()
+        return len(docs)
+
+    def remove_documents(self, path: str) -> int:
+        removed = 0
+        for seg, local in self._where.pop(path, []):
+            local = local[seg.alive[local]]
+            if local.size == 0:
+                continue
+            self.df -= np.bincount(seg.tf[local].indices, minlength=self.df.shape[0])
+            seg.alive[local] = False
+            seg.live -= local.size
+            removed += local.size
+            if seg.live == 0:
+                self.segments.remove(seg)
+            elif 2 * seg.live < len(seg.docs):
+                # Mostly tombstones: rewrite just this segment.
+                i = self.segments.index(seg)
+                self.segments[i] = self._merge([seg])
+        if removed:
+            self.n_docs -= removed
+            self._changed()
+        return removed
+
+    def update_documents(self, path: str, docs: List[Doc]) -> int:
+        self.remove_documents(path)
+        return self.add_documents(docs)
+
+    # ---------- persistence ----------
+    def save(self, index_dir: str, manifest: Optional[str] = None) -> None:
+        save_index(
+            index_dir,
+            matrices={"tf": self.matrix},  # compacts into one segment
+            arrays={"df": self.df},
+            docs=self.docs,
+            manifest=manifest or corpus_manifest(self.docs, VECTORIZER_PARAMS),
+            params=VECTORIZER_PARAMS,
         )
-        self.matrix = self.vectorizer.fit_transform(self.texts)
+
+    @classmethod
+    def load(cls, index_dir: str, docs: Optional[List[Doc]] = None, mmap: bool = True) -> "TfidfRetriever":
+        """
+        Loads a saved index; the matrices are memory-mapped, not copied. Pass `docs` to skip the
+        metadata table. Raises ValueError when the rows do not line up with the documents.
+        """
+        idx = load_index(index_dir, mmap=mmap, with_docs=docs is None)
+        retriever = cls([])
+        docs = list(docs if docs is not None else idx["docs"])
+        tf = idx["matrices"]["tf"]
+        if tf.shape != (len(docs), retriever.df.shape[0]) or idx["arrays"]["df"].shape != retriever.df.shape:
+            raise ValueError(f"Index at {index_dir} has {tf.shape[0]} rows for {len(docs)} documents")
+        retriever.df = idx["arrays"]["df"]
+        retriever.n_docs = len(docs)
+        if docs:
+            # Later updates add segments next to this one; the mapped arrays are never rewritten.
+            seg = _Segment.build(docs, tf)
+            retriever.segments.append(seg)
+            retriever._index(seg)
+        return retriever
+
+    @classmethod
+    def load_or_build(cls, docs: List[Doc], index_dir: str, fingerprint: Optional[str] = None) -> "TfidfRetriever":
+        """
+        Reuses the index at `index_dir` if it was built from the same corpus, else rebuilds and saves it.
+        `fingerprint` (see scanner.Manifest.fingerprint) stands in for hashing every chunk's text.
+        """
+        if fingerprint:
+            manifest = corpus_manifest([], {**VECTORIZER_PARAMS, "fingerprint": fingerprint})
+        else:
+            manifest = corpus_manifest(docs, VECTORIZER_PARAMS)
+        meta = read_meta(index_dir)
+        if meta and meta.get("manifest") == manifest:
+            try:
+                return cls.load(index_dir, docs=docs)
+            except (OSError, ValueError, KeyError):
+                pass
+        retriever = cls(docs)
+        try:
+            retriever.save(index_dir, manifest=manifest)
+        except OSError:
+            pass
+        return retriever
+
+    # ---------- search ----------
+    def _scores(self, query: str) -> np.ndarray:
+        """Similarity to every live document, in `docs` order."""
+        idf = self.idf
+        q_vec = self._weigh_query(self.vectorizer.transform([query]), idf)
+        parts = [((seg.tf @ q_vec.T).toarray().ravel() / seg.norms(idf, self.version))[seg.alive]
+                 for seg in self.segments]
+        return np.concatenate(parts) if parts else np.zeros(0)
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 6,
+        filters: Union[None, Dict[str, Any], List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[List[Tuple[float, Doc]]]:
+        """
+        Top-k hits for every query in one vectorized pass per segment.
+        `filters` is one filter dict (see partitions.rows_for) for all queries, or a list with one per query.
+        Queries sharing a filter are scored with a single sparse product against each segment's
+        partition; top-k is selected per row from the non-zero scores with argpartition and the
+        per-segment winners are merged. Ties go to the earlier row.
+        """
+        if not queries:
+            return []
+        per_query = filters if isinstance(filters, list) else [filters] * len(queries)
+        groups: Dict[Tuple, List[int]] = {}
+        for qi, f in enumerate(per_query):
+            groups.setdefault(filter_key(f), []).append(qi)
+
+        idf = self.idf
+        q_all = self._weigh_query(self.vectorizer.transform(queries), idf)
+        out: List[List[Tuple[float, Doc]]] = [[] for _ in queries]
+        for key, qidx in groups.items():
+            views = [seg.view(per_query[qidx[0]]) for seg in self.segments]
+            n_rows = sum(seg.live_rows(local).size for seg, (local, _) in zip(self.segments, views))
+            kk = min(k, n_rows)
+            if kk <= 0:
+                continue
+            # Per query: candidate (score, segment, local row) from every segment.
+            found: List[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = [[] for _ in qidx]
+            for si, (seg, (local, sub)) in enumerate(zip(self.segments, views)):
+                if sub.shape[0] == 0:
+                    continue
+                scores = (q_all[qidx] @ sub.T).tocsr()
+                norms = seg.norms(idf, self.version)
+                scores.data /= norms[scores.indices if local is None else local[scores.indices]]
+                for j in range(len(qidx)):
+                    lo, hi = scores.indptr[j], scores.indptr[j + 1]
+                    cols, vals = scores.indices[lo:hi], scores.data[lo:hi]
+                    rows = cols if local is None else local[cols]
+                    if seg.live < len(seg.docs):
+                        keep = seg.alive[rows]
+                        rows, vals = rows[keep], vals[keep]
+                    if vals.size > kk:
+                        sel = np.argpartition(-vals, kk - 1)[:kk]
+                        rows, vals = rows[sel], vals[sel]
+                    found[j].append((vals, np.full(rows.size, si), rows))
+            for j, qi in enumerate(qidx):
+                vals = np.concatenate([f[0] for f in found[j]]) if found[j] else np.zeros(0)
+                segs = np.concatenate([f[1] for f in found[j]]).astype(np.int64) if found[j] else np.zeros(0, np.int64)
+                rows = np.concatenate([f[2] for f in found[j]]).astype(np.int64) if found[j] else np.zeros(0, np.int64)
+                order = np.lexsort((rows, segs, -vals))[:kk]
+                hits = [(float(vals[i]), self.segments[segs[i]].docs[rows[i]]) for i in order]
+                if len(hits) < kk:
+                    # Fewer matches than k: fill with zero-score rows, like a full ranking would.
+                    taken = set(zip(segs[order].tolist(), rows[order].tolist()))
+                    for si, (seg, (local, _)) in enumerate(zip(self.segments, views)):
+                        for r in seg.live_rows(local)[: kk + len(taken)].tolist():
+                            if len(hits) == kk:
+                                break
+                            if (si, r) not in taken:
+                                hits.append((0.0, seg.docs[r]))
+                        if len(hits) == kk:
+                            break
+                out[qi] = hits
+        return out
+
+    def search_partitioned(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[float, Doc]]:
+        """Top-k among the rows selected by `filters` (see partitions.rows_for); cost scales with the partition."""
+        return self.search_many([query], k=k, filters=filters)[0]
 
     def search(self, query: str, k: int = 6) -> List[Tuple[float, Doc]]:
-        q_vec = self.vectorizer.transform([query])
-        sims = cosine_similarity(q_vec, self.matrix)[0]
-        idx = sims.argsort()[::-1][:k]
-        return [(float(sims[i]), self.docs[i]) for i in idx]
+        return self.search_many([query], k=k)[0]
 
     def search_filtered(self, query: str, predicate: Callable[[Doc], bool], k: int) -> List[Tuple[float, Doc]]:
-        q_vec = self.vectorizer.transform([query])
-        sims = cosine_similarity(q_vec, self.matrix)[0]
+        sims = self._scores(query)
         ranked = sorted(
             [(float(s), self.docs[i]) for i, s in enumerate(sims) if predicate(self.docs[i])],
             key=lambda x: x[0],
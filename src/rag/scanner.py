@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .ingest_cache import file_digest
+
+MANIFEST_VERSION = 1
+
+
+def scan_tree(root: str, exts: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, int, int]]:
+    """
+    Walks `root` once with os.scandir, yielding (path, size, mtime_ns) for regular files.
+    The stat comes from the directory entry, so no extra syscall per file on most platforms.
+    Entries are visited in name order so results (and chunk ids built from them) are stable.
+    """
+    wanted = {e.lower() for e in exts} if exts else None
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                if wanted is not None and os.path.splitext(entry.name)[1].lower() not in wanted:
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            yield entry.path, st.st_size, st.st_mtime_ns
+        stack.extend(reversed(subdirs))
+
+
+@dataclass
+class ScanDiff:
+    files: List[str] = field(default_factory=list)      # everything present, in scan order
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+class Manifest:
+    """
+    Remembers (size, mtime_ns, sha256) for every scanned file. A file is only re-hashed
+    when its size or mtime moved, so a rescan of an unchanged tree costs one directory
+    walk. Pass path=None for an in-memory manifest.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self.entries: Dict[str, List] = {}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data.get("files", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def refresh(self, root: str, exts: Optional[Iterable[str]] = None) -> ScanDiff:
+        """Rescans one root and reports added/changed/removed files relative to the last scan."""
+        diff = ScanDiff()
+        prefix = os.path.join(os.path.abspath(root), "")
+        seen = set()
+        for path, size, mtime_ns in scan_tree(root, exts):
+            key = os.path.abspath(path)
+            seen.add(key)
+            diff.files.append(path)
+            old = self.entries.get(key)
+            if old and old[0] == size and old[1] == mtime_ns:
+                continue
+            try:
+                digest = file_digest(path)
+            except OSError:
+                continue
+            self.entries[key] = [size, mtime_ns, digest]
+            if old is None:
+                diff.added.append(path)
+            elif old[2] != digest:
+                diff.changed.append(path)
+        wanted = {e.lower() for e in exts} if exts else None
+        for key in list(self.entries):
+            if key.startswith(prefix) and key not in seen:
+                if wanted is not None and os.path.splitext(key)[1].lower() not in wanted:
+                    continue
+                diff.removed.append(key)
+                del self.entries[key]
+        return diff
+
+    def digest(self, path: str) -> Optional[str]:
+        entry = self.entries.get(os.path.abspath(path))
+        return entry[2] if entry else None
+
+    def fingerprint(self, roots: Iterable[str], extra: str = "") -> str:
+        """Digest over the content hashes under `roots`; changes whenever any file does."""
+        h = hashlib.sha256(extra.encode("utf-8"))
+        for root in roots:
+            if not root:
+                continue
+            prefix = os.path.join(os.path.abspath(root), "")
+            h.update(prefix.encode("utf-8"))
+            for key in sorted(k for k in self.entries if k.startswith(prefix)):
+                h.update(f"{key[len(prefix):]}\0{self.entries[key][2]}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.entries}, f)
+        os.replace(tmp, self.path)
@@ -1,20 +1,75 @@
 import re
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-def clean(text: str) -> str:
+_WS_RE = re.compile(r"\s+")
+_PARA_RE = re.compile(r"\s*\n\s*\n\s*")
+_BOUNDARY_RE = {
+    "sentence": re.compile(r"[.!?][\"')\]]?\s+|\n\n"),
+    "paragraph": re.compile(r"\n\n"),
+}
+
+def clean(text: str, keep_paragraphs: bool = False) -> str:
+    """Collapses whitespace in one pass; with keep_paragraphs, blank lines survive as "\\n\\n"."""
     if not text:
         return ""
     text = text.replace("\u00a0", " ")
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    if keep_paragraphs:
+        return "\n\n".join(p for p in (_WS_RE.sub(" ", part).strip() for part in _PARA_RE.split(text)) if p)
+    return _WS_RE.sub(" ", text).strip()
+
+def iter_chunk_spans(text: str, chunk_size: int = 1200, overlap: int = 200,
+                     boundary: Optional[str] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (start, end) offsets of overlapping chunks over already-cleaned `text`;
+    nothing is copied. boundary="sentence" or "paragraph" pulls each chunk end back to
+    the last such break in the second half of the window, when there is one.
+    """
+    L = len(text)
+    if L <= chunk_size:
+        yield (0, L)
+        return
+    step = max(1, chunk_size - overlap)
+    if not boundary:
+        i = 0
+        while i < L:
+            yield (i, min(i + chunk_size, L))
+            i += step
+        return
+
+    pattern = _BOUNDARY_RE[boundary]
+    i = 0
+    while i < L:
+        end = min(i + chunk_size, L)
+        if end < L:
+            cut = None
+            for m in pattern.finditer(text, i + chunk_size // 2, end):
+                cut = m.end()
+            if cut:
+                end = cut
+        stop = end
+        while stop > i and text[stop - 1].isspace():
+            stop -= 1
+        yield (i, stop)
+        if end >= L:
+            return
+        i = max(end - overlap, i + 1)
+        while i < L and text[i].isspace():
+            i += 1
 
 def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[str]:
     text = clean(text)
-    if len(text) <= chunk_size:
-        return [text]
-    chunks, i = [], 0
-    step = max(1, chunk_size - overlap)
-    while i < len(text):
-        chunks.append(text[i:i+chunk_size])
-        i += step
-    return chunks
+    return [text[s:e] for s, e in iter_chunk_spans(text, chunk_size, overlap)]
+
+def doc_text(doc: Dict[str, Any]) -> str:
+    """
+    Text of a chunk record. Ingested records keep only offsets into a shared page
+    buffer ("source" + meta.start/end), so the slice is materialized here, on demand.
+    """
+    text = doc.get("text")
+    if text is not None:
+        return text
+    source = doc.get("source")
+    if source is None:
+        return ""
+    meta = doc.get("meta", {})
+    return source[meta.get("start", 0):meta.get("end", len(source))]
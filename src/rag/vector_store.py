@@ -1,30 +1,37 @@
-from dataclasses import dataclass
 from typing import List, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 from pathlib import Path
+from .retriever_tfidf import TfidfRetriever
 
-@dataclass
-class IndexedCorpus:
-    vectorizer: TfidfVectorizer
-    matrix: any  # scipy sparse
-    ids: List[str]
-    texts: List[str]
+def _pairs_to_docs(pairs: List[Tuple[str, str]]) -> List[dict]:
+    # doc ids look like "<relative_path>::chunk_<n>"; the path part is what remove/update match on
+    return [{"id": i, "text": t, "meta": {"path": i.split("::", 1)[0]}} for i, t in pairs]
 
 class TfidfStore:
     def __init__(self, persist_path: str = "data/grades/tfidf_store.pkl"):
         self.persist_path = Path(persist_path)
-        self.idx: IndexedCorpus | None = None
+        self.idx: TfidfRetriever | None = None
 
     def build(self, pairs: List[Tuple[str, str]]):
         if not pairs:
             self.idx = None
             return
-        ids, texts = zip(*pairs)
-        vec = TfidfVectorizer(ngram_range=(1, 2), max_features=50_000, stop_words="english")
-        X = vec.fit_transform(list(texts))
-        self.idx = IndexedCorpus(vec, X, list(ids), list(texts))
+        self.idx = TfidfRetriever(_pairs_to_docs(pairs))
+
+    def add_documents(self, pairs: List[Tuple[str, str]]) -> int:
+        if self.idx is None:
+            self.build(pairs)
+            return len(pairs)
+        return self.idx.add_documents(_pairs_to_docs(pairs))
+
+    def remove_documents(self, path: str) -> int:
+        if self.idx is None:
+            return 0
+        return self.idx.remove_documents(path)
+
+    def update_documents(self, path: str, pairs: List[Tuple[str, str]]) -> int:
+        self.remove_documents(path)
+        return self.add_documents(pairs)
 
     def save(self):
         if not self.idx:
@@ -41,7 +48,9 @@ class TfidfStore:
     def search(self, query: str, k: int = 5) -> List[Tuple[str, str, float]]:
         if not self.idx:
             return []
-        qv = self.idx.vectorizer.transform([query])
-        sims = cosine_similarity(qv, self.idx.matrix).ravel()
-        order = sims.argsort()[::-1][:k]
-        return [(self.idx.ids[i], self.idx.texts[i], float(sims[i])) for i in order]
+        return [(d["id"], d["text"], score) for score, d in self.idx.search(query, k=k)]
+
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[Tuple[str, str, float]]]:
+        if not self.idx:
+            return [[] for _ in queries]
+        return [[(d["id"], d["text"], score) for score, d in hits] for hits in self.idx.search_many(queries, k=k)]
@@ -3,8 +3,9 @@
 # =============================
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Union
 import json
+import re
 import logging
 from datetime import datetime
 
@@ -14,6 +15,8 @@ logger = logging.getLogger(__name__)
 
 REPORTS_DIR = Path("data/reports")
 
+_REPORT_KEY = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
 def generate_markdown_report(submission: Dict, result: GradeResult) -> str:
     if not result:
         raise ValueError("GradeResult cannot be None")
@@ -61,9 +64,15 @@ def generate_markdown_report(submission: Dict, result: GradeResult) -> str:
 """
     return md
 
-def save_report_markdown(submission_id: int, markdown: str) -> Path:
-    if not isinstance(submission_id, int) or submission_id <= 0:
+def _check_submission_id(submission_id: Union[int, str]) -> None:
+    """A positive number (batch position) or a short key such as "watch_<digest>"."""
+    if isinstance(submission_id, bool) or not (
+            (isinstance(submission_id, int) and submission_id > 0)
+            or (isinstance(submission_id, str) and _REPORT_KEY.match(submission_id))):
         raise ValueError(f"Invalid submission_id: {submission_id}")
+
+def save_report_markdown(submission_id: Union[int, str], markdown: str) -> Path:
+    _check_submission_id(submission_id)
     if not markdown or not markdown.strip():
         raise ValueError("Markdown content cannot be empty")
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -88,14 +97,14 @@ def generate_json_report(submission: Dict, result: GradeResult) -> str:
         },
         "context": {
             "rubric_text": submission.get('rubric_text'),
-            "student_text_preview": (submission.get('student_text', '') or '')[:500]
+            "student_text_preview": (submission.get('student_text', '') or '')[:500],
+            "prompt_budget": submission.get('prompt_budget')
         }
     }
     return json.dumps(report_data, indent=2, ensure_ascii=False)
 
-def save_report_json(submission_id: int, json_content: str) -> Path:
-    if not isinstance(submission_id, int) or submission_id <= 0:
-        raise ValueError(f"Invalid submission_id: {submission_id}")
+def save_report_json(submission_id: Union[int, str], json_content: str) -> Path:
+    _check_submission_id(submission_id)
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
     out_path = REPORTS_DIR / f"report_{submission_id}.json"
     out_path.write_text(json_content, encoding="utf-8")
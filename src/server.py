@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import (
+    RUBRICS_DIR, QUESTIONS_DIR, SOLUTIONS_DIR, SERVER_HOST, SERVER_PORT, SERVER_SOCKET, SERVER_TIMEOUT_S,
+    SERVER_UPLOADS_DIR, SERVER_SUBMISSIONS_DIR
+)
+from src.utils.file_select import list_files
+
+TAG_DIRS = {"rubric": RUBRICS_DIR, "question": QUESTIONS_DIR, "solution": SOLUTIONS_DIR}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class GradingService:
+    """
+    Keeps one warm GradeEvaluator (corpus ingested, vectorizer fitted, HTTP sessions open) and
+    an event loop on a background thread, so request threads only pay retrieval plus LLM time.
+    Concurrent requests share the evaluator's rate limiter and concurrency cap, and index updates
+    (reindex) run on the same loop, so they never interleave with a grade's retrieval.
+    `write_reports(text, path, out) -> report path` is optional (the CLI passes main.py's writer);
+    uploaded text it needs is saved under `uploads_dir` first. A request naming a `path` is
+    only served for files under `submissions_dir` (empty: text uploads only).
+    """
+
+    def __init__(self, grader, write_reports=None, uploads_dir: str = SERVER_UPLOADS_DIR,
+                 submissions_dir: str = SERVER_SUBMISSIONS_DIR):
+        self.grader = grader
+        self.write_reports = write_reports
+        self.uploads_dir = Path(uploads_dir)
+        self.submissions_dir = Path(submissions_dir).resolve() if submissions_dir else None
+        self.started = time.time()
+        self.counts = {"graded": 0, "failed": 0, "in_flight": 0}
+        self._lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="grading-loop", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += delta
+
+    def health(self) -> Dict[str, Any]:
+        return {"ok": True, "uptime_s": round(time.time() - self.started, 1),
+                "corpus_chunks": len(getattr(self.grader, "corpus", []) or []), **self.counts}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"server": self.health(), "grader": self.grader.stats()}
+
+    def _on_loop(self, fn, *args):
+        """Runs fn(*args) on the grading loop's thread and waits for its result."""
+        async def call():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+    def _upload(self, text: str, filename: Optional[str]) -> Path:
+        """Saves uploaded text so the graded copy has a body; a folder per content hash keeps the student's filename."""
+        name = Path(filename or "submission.txt").name
+        if Path(name).suffix.lower() not in (".txt", ".md"):
+            name = Path(name).stem + ".txt"  # only the extracted text came over the wire
+        path = self.uploads_dir / hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def _readable(self, path: str) -> Path:
+        """`path` resolved (symlinks and .. included), if it is a file under submissions_dir."""
+        if self.submissions_dir is None:
+            raise RequestError(403, "this server only accepts submissions as text")
+        target = Path(path).resolve()
+        if not target.is_relative_to(self.submissions_dir):
+            raise RequestError(403, f"not under {self.submissions_dir}: {path}")
+        if not target.is_file():
+            raise RequestError(404, f"no such file: {path}")
+        return target
+
+    def grade(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        rubric, question = body.get("rubric"), body.get("question")
+        if not rubric or not question:
+            raise RequestError(400, "rubric and question are required")
+        for name, folder in ((rubric, RUBRICS_DIR), (question, QUESTIONS_DIR)):
+            if not any(Path(p).name == name for p in list_files(folder)):
+                raise RequestError(404, f"not in {folder}: {name}")
+
+        path = body.get("path")
+        text = body.get("text")
+        uploaded = text is not None
+        if text is None:
+            if not path:
+                raise RequestError(400, "send the submission as text or as a path the server can read")
+            path = self._readable(path)
+            from src.utils.read_any import read_text_any  # here so the client command stays light
+            text = read_text_any(str(path))
+
+        coro = self.grader.agrade_many(
+            [text],
+            assignment_hint=f"Use rubric {rubric} and question {question}",
+            rubric_allowlist=[rubric],
+            question_allowlist=[question],
+        )
+        self._count("in_flight")
+        t0 = time.perf_counter()
+        try:
+            (out,) = asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            self._count("in_flight", -1)
+        self._count("graded")
+        out = {**out, "elapsed_s": round(time.perf_counter() - t0, 3)}
+        if body.get("write_reports"):
+            if self.write_reports is None:
+                raise RequestError(400, "this server does not write reports")
+            source = self._upload(text, body.get("filename")) if uploaded else Path(path)
+            out["report"] = str(self.write_reports(text, str(source), out))
+        return out
+
+    def reindex(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Re-reads one knowledge file after it changed on disk, without restarting the server."""
+        tag, name = body.get("tag"), body.get("name")
+        if not TAG_DIRS.get(tag) or not name:
+            raise RequestError(400, f"tag must be one of {sorted(TAG_DIRS)} and name a filename")
+        path = Path(TAG_DIRS[tag]) / Path(name).name
+        if not path.is_file():
+            return {"removed": self._on_loop(self.grader.remove_file, str(path), tag)}
+        return {"chunks": self._on_loop(self.grader.add_file, str(path), tag)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so a client making many calls reuses its connection
+
+    def address_string(self) -> str:
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, fmt: str, *args) -> None:
+        if not getattr(self.server, "quiet", False):
+            super().log_message(fmt, *args)
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, routes: Dict[str, Any], body: Optional[Dict[str, Any]] = None) -> None:
+        handler = routes.get(self.path.split("?", 1)[0])
+        if handler is None:
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        try:
+            self._reply(200, handler() if body is None else handler(body))
+        except RequestError as e:
+            self._reply(e.status, {"error": str(e)})
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        self._route({"/health": service.health, "/stats": service.stats})
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self._reply(400, {"error": f"bad request body: {e}"})
+            return
+        self._route({"/grade": service.grade, "/reindex": service.reindex}, body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: GradingService, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                socket_path: str = "", quiet: bool = False) -> socketserver.BaseServer:
+    """HTTP on host:port, or on a Unix socket when `socket_path` is set (local callers only, no port)."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # left behind by a previous run
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+    server.service = service
+    server.quiet = quiet
+    return server
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def call(method: str, endpoint: str, body: Optional[Dict[str, Any]] = None, host: str = SERVER_HOST,
+         port: int = SERVER_PORT, socket_path: str = "", timeout: float = SERVER_TIMEOUT_S) -> Tuple[int, Dict[str, Any]]:
+    """One request to a running server; returns (HTTP status, decoded JSON)."""
+    if socket_path:
+        con = _UnixConnection(socket_path, timeout)
+    else:
+        con = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        con.request(method, endpoint, body=data, headers={"Content-Type": "application/json"})
+        resp = con.getresponse()
+        return resp.status, json.loads(resp.read() or b"{}")
+    finally:
+        con.close()
+
+
+def _report_writer(grader, no_markdown: bool):
+    from src.main import write_outputs
+
+    args = argparse.Namespace(print_only=False, no_markdown=no_markdown)
+
+    def write(text: str, path: str, out: Dict[str, Any]) -> Path:
+        # report_server_<content hash>: regrading the same submission overwrites its report, and the
+        # name cannot clash with the numbered CLI reports or the watcher's in the same REPORTS_DIR.
+        idx = "server_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        return write_outputs(grader, idx, Path(path), text, out, args, quiet=True)
+
+    return write
+
+
+def serve(args: argparse.Namespace) -> None:
+    from src.grader.grade_evaluator import GradeEvaluator
+
+    t0 = time.perf_counter()
+    grader = GradeEvaluator()
+    service = GradingService(grader, _report_writer(grader, args.no_markdown))
+    server = make_server(service, args.host, args.port, args.socket, quiet=args.quiet)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"Grader warm in {time.perf_counter() - t0:.1f}s ({len(grader.corpus)} chunks); serving on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+def grade_files(args: argparse.Namespace) -> int:
+    """Thin client: one request per file, result JSON on stdout; the exit code is 1 if any failed."""
+    failed = 0
+    for path in args.files:
+        body = {"rubric": args.rubric, "question": args.question, "write_reports": args.write_reports}
+        if args.send_text:
+            body.update(text=Path(path).read_text(encoding="utf-8", errors="ignore"), filename=Path(path).name)
+        else:
+            body["path"] = str(Path(path).resolve())
+        try:
+            status, reply = call("POST", "/grade", body, args.host, args.port, args.socket, args.timeout)
+        except OSError as e:
+            print(f"Grading server not reachable ({e}); start it with: python -m src.server serve", file=sys.stderr)
+            return 2
+        if status != 200:
+            failed += 1
+            print(f"{Path(path).name}: {reply.get('error')}", file=sys.stderr)
+            continue
+        print(json.dumps({"file": Path(path).name, **reply}, ensure_ascii=False, default=str))
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Resident grading server and its client.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--socket", default=SERVER_SOCKET, help="Unix socket path; overrides --host/--port.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="Load the evaluator once and answer grade requests.")
+    p_serve.add_argument("--no_markdown", action="store_true", help="Skip markdown reports for write_reports requests.")
+    p_serve.add_argument("--quiet", action="store_true", help="No per-request access log.")
+
+    p_grade = sub.add_parser("grade", help="Send files to a running server and print the result JSON.")
+    p_grade.add_argument("files", nargs="+", help="Paths under the server's SERVER_SUBMISSIONS_DIR, unless --send_text.")
+    p_grade.add_argument("--rubric", required=True, help="Rubric filename (inside data/rubrics).")
+    p_grade.add_argument("--question", required=True, help="Question filename (inside data/questions).")
+    p_grade.add_argument("--write_reports", action="store_true", help="Also write reports and the graded copy on the server.")
+    p_grade.add_argument("--send_text", action="store_true", help="Upload the text instead of a path (server on another machine; text files only).")
+    p_grade.add_argument("--timeout", type=float, default=SERVER_TIMEOUT_S)
+
+    sub.add_parser("stats", help="Print the server's cache and endpoint stats.")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args)
+        return 0
+    if args.command == "grade":
+        return grade_files(args)
+    status, reply = call("GET", "/stats", None, args.host, args.port, args.socket)
+    print(json.dumps(reply, indent=2, default=str))
+    return 0 if status == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
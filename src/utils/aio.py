@@ -0,0 +1,44 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """One event loop for the process, running in a daemon thread; started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="run-sync-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Runs a coroutine to completion from synchronous code. Every call uses the same background
+    loop, so loop-bound resources (the pooled httpx client of AsyncGroqClient) are kept
+    between calls instead of being rebuilt, and leaked, per asyncio.run. This also works when
+    called from inside a running event loop (a notebook, an async web handler): the caller
+    blocks, as any synchronous call would. Only a call made from the background loop itself,
+    which cannot wait on its own thread, falls back to a private loop in a helper thread.
+    """
+    loop = background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-sync") as pool:
+            return pool.submit(asyncio.run, coro).result()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()  # Ctrl+C in the caller stops the work too
+        raise
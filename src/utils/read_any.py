@@ -1,5 +1,7 @@
 from pathlib import Path
-from ..rag.pdf_utils import extract_pdf_pages
+from typing import List, Optional
+from ..config import PDF_WORKERS
+from ..rag.pdf_utils import extract_pdf_pages, extract_pdf_pages_many
 
 def read_text_any(path: str) -> str:
     p = Path(path)
@@ -7,3 +9,10 @@ def read_text_any(path: str) -> str:
         pages = extract_pdf_pages(str(p))
         return "\n".join(pg["text"] or "" for pg in pages)
     return p.read_text(encoding="utf-8", errors="ignore")
+
+def read_text_many(paths: List[str], workers: Optional[int] = PDF_WORKERS) -> List[str]:
+    """Like read_text_any for a batch; PDFs are extracted together on the process pool."""
+    pdf_idx = [i for i, p in enumerate(paths) if Path(p).suffix.lower() == ".pdf"]
+    extracted = extract_pdf_pages_many([str(paths[i]) for i in pdf_idx], workers=workers)
+    texts = dict(zip(pdf_idx, ("\n".join(pg["text"] or "" for pg in pages) for pages in extracted)))
+    return [texts[i] if i in texts else read_text_any(p) for i, p in enumerate(paths)]
@@ -0,0 +1,17 @@
+from typing import Dict, List
+
+# Rough chars-per-token for English prose under Llama/GPT-style BPE vocabularies.
+CHARS_PER_TOKEN = 4
+# Per-message framing the chat template adds (role markers, separators).
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-leaning token estimate; no tokenizer download needed."""
+    if not text:
+        return 0
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages) + 2
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from .batch import DEAD, DONE, BatchState, tracked_stages
+from .pipeline import Pipeline
+from .utils.file_select import ALLOWED
+
+# Names rsync, editors and browsers use while a file is still being written.
+_PARTIAL_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", "~")
+
+
+def is_submission(path: str) -> bool:
+    name = os.path.basename(path)
+    if name.startswith(".") or name.lower().endswith(_PARTIAL_SUFFIXES):
+        return False
+    return os.path.splitext(name)[1].lower() in ALLOWED
+
+
+class Debouncer:
+    """
+    Holds paths until their (size, mtime) has stopped changing for `quiet_s`, so a file that
+    is still being copied in is not graded half-written. Thread-safe: the watchdog thread
+    touches paths, the daemon loop collects the ready ones.
+    """
+
+    def __init__(self, quiet_s: float = 2.0):
+        self.quiet_s = quiet_s
+        self._pending: Dict[str, Tuple[Optional[Tuple[int, int]], float]] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, path: str, now: Optional[float] = None) -> None:
+        with self._lock:
+            self._pending[path] = (None, time.monotonic() if now is None else now)
+
+    def ready(self, now: Optional[float] = None) -> List[str]:
+        now = time.monotonic() if now is None else now
+        out = []
+        with self._lock:
+            for path, (sig, since) in list(self._pending.items()):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    del self._pending[path]  # deleted or renamed away
+                    continue
+                current = (st.st_size, st.st_mtime_ns)
+                if current != sig:
+                    self._pending[path] = (current, now)
+                elif now - since >= self.quiet_s:
+                    del self._pending[path]
+                    out.append(path)
+        return out
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, debouncer: Debouncer):
+        self.debouncer = debouncer
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+            return
+        path = getattr(event, "dest_path", "") or event.src_path  # rsync renames its temp file into place
+        if is_submission(path):
+            self.debouncer.touch(path)
+
+
+class SubmissionWatcher:
+    """
+    Long-running auto-grader for a folder. New or changed files are debounced, deduplicated
+    by content hash against a BatchState (so a file is graded once however often it is
+    re-synced, and a restart skips what is done), then fed through a bounded queue into the
+    extract -> grade -> write pipeline. When grading falls behind, the queue fills and intake
+    pauses; files keep collecting in the debouncer until there is room. Failed items are
+    retried after `retry_delay_s` until the state dead-letters them.
+    """
+
+    def __init__(self, root: str, state: BatchState, grade: Callable[[str], Any],
+                 on_result: Callable[[str, str, Dict[str, Any]], Any], workers: int = 4,
+                 write_workers: int = 2, extract_workers: int = 1, quiet_s: float = 2.0,
+                 queue_size: int = 8, poll_s: float = 0.25, retry_delay_s: float = 5.0,
+                 on_event: Optional[Callable[[str, str, float, Optional[str]], None]] = None):
+        self.root = root
+        self.state = state
+        self.debouncer = Debouncer(quiet_s)
+        self.queue_size = queue_size
+        self.poll_s = poll_s
+        self.retry_delay_s = retry_delay_s
+        self.on_event = on_event
+        self.queued: Set[str] = set()  # digests waiting or in flight
+        self.enqueued_at: Dict[str, float] = {}
+        self.stop_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self.pipeline = Pipeline(tracked_stages(state, grade, on_result, self._event, workers,
+                                                write_workers, extract_workers))
+
+    def _event(self, path: str, digest: str, status: str) -> None:
+        # Runs on the loop (grade stage, which also reports unreadable files) or a writer thread.
+        item = self.state.items[digest]
+        status = item["status"]
+        final = status in (DONE, DEAD)
+        latency = time.monotonic() - self.enqueued_at.get(digest, time.monotonic())
+        self._loop.call_soon_threadsafe(self._settle, path, digest, final)
+        if self.on_event is not None:
+            # on_event(path, status, seconds since the settled file was queued, error of a failure)
+            self.on_event(path, status, latency, item.get("error") if status != DONE else None)
+
+    def _settle(self, path: str, digest: str, final: bool) -> None:
+        if final:
+            self.queued.discard(digest)
+            self.enqueued_at.pop(digest, None)
+        else:
+            self._loop.call_later(self.retry_delay_s, lambda: asyncio.ensure_future(self._queue.put((path, digest))))
+
+    def stop(self) -> None:
+        if self._loop is not None and self.stop_event is not None:
+            self._loop.call_soon_threadsafe(self.stop_event.set)
+
+    async def _intake(self, initial: Iterable[str]) -> None:
+        for path in initial:
+            self.debouncer.touch(path)  # catch up on files that landed while the daemon was down
+        while not self.stop_event.is_set():
+            for path in self.debouncer.ready():
+                try:
+                    pending = self.state.todo([path])
+                except OSError:
+                    continue
+                for p, digest in pending:
+                    if digest in self.queued:
+                        continue  # same content already on its way
+                    self.queued.add(digest)
+                    self.enqueued_at[digest] = time.monotonic()
+                    await self._queue.put((p, digest))  # blocks while the pipeline is saturated
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=self.poll_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _items(self):
+        while True:
+            get = asyncio.ensure_future(self._queue.get())
+            stop = asyncio.ensure_future(self.stop_event.wait())
+            done, _ = await asyncio.wait({get, stop}, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                stop.cancel()
+                yield get.result()
+            else:
+                get.cancel()
+                return
+
+    async def run(self) -> None:
+        """Watches until stop() is called (or the task is cancelled)."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self.stop_event = asyncio.Event()
+        Path(self.root).mkdir(parents=True, exist_ok=True)
+        observer = Observer()
+        observer.schedule(_Handler(self.debouncer), self.root, recursive=False)
+        observer.start()
+        try:
+            initial = [str(p) for p in sorted(Path(self.root).iterdir()) if p.is_file() and is_submission(str(p))]
+            await asyncio.gather(self._intake(initial), self.pipeline.run(self._items(), collect=False))
+        finally:
+            observer.stop()
+            observer.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "debouncing": len(self.debouncer),
+            "queued": len(self.queued),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "stages": self.pipeline.stats(),
+            "state": self.state.counts(),
+        }
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from src.config import (
+    STUDENT_SUBMISSIONS_DIR, LLM_CONCURRENCY, JOBS_LEASE_S, JOBS_MAX_ATTEMPTS, JOBS_POLL_S, JOBS_RETRY_S
+)
+from src.db import (
+    DB_PATH, claim_job, complete_job, enqueue_jobs, fail_job, init_db, job_counts, next_retry_at,
+    record_job_grade, renew_lease
+)
+from src.rag.ingest_cache import file_digest
+from src.utils.file_select import list_files
+from src.utils.read_any import read_text_any
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+async def _heartbeat(job_id: int, worker_id: str, lease_s: float, db_path: Optional[Path]) -> None:
+    # Renews well before expiry; stops once another worker has taken the job over.
+    while True:
+        await asyncio.sleep(lease_s / 3)
+        if not await asyncio.to_thread(renew_lease, job_id, worker_id, lease_s, db_path):
+            return
+
+
+async def run_worker(
+    grade: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    on_result: Callable[[Dict[str, Any], Dict[str, Any]], Optional[Dict[str, Dict[str, Any]]]],
+    db_path: Optional[Path] = None,
+    worker_id: Optional[str] = None,
+    concurrency: int = 4,
+    lease_s: float = JOBS_LEASE_S,
+    max_attempts: int = JOBS_MAX_ATTEMPTS,
+    poll_s: float = JOBS_POLL_S,
+    on_event: Optional[Callable[[Dict[str, Any], str], None]] = None,
+    retry_s: float = JOBS_RETRY_S,
+) -> Dict[str, int]:
+    """
+    Pulls jobs from the shared queue on `concurrency` slots until it is drained (or, with
+    poll_s > 0, until cancelled). Each job is leased, graded with `grade(job)` while a heartbeat
+    keeps the lease alive, and handed to `on_result(job, out)` (in a thread). That returns the
+    rows to store, {"submission": ..., "grade": ...} (see record_job_grade), or None. The rows
+    are written in the same transaction that completes the job, so a job whose lease was lost
+    meanwhile writes nothing and is left to its new owner. A failed job waits
+    retry_s * 2**(attempt - 1) before it can be claimed again.
+    Any number of these can run against one database, in one process or on many machines.
+    """
+    worker_id = worker_id or default_worker_id()
+    counts = {"done": 0, "failed": 0, "lost": 0}
+
+    def event(job: Dict[str, Any], status: str) -> None:
+        counts[status] += 1
+        if on_event is not None:
+            on_event(job, status)
+
+    async def slot() -> None:
+        while True:
+            job = await asyncio.to_thread(claim_job, worker_id, lease_s, max_attempts, db_path)
+            if job is None:
+                if poll_s > 0:
+                    await asyncio.sleep(poll_s)
+                    continue
+                retry_at = await asyncio.to_thread(next_retry_at, db_path)
+                if retry_at is None:
+                    return  # drained: nothing pending, not even a failed job waiting out its delay
+                await asyncio.sleep(max(0.0, retry_at - time.time()))
+                continue
+            heartbeat = asyncio.create_task(_heartbeat(job["id"], worker_id, lease_s, db_path))
+            try:
+                out = await grade(job)
+                record = await asyncio.to_thread(on_result, job, out)
+            except Exception as e:
+                if await asyncio.to_thread(fail_job, job["id"], worker_id, f"{type(e).__name__}: {e}",
+                                           max_attempts, db_path, retry_s * 2 ** (job["attempts"] - 1)):
+                    event(job, "failed")
+                else:
+                    event(job, "lost")
+                continue
+            finally:
+                heartbeat.cancel()
+            if record is None:
+                done = await asyncio.to_thread(complete_job, job["id"], worker_id, None, db_path)
+            else:
+                done = await asyncio.to_thread(record_job_grade, job["id"], worker_id, record["submission"],
+                                               record["grade"], db_path) is not None
+            event(job, "done" if done else "lost")
+
+    await asyncio.gather(*(slot() for _ in range(max(1, concurrency))))
+    return counts
+
+
+def enqueue_folder(folder: str, rubric: str, question: str, db_path: Optional[Path] = None) -> int:
+    """Queues every submission in `folder` for the rubric/question pair; already-queued content is skipped."""
+    init_db(db_path)
+    files = [(p, file_digest(p)) for p in list_files(folder)]
+    return enqueue_jobs(files, rubric, question, db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade submissions from the shared job queue; run one per core or machine.")
+    parser.add_argument("--enqueue", action="store_true", help="Queue every file in data/student_submission and exit (needs --rubric and --question).")
+    parser.add_argument("--rubric", default="", help="Rubric filename (inside data/rubrics) for --enqueue.")
+    parser.add_argument("--question", default="", help="Question filename (inside data/questions) for --enqueue.")
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database shared by all workers.")
+    parser.add_argument("--workers", type=int, default=LLM_CONCURRENCY, help="Jobs graded at once by this process.")
+    parser.add_argument("--lease", type=float, default=JOBS_LEASE_S, help="Seconds a claim lasts without a heartbeat.")
+    parser.add_argument("--max_attempts", type=int, default=JOBS_MAX_ATTEMPTS, help="Claims per job before it is marked dead.")
+    parser.add_argument("--retry", type=float, default=JOBS_RETRY_S, help="Seconds a failed job waits before a retry (doubles per attempt).")
+    parser.add_argument("--poll", type=float, default=JOBS_POLL_S, help="Keep waiting for new jobs, checking this often (0 = exit when drained).")
+    parser.add_argument("--no_markdown", action="store_true", help="Skip markdown report generation.")
+    args = parser.parse_args()
+    db_path = Path(args.db)
+
+    if args.enqueue:
+        if not (args.rubric and args.question):
+            parser.error("--enqueue needs --rubric and --question")
+        added = enqueue_folder(STUDENT_SUBMISSIONS_DIR, args.rubric, args.question, db_path)
+        print(f"Queued {added} new jobs; queue: {job_counts(db_path)}")
+        return
+
+    # Imported here so --enqueue stays light on machines that only feed the queue.
+    from src.grader.grade_evaluator import GradeEvaluator
+    from src.main import print_stats, write_outputs
+
+    init_db(db_path)
+    args.print_only = False
+    grader = GradeEvaluator()  # loaded once, reused for every job this process claims
+    worker_id = default_worker_id()
+
+    async def grade(job: Dict[str, Any]) -> Dict[str, Any]:
+        job["text"] = await asyncio.to_thread(read_text_any, job["file_path"])
+        (out,) = await grader.agrade_many(
+            [job["text"]],
+            assignment_hint=f"Use rubric {job['rubric']} and question {job['question']}",
+            rubric_allowlist=[job["rubric"]],
+            question_allowlist=[job["question"]],
+        )
+        return out
+
+    def on_result(job: Dict[str, Any], out: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        sub_p = Path(job["file_path"])
+        # Report numbering follows the job id, so a re-run after a lost lease overwrites in place.
+        report_path = write_outputs(grader, job["id"], sub_p, job["text"], out, args, quiet=True)
+        result = grader.to_grade_result(out["result"], [])
+        return {
+            "submission": {"student_name": sub_p.stem, "filename": sub_p.name, "file_path": str(sub_p),
+                           "student_text": job["text"], "rubric_text": job["rubric"]},
+            "grade": {"score": result.score, "letter": result.grade, "feedback": result.feedback or "",
+                      "evidence": "\n".join(f"{r.get('path', '?')}:p{r.get('page')}" for r in out["retrieved"]),
+                      "report_path": str(report_path)},
+        }
+
+    def on_event(job: Dict[str, Any], status: str) -> None:
+        name = Path(job["file_path"]).name
+        if status == "done":
+            print(f"Graded {name} (job {job['id']}, attempt {job['attempts']})")
+        elif status == "failed":
+            print(f"Failed {name} (job {job['id']}, attempt {job['attempts']}/{args.max_attempts})")
+        else:
+            print(f"Lost the lease on {name} (job {job['id']}); another worker owns it now")
+
+    print(f"Worker {worker_id} on {db_path}: {job_counts(db_path)}")
+    try:
+        counts = asyncio.run(run_worker(grade, on_result, db_path, worker_id, args.workers,
+                                        args.lease, args.max_attempts, args.poll, on_event, args.retry))
+    except KeyboardInterrupt:
+        counts = None  # claimed jobs return to the queue when their leases expire
+    if counts is not None:
+        print(f"Worker finished: {counts['done']} done, {counts['failed']} failed, {counts['lost']} lost leases")
+    print(f"Queue: {job_counts(db_path)}")
+    print_stats(grader)
+
+
+if __name__ == "__main__":
+    main()
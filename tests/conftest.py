@@ -0,0 +1,22 @@
+# conftest.py
+import pytest
+
+from src.grader.grade_evaluator import GradeEvaluator
+from src.grader.rubric_parser import RubricCompiler
+from src.rag.retriever_tfidf import TfidfRetriever
+
+class NoLLM:
+    """LLM stand-in for tests that never reach the model; any call fails loudly."""
+
+    def _fail(self, *args, **kwargs):
+        raise AssertionError("unexpected LLM call")
+
+    chat = achat = achat_many = chat_stream = _fail
+
+@pytest.fixture
+def make_evaluator():
+    """GradeEvaluator over an in-memory TF-IDF index of `docs`, with nothing read from config folders."""
+    def make(docs=(), llm=None, rubrics=None, **kw):
+        return GradeEvaluator(retriever=TfidfRetriever(list(docs)), llm=llm if llm is not None else NoLLM(),
+                              rubrics=rubrics if rubrics is not None else RubricCompiler(), **kw)
+    return make
@@ -0,0 +1,64 @@
+# test_async_client.py
+import asyncio
+import json
+
+import httpx
+
+from src.llm.groq_client import AsyncGroqClient
+from src.llm.rate_limiter import RateLimiter
+from src.utils.aio import run_sync
+
+def _mock_transport(state):
+    async def handler(request):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        body = json.loads(request.content)
+        reply = body["messages"][-1]["content"]
+        if reply == "fail":
+            return httpx.Response(500, json={"error": "boom"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": reply}}]})
+    return httpx.MockTransport(handler)
+
+def test_achat_many_bounded_and_ordered():
+    state = {"in_flight": 0, "peak": 0}
+    client = AsyncGroqClient("m", concurrency=3, transport=_mock_transport(state), limiter=RateLimiter())
+    batch = [[{"role": "user", "content": f"r{i}"}] for i in range(10)]
+
+    async def run():
+        async with client:
+            return await client.achat_many(batch)
+
+    assert asyncio.run(run()) == [f"r{i}" for i in range(10)]
+    assert state["peak"] == 3
+    # The pool is rebuilt for a fresh event loop rather than reusing a dead one.
+    assert asyncio.run(client.achat([{"role": "user", "content": "again"}])) == "again"
+
+def test_blocking_calls_share_one_pool():
+    state = {"in_flight": 0, "peak": 0}
+    client = AsyncGroqClient("m", transport=_mock_transport(state), limiter=RateLimiter())
+    assert run_sync(client.achat([{"role": "user", "content": "a"}])) == "a"
+    pool = client._client
+    assert run_sync(client.achat([{"role": "user", "content": "b"}])) == "b"
+    assert client._client is pool and not pool.is_closed
+
+    async def elsewhere():
+        return await client.achat([{"role": "user", "content": "c"}])
+
+    assert asyncio.run(elsewhere()) == "c"
+    run_sync(asyncio.sleep(0.01))  # the replaced pool is closed on its own loop
+    assert client._client is not pool and pool.is_closed
+
+def test_grade_many_keeps_going_past_failures(make_evaluator):
+    state = {"in_flight": 0, "peak": 0}
+    docs = [{"id": "rubric-0", "text": "Gradient descent is worth 100 points.",
+             "meta": {"path": "rubric/r.pdf", "type": "rubric", "page": 1}}]
+    ev = make_evaluator(docs, llm=AsyncGroqClient("m", concurrency=2, transport=_mock_transport(state),
+                                                  limiter=RateLimiter(), max_retries=0))
+    ev._messages = lambda text, *a: ([{"role": "user", "content": text}], [], None)
+
+    outs = ev.grade_many(['{"total_score": 80}', "fail", '{"total_score": 150}'], return_exceptions=True)
+    assert outs[0]["result"]["total_score"] == 80.0
+    assert isinstance(outs[1], httpx.HTTPStatusError)
+    assert outs[2]["result"]["total_score"] == 100.0
@@ -0,0 +1,80 @@
+# test_batch.py
+import asyncio
+import json
+
+from src.batch import DEAD, DONE, PENDING, BatchState, run_batch
+
+def _subs(tmp_path, n):
+    paths = []
+    for i in range(n):
+        p = tmp_path / f"s{i}.txt"
+        p.write_text(f"answer {i}")
+        paths.append(str(p))
+    return paths
+
+def _run(state, paths, grade, workers=3):
+    written = []
+    meter = asyncio.run(run_batch(state, state.todo(paths), grade, lambda p, t, out: written.append(p) or p,
+                                  workers=workers))
+    return meter, written
+
+def test_retries_then_dead_letters(tmp_path):
+    paths = _subs(tmp_path, 5)
+    seen = {}
+
+    async def grade(text):
+        seen[text] = seen.get(text, 0) + 1
+        await asyncio.sleep(0.001)
+        if text == "answer 1" and seen[text] == 1:
+            raise ConnectionError("flaky")
+        if text == "answer 3":
+            raise ValueError("always broken")
+        return {"result": {"total_score": 50}}
+
+    state = BatchState(str(tmp_path / "state.json"), max_attempts=3)
+    meter, written = _run(state, paths, grade)
+    assert sorted(written) == sorted(p for p in paths if not p.endswith("s3.txt"))
+    assert seen["answer 1"] == 2 and seen["answer 3"] == 3
+    assert state.counts()[DONE] == 4 and meter.done == 4
+    (dead,) = state.dead_letters()
+    assert dead["filename"] == "s3.txt" and "always broken" in dead["error"]
+
+def test_restart_skips_completed_work(tmp_path):
+    paths = _subs(tmp_path, 4)
+    state_path = tmp_path / "state.json"
+    calls = []
+
+    async def grade(text):
+        calls.append(text)
+        if text == "answer 2" and len(calls) < 4:
+            raise RuntimeError("network down")
+        return {}
+
+    _run(BatchState(str(state_path), max_attempts=1), paths, grade)
+    assert BatchState(str(state_path)).counts()[DEAD] == 1
+
+    # A crash mid-flight leaves an item in_flight; the next run treats it as pending.
+    data = json.loads(state_path.read_text())
+    digest = next(d for d, item in data["items"].items() if item["filename"] == "s0.txt")
+    data["items"][digest]["status"] = "in_flight"
+    state_path.write_text(json.dumps(data))
+
+    calls.clear()
+    state = BatchState(str(state_path), max_attempts=1)
+    assert state.status(digest) == PENDING
+    _, written = _run(state, paths, grade)
+    assert calls == ["answer 0"] and written == [paths[0]]
+
+def test_unreadable_file_uses_attempts_and_dead_letters(tmp_path):
+    paths = _subs(tmp_path, 2)
+    corrupt = tmp_path / "broken.pdf"
+    corrupt.write_bytes(b"not a pdf")
+
+    async def grade(text):
+        return {}
+
+    state = BatchState(str(tmp_path / "state.json"), max_attempts=2)
+    meter, written = _run(state, paths + [str(corrupt)], grade)
+    assert sorted(written) == sorted(paths) and meter.done == 2
+    (dead,) = state.dead_letters()
+    assert dead["filename"] == "broken.pdf" and dead["attempts"] == 2 and "could not extract" in dead["error"]
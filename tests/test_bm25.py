@@ -0,0 +1,73 @@
+# test_bm25.py
+import math
+import random
+from collections import Counter
+from src.rag.retriever_bm25 import BM25Retriever, tokenize
+
+def _doc(i, tag, path, text):
+    return {"id": f"{tag}-{i}", "text": text, "meta": {"path": f"{tag}/{path}", "type": tag}}
+
+def _brute_force(docs, query, k1=1.2, b=0.75):
+    toks = [Counter(tokenize(d["text"])) for d in docs]
+    n = len(docs)
+    avgdl = sum(sum(t.values()) for t in toks) / n
+    df = Counter(term for t in toks for term in t)
+    out = []
+    for t in toks:
+        dl = sum(t.values())
+        s = 0.0
+        for q in tokenize(query):
+            if q in t:
+                idf = math.log1p((n - df[q] + 0.5) / (df[q] + 0.5))
+                s += idf * t[q] * (k1 + 1) / (t[q] + k1 * (1 - b + b * dl / avgdl))
+        out.append(s)
+    return out
+
+def _corpus(n=300, seed=7):
+    rng = random.Random(seed)
+    words = "gradient descent learning rate loss convergence momentum batch epoch bias variance".split()
+    filler = [f"w{i}" for i in range(200)]
+    return [_doc(i, "rubric" if i % 3 else "question", f"f{i % 10}.txt",
+                 " ".join(rng.choice(words if rng.random() < 0.3 else filler) for _ in range(rng.randint(5, 60))))
+            for i in range(n)]
+
+def test_topk_matches_exhaustive_scoring():
+    docs = _corpus()
+    r = BM25Retriever(docs)
+    for q in ["gradient descent", "learning rate momentum batch", "variance w3 w17", "bias"]:
+        exact = _brute_force(docs, q)
+        want = sorted(exact, reverse=True)[:5]
+        got = [s for s, _ in r.search(q, k=5)]
+        assert [round(x, 4) for x in got] == [round(x, 4) for x in want]
+
+def test_filters_and_predicate_agree():
+    docs = _corpus()
+    r = BM25Retriever(docs)
+    q = "convergence epoch"
+    part = r.search_partitioned(q, k=4, filters={"type": "question", "path_contains": ["f3"]})
+    pred = r.search_filtered(q, lambda d: d["meta"]["type"] == "question" and "f3" in d["meta"]["path"], k=4)
+    assert [d["id"] for _, d in part] == [d["id"] for _, d in pred]
+    assert all(d["meta"]["type"] == "question" and "f3" in d["meta"]["path"] for _, d in part)
+
+def test_add_remove_documents():
+    r = BM25Retriever([_doc(0, "rubric", "a.txt", "gradient descent")])
+    v = r.version
+    r.add_documents([_doc(1, "rubric", "b.txt", "bayesian priors")])
+    assert r.version > v
+    assert r.search("bayesian", k=1)[0][1]["id"] == "rubric-1"
+    assert r.remove_documents("rubric/b.txt") == 1
+    assert r.search("bayesian", k=1)[0][0] == 0.0
+
+def test_incremental_updates_match_exhaustive_scoring():
+    docs = _corpus(200)
+    r = BM25Retriever(docs[:100])
+    for i in range(100, 200, 10):
+        r.add_documents(docs[i:i + 10])
+    first = r.segments[0]
+    assert r.remove_documents("rubric/f4.txt") > 0
+    assert r.segments[0] is first  # tombstoned in place, no rebuild
+    live = [d for d in docs if d["meta"]["path"] != "rubric/f4.txt"]
+    assert r.docs == live
+    for q in ["gradient descent", "learning rate momentum batch", "variance w3 w17"]:
+        want = sorted(_brute_force(live, q), reverse=True)[:5]
+        assert [round(s, 4) for s, _ in r.search(q, k=5)] == [round(x, 4) for x in want]
@@ -0,0 +1,41 @@
+# test_chunking.py
+from pathlib import Path
+from src.rag.text_utils import clean, chunk_text, iter_chunk_spans, doc_text
+from src.rag.ingest import _load_dir
+
+def _legacy_chunks(text, chunk_size, overlap):
+    # the copy-based chunker this replaced
+    if len(text) <= chunk_size:
+        return [text]
+    out, i = [], 0
+    while i < len(text):
+        out.append(text[i:i + chunk_size])
+        i += max(1, chunk_size - overlap)
+    return out
+
+def test_spans_match_fixed_window_chunks():
+    text = clean("alpha  beta\n gamma\t" * 300)
+    spans = list(iter_chunk_spans(text, 1200, 200))
+    assert [text[s:e] for s, e in spans] == _legacy_chunks(text, 1200, 200)
+    assert chunk_text(text, 100, 20) == _legacy_chunks(text, 100, 20)
+    assert list(iter_chunk_spans("", 100, 20)) == [(0, 0)]
+
+def test_sentence_and_paragraph_boundaries():
+    text = clean(" ".join(f"Sentence number {i} ends here." for i in range(40)))
+    for s, e in iter_chunk_spans(text, 200, 40, boundary="sentence"):
+        assert e - s <= 200
+        assert text[s:e].endswith(".") or e == len(text)
+    paras = clean("First para line one.\nline two.\n\n\nSecond para.\n \nThird para.", keep_paragraphs=True)
+    assert paras == "First para line one. line two.\n\nSecond para.\n\nThird para."
+    chunks = [paras[s:e] for s, e in iter_chunk_spans(paras, 40, 5, boundary="paragraph")]
+    assert chunks[0] == "First para line one. line two."
+
+def test_ingested_chunks_share_one_buffer(tmp_path):
+    folder = tmp_path / "rubrics"
+    folder.mkdir()
+    (folder / "r.txt").write_text("word " * 1000, encoding="utf-8")
+    recs = _load_dir(str(folder), 300, 50, tag="rubric")
+    assert len(recs) > 1
+    assert all("text" not in r for r in recs)
+    assert len({id(r["source"]) for r in recs}) == 1
+    assert doc_text(recs[1]) == recs[0]["source"][recs[1]["meta"]["start"]:recs[1]["meta"]["end"]]
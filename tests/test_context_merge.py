@@ -0,0 +1,47 @@
+# test_context_merge.py
+from src.grader.grade_evaluator import build_context_block
+from src.rag.context_merge import merge_hits, render_passages
+from src.rag.text_utils import iter_chunk_spans
+from src.utils.tokens import estimate_tokens
+
+PAGE = " ".join(f"Sentence {i} of the rubric explains criterion {i % 7} in some detail." for i in range(60))
+
+def _chunks(path, page, text=PAGE, size=600, overlap=200):
+    return [{"id": f"{path}-{n}", "source": text,
+             "meta": {"path": path, "type": "rubric", "page": page, "start": s, "end": e}}
+            for n, (s, e) in enumerate(iter_chunk_spans(text, size, overlap))]
+
+def _naive_block(hits):
+    return "\n---\n".join(f"[score={round(s, 4)}] {d['meta']['path']}:p{d['meta']['page']} :: "
+                          f"{d['source'][d['meta']['start']:d['meta']['end']]}" for s, d in hits)
+
+def test_overlapping_chunks_merge_into_one_passage():
+    c = _chunks("rubric/r.pdf", 2)
+    hits = [(0.9, c[1]), (0.7, c[0]), (0.5, c[2])]
+    (p,) = merge_hits(hits)
+    assert (p.start, p.end) == (c[0]["meta"]["start"], c[2]["meta"]["end"])
+    assert p.text == PAGE[p.start:p.end] and p.score == 0.9
+    assert sorted(p.ids) == sorted(d["id"] for d in c[:3])
+
+def test_gaps_and_other_pages_stay_separate():
+    c = _chunks("rubric/r.pdf", 2)
+    other = _chunks("rubric/r.pdf", 3, text=PAGE.replace("rubric", "syllabus").replace("criterion", "topic"))
+    passages = merge_hits([(0.9, c[0]), (0.8, c[4]), (0.6, other[0])])
+    assert len(passages) == 3
+    block = render_passages(passages)
+    assert block.count("rubric/r.pdf:p2 ::") == 1 and block.count("rubric/r.pdf:p3 ::") == 1
+    assert block.count(" [...] ") == 1
+
+def test_near_duplicates_are_dropped():
+    c = _chunks("rubric/a.pdf", 1)
+    copy = _chunks("rubric/copy.pdf", 1)
+    plain = {"id": "q-0", "text": "Totally different question text about convexity.", "meta": {"path": "q.md"}}
+    passages = merge_hits([(0.9, c[0]), (0.8, copy[0]), (0.4, plain)])
+    assert [p.path for p in passages] == ["rubric/a.pdf", "q.md"]
+
+def test_context_block_is_smaller():
+    hits = [(1.0 - i / 10, d) for i, d in enumerate(_chunks("rubric/r.pdf", 1)[:5])]
+    block = build_context_block(hits)
+    assert estimate_tokens(block) < 0.8 * estimate_tokens(_naive_block(hits))
+    for _, d in hits:
+        assert d["source"][d["meta"]["start"]:d["meta"]["end"]] in block
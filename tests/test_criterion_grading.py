@@ -0,0 +1,71 @@
+# test_criterion_grading.py
+import asyncio
+import json
+
+from src.grader import grade_evaluator
+from src.grader.criterion_grading import merge_criterion_results, submission_passages
+from src.grader.rubric_parser import CompiledRubric, Criterion
+
+RUBRIC = CompiledRubric("r", [Criterion("Gradient derivation", 25.0, ["chain rule"]),
+                              Criterion("Learning rate discussion", 75.0, ["step size", "divergence"])])
+
+def test_merge_applies_weights_locally():
+    merged = merge_criterion_results(RUBRIC, [
+        {"score": 80, "rationale": "good", "improvable_sections": ["proof"]},
+        {"score": 140, "rationale": "great", "improvable_sections": ["proof", "plots"]},
+    ])
+    assert merged["total_score"] == 95.0                      # 0.25 * 80 + 0.75 * 100
+    assert [c["score"] for c in merged["criteria"]] == [80.0, 100.0]
+    assert merged["improvable_sections"] == ["proof", "plots"]
+
+def test_passages_follow_the_criterion():
+    filler = "Unrelated background about the history of optimisation research. " * 12
+    text = filler + "The gradient follows from the chain rule applied to the loss. " + filler \
+        + "A large learning rate step size causes divergence of training. " + filler
+    first, second = submission_passages(text, RUBRIC, k=1)
+    assert "chain rule" in first[0] and "divergence" in second[0]
+    assert submission_passages("short answer", RUBRIC, k=3) == [["short answer"], ["short answer"]]
+
+class _FakeLLM:
+    def __init__(self):
+        self.in_flight = self.peak = 0
+        self.max_tokens = []
+
+    async def achat_many(self, batch, return_exceptions=False, max_tokens=None, response_format=None):
+        async def one(messages):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            name = messages[1]["content"].split("Criterion: ")[1].splitlines()[0]
+            return json.dumps({"score": 60 if name.startswith("Gradient") else 100, "rationale": name})
+        self.max_tokens.append(max_tokens)
+        return await asyncio.gather(*(one(m) for m in batch))
+
+def test_per_criterion_mode_grades_concurrently(tmp_path, monkeypatch, make_evaluator):
+    (tmp_path / "r.json").write_text(json.dumps({"criteria": [
+        {"name": c.name, "weight": c.weight, "descriptors": c.descriptors} for c in RUBRIC.criteria]}))
+    monkeypatch.setattr(grade_evaluator, "RUBRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(grade_evaluator, "GRADING_MODE", "per_criterion")
+    docs = [{"id": "question-0", "text": "Derive the gradient and discuss the learning rate.",
+             "meta": {"path": "question/q.md", "type": "question"}}]
+    ev = make_evaluator(docs, llm=_FakeLLM())
+
+    out = ev.grade("I used the chain rule; a big step size diverges.", "gradient", ["r.json"], ["q.md"])
+    assert out["result"]["total_score"] == 90.0
+    assert [c["name"] for c in out["result"]["criteria"]] == ["Gradient derivation", "Learning rate discussion"]
+    assert ev.llm.peak == 2 and ev.llm.max_tokens == [grade_evaluator.CRITERION_MAX_TOKENS]
+    assert [o["result"]["total_score"] for o in ev.grade_many(["a", "b"], rubric_allowlist=["r.json"])] == [90.0, 90.0]
+
+def test_per_criterion_mode_inside_a_running_loop(tmp_path, monkeypatch, make_evaluator):
+    (tmp_path / "r.json").write_text(json.dumps({"criteria": [{"name": c.name, "weight": c.weight} for c in RUBRIC.criteria]}))
+    monkeypatch.setattr(grade_evaluator, "RUBRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(grade_evaluator, "GRADING_MODE", "per_criterion")
+    ev = make_evaluator(llm=_FakeLLM())
+
+    async def caller():  # e.g. a notebook cell or an async web handler using the blocking API
+        return (ev.grade("chain rule", rubric_allowlist=["r.json"]),
+                list(ev.grade_stream("chain rule", rubric_allowlist=["r.json"]))[-1],
+                ev.grade_many(["a"], rubric_allowlist=["r.json"])[0])
+
+    assert [o["result"]["total_score"] for o in asyncio.run(caller())] == [90.0, 90.0, 90.0]
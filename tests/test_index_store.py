@@ -0,0 +1,55 @@
+# test_index_store.py
+import numpy as np
+from src.rag.retriever_tfidf import TfidfRetriever
+from src.rag.index_store import read_meta
+
+DOCS = [
+    {"id": "rubric-0", "text": "Explain gradient descent and the learning rate.", "meta": {"path": "rubric/r.txt", "type": "rubric"}},
+    {"id": "question-0", "text": "Derive the convergence rate of the loss.", "meta": {"path": "question/q.txt", "type": "question"}},
+    {"id": "solution-0", "text": "Backpropagation computes gradients layer by layer.", "meta": {"path": "solution/s.txt", "type": "solution"}},
+]
+
+def test_saved_index_matches_fresh_fit(tmp_path):
+    fresh = TfidfRetriever(DOCS)
+    fresh.save(str(tmp_path / "idx"))
+    loaded = TfidfRetriever.load(str(tmp_path / "idx"))
+    assert isinstance(loaded.matrix.data, np.memmap)
+    assert loaded.docs == DOCS
+    q = "gradient descent learning rate"
+    assert [(round(s, 6), d["id"]) for s, d in loaded.search(q, k=3)] == \
+           [(round(s, 6), d["id"]) for s, d in fresh.search(q, k=3)]
+
+def test_load_or_build_rebuilds_only_on_change(tmp_path):
+    idx = str(tmp_path / "idx")
+    TfidfRetriever.load_or_build(DOCS, idx)
+    first = read_meta(idx)["manifest"]
+    again = TfidfRetriever.load_or_build(DOCS, idx)
+    assert isinstance(again.matrix.data, np.memmap)
+
+    changed = DOCS + [{"id": "rubric-1", "text": "Cite your sources.", "meta": {"path": "rubric/r2.txt", "type": "rubric"}}]
+    rebuilt = TfidfRetriever.load_or_build(changed, idx)
+    assert not isinstance(rebuilt.matrix.data, np.memmap)
+    assert read_meta(idx)["manifest"] != first
+    assert rebuilt.search("cite sources", k=1)[0][1]["id"] == "rubric-1"
+
+def test_load_or_build_rebuilds_when_rows_do_not_match_docs(tmp_path):
+    idx = str(tmp_path / "idx")
+    TfidfRetriever(DOCS[:2]).save(idx)
+    fingerprint = "same-scan"
+    TfidfRetriever.load_or_build(DOCS[:2], idx, fingerprint=fingerprint)
+    # Same fingerprint, but the saved rows are for a different document list.
+    r = TfidfRetriever.load_or_build(DOCS, idx, fingerprint=fingerprint)
+    assert len(r.docs) == r.matrix.shape[0] == 3
+    assert r.search("backpropagation gradients", k=1)[0][1]["id"] == "solution-0"
+
+def test_shared_sources_written_once(tmp_path):
+    page = "Gradient descent updates weights. The learning rate sets the step size."
+    docs = [
+        {"id": "rubric-0", "source": page, "meta": {"path": "rubric/r.pdf", "type": "rubric", "page": 1, "start": 0, "end": 33}},
+        {"id": "rubric-1", "source": page, "meta": {"path": "rubric/r.pdf", "type": "rubric", "page": 1, "start": 34, "end": len(page)}},
+    ]
+    TfidfRetriever(docs).save(str(tmp_path / "idx"))
+    assert len((tmp_path / "idx" / "sources.jsonl").read_text(encoding="utf-8").splitlines()) == 1
+    loaded = TfidfRetriever.load(str(tmp_path / "idx"))
+    assert loaded.docs == docs
+    assert loaded.search("learning rate", k=1)[0][1]["id"] == "rubric-1"
@@ -0,0 +1,54 @@
+# test_ingest_cache.py
+from src.rag.ingest import _load_dir, load_corpus
+from src.rag.ingest_cache import IngestCache
+from src.rag.text_utils import doc_text
+
+def _write(folder, name, text):
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / name).write_text(text, encoding="utf-8")
+
+def test_unchanged_files_load_from_cache(tmp_path):
+    rubrics = tmp_path / "rubrics"
+    _write(rubrics, "a.txt", "Explain gradient descent. " * 80)
+    _write(rubrics, "b.md", "Discuss learning rate and convergence.")
+    cache = IngestCache(str(tmp_path / "cache"))
+
+    first = _load_dir(str(rubrics), 200, 40, tag="rubric", cache=cache)
+    assert cache.stats() == {"hits": 0, "misses": 2}
+
+    second = _load_dir(str(rubrics), 200, 40, tag="rubric", cache=cache)
+    assert cache.stats() == {"hits": 2, "misses": 2}
+    assert sorted((doc_text(r), r["meta"]["path"]) for r in first) == \
+           sorted((doc_text(r), r["meta"]["path"]) for r in second)
+
+def test_modified_file_and_chunk_settings_miss(tmp_path):
+    rubrics = tmp_path / "rubrics"
+    _write(rubrics, "a.txt", "Explain gradient descent.")
+    cache = IngestCache(str(tmp_path / "cache"))
+    _load_dir(str(rubrics), 200, 40, tag="rubric", cache=cache)
+
+    _write(rubrics, "a.txt", "Explain stochastic gradient descent.")
+    recs = _load_dir(str(rubrics), 200, 40, tag="rubric", cache=cache)
+    assert doc_text(recs[0]) == "Explain stochastic gradient descent."
+    _load_dir(str(rubrics), 100, 20, tag="rubric", cache=cache)
+    assert cache.hits == 0 and cache.misses == 3
+
+def test_failed_extraction_is_not_cached(tmp_path):
+    rubrics = tmp_path / "rubrics"
+    _write(rubrics, "broken.pdf", "not a pdf")
+    _write(rubrics, "a.txt", "Explain gradient descent.")
+    cache = IngestCache(str(tmp_path / "cache"))
+    for workers in (1, 2):
+        recs = _load_dir(str(rubrics), 200, 40, tag="rubric", cache=cache, workers=workers)
+        assert [r["meta"]["path"] for r in recs] == ["rubric/a.txt"]
+    # The text file is a hit the second time; the broken PDF is extracted again.
+    assert cache.stats() == {"hits": 1, "misses": 3}
+
+def test_load_corpus_matches_uncached(tmp_path):
+    _write(tmp_path / "rubrics", "r.txt", "Rubric criteria: clarity, correctness. " * 50)
+    _write(tmp_path / "questions", "q.txt", "Question: derive the update rule.")
+    args = (str(tmp_path / "rubrics"), str(tmp_path / "questions"), "", 300, 50)
+    plain = load_corpus(*args)
+    cached = load_corpus(*args, cache_dir=str(tmp_path / "cache"))
+    again = load_corpus(*args, cache_dir=str(tmp_path / "cache"))
+    assert plain == cached == again
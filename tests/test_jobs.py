@@ -0,0 +1,91 @@
+# test_jobs.py
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+
+from src.db import (
+    JOB_CLAIMED, JOB_DEAD, JOB_DONE, claim_job, complete_job, enqueue_jobs, fail_job, init_db, job_counts,
+    record_job_grade
+)
+from src.worker import run_worker
+
+def _queue(tmp_path, n):
+    db = tmp_path / "jobs.db"
+    init_db(db)
+    files = [(f"subs/s{i}.txt", f"digest{i}") for i in range(n)]
+    assert enqueue_jobs(files, "r.pdf", "q.pdf", db) == n
+    assert enqueue_jobs(files[:3], "r.pdf", "q.pdf", db) == 0  # same content, same pair: not queued twice
+    return db
+
+def _drain(db, worker_id):
+    async def grade(job):
+        await asyncio.sleep(0.01)  # stands in for the LLM call
+        return {"result": {}}
+
+    counts = asyncio.run(run_worker(grade, lambda job, out: None, db, worker_id, concurrency=3, lease_s=30))
+    return counts["done"]
+
+def test_processes_share_the_queue(tmp_path):
+    db = _queue(tmp_path, 40)
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4) as pool:
+        done = pool.starmap(_drain, [(db, f"w{i}") for i in range(4)])
+    assert sum(done) == 40 and job_counts(db)[JOB_DONE] == 40
+    con = sqlite3.connect(db)
+    rows = con.execute("SELECT attempts, claimed_by FROM jobs").fetchall()
+    con.close()
+    assert all(attempts == 1 for attempts, _ in rows)  # every job graded exactly once
+    assert len({worker for _, worker in rows}) > 1
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    db = _queue(tmp_path, 4)
+    crashed = claim_job("crashed", lease_s=0.05, db_path=db)
+    time.sleep(0.1)
+    # The next claim picks up the abandoned job before the untouched ones.
+    retry = claim_job("healthy", lease_s=30, db_path=db)
+    assert retry["id"] == crashed["id"] and retry["attempts"] == 2
+    assert not complete_job(crashed["id"], "crashed", db_path=db)  # the stale worker can no longer finish it
+    assert complete_job(retry["id"], "healthy", submission_id=None, db_path=db)
+
+def test_attempt_cap_dead_letters(tmp_path):
+    db = _queue(tmp_path, 3)
+    job = claim_job("w", lease_s=30, max_attempts=2, db_path=db)
+    assert fail_job(job["id"], "w", "boom", max_attempts=2, db_path=db)
+    job = claim_job("w", lease_s=0.01, max_attempts=2, db_path=db)
+    assert job["attempts"] == 2 and job_counts(db)[JOB_CLAIMED] == 1
+    time.sleep(0.05)
+    claim_job("w", lease_s=30, max_attempts=2, db_path=db)  # expired on its last attempt: dead, not retried
+    assert job_counts(db)[JOB_DEAD] == 1
+
+def test_lost_lease_writes_no_rows(tmp_path):
+    db = _queue(tmp_path, 1)
+    stale = claim_job("stale", lease_s=0.05, db_path=db)
+    time.sleep(0.1)
+    owner = claim_job("owner", lease_s=30, db_path=db)
+    submission = {"student_name": "s0", "filename": "s0.txt", "file_path": "subs/s0.txt",
+                  "student_text": "answer", "rubric_text": "r.pdf"}
+    grade = {"score": 90.0, "letter": "A-", "feedback": "", "evidence": "", "report_path": "r.json"}
+    assert record_job_grade(stale["id"], "stale", submission, grade, db) is None
+    assert record_job_grade(owner["id"], "owner", submission, grade, db) is not None
+    con = sqlite3.connect(db)
+    counts = [con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("submissions", "grades")]
+    con.close()
+    assert counts == [1, 1] and job_counts(db)[JOB_DONE] == 1
+
+def test_failed_job_waits_before_retry(tmp_path):
+    db = _queue(tmp_path, 3)
+    attempts = []
+
+    async def grade(job):
+        attempts.append((job["id"], time.monotonic()))
+        if job["id"] == 1 and len([a for a in attempts if a[0] == 1]) == 1:
+            raise ConnectionError("flaky")
+        return {}
+
+    counts = asyncio.run(run_worker(grade, lambda job, out: None, db, "w", concurrency=1, lease_s=30,
+                                    max_attempts=3, retry_s=0.2))
+    assert counts == {"done": 3, "failed": 1, "lost": 0}
+    first, retry = [t for i, t in attempts if i == 1]
+    assert [i for i, _ in attempts] == [1, 2, 3, 1]  # the others went ahead while job 1 waited
+    assert retry - first >= 0.2
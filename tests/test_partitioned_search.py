@@ -0,0 +1,53 @@
+# test_partitioned_search.py
+from src.rag.retriever_tfidf import TfidfRetriever
+
+def _doc(i, tag, path, text):
+    return {"id": f"{tag}-{i}", "text": text, "meta": {"path": f"{tag}/{path}", "type": tag}}
+
+DOCS = [
+    _doc(0, "rubric", "hw1_rubric.pdf", "Gradient descent explanation earns 40 points."),
+    _doc(1, "rubric", "hw1_rubric.pdf", "Learning rate discussion earns 30 points."),
+    _doc(2, "rubric", "hw2_rubric.pdf", "Gradient boosting trees earn 50 points."),
+    _doc(3, "question", "hw1.pdf", "Explain gradient descent and learning rate."),
+    _doc(4, "solution", "hw1_key.txt", "Gradient descent moves against the gradient."),
+]
+
+def _predicate(tag, names):
+    return lambda d: d["meta"]["type"] == tag and (
+        not names or any(n.lower() in d["meta"]["path"].lower() for n in names))
+
+def test_partitioned_matches_predicate_scan():
+    r = TfidfRetriever(DOCS)
+    q = "gradient descent learning rate"
+    for tag, names in [("rubric", ["HW1_rubric.pdf"]), ("rubric", None), ("question", ["hw1.pdf"]), ("solution", [])]:
+        got = r.search_partitioned(q, k=2, filters={"type": tag, "path_contains": names})
+        want = r.search_filtered(q, predicate=_predicate(tag, names), k=2)
+        assert [(round(s, 8), d["id"]) for s, d in got] == [(round(s, 8), d["id"]) for s, d in want]
+
+def test_rows_for_and_empty_partition():
+    r = TfidfRetriever(DOCS)
+    assert r.rows_for({"type": "rubric", "path_contains": ["hw2"]}).tolist() == [2]
+    assert r.rows_for({"path_contains": ["hw1"]}).tolist() == [0, 1, 3, 4]
+    assert r.search_partitioned("gradient", k=3, filters={"type": "missing"}) == []
+
+def test_partitions_follow_updates():
+    r = TfidfRetriever(DOCS)
+    r.search_partitioned("gradient", k=1, filters={"type": "rubric"})
+    r.add_documents([_doc(5, "rubric", "hw3_rubric.pdf", "Regularization earns 20 points.")])
+    hits = r.search_partitioned("regularization", k=1, filters={"type": "rubric", "path_contains": ["hw3"]})
+    assert hits[0][1]["id"] == "rubric-5"
+
+def test_search_many_matches_single_queries():
+    r = TfidfRetriever(DOCS)
+    queries = ["gradient descent", "learning rate points", "boosting trees", "no overlap whatsoever"]
+    batched = r.search_many(queries, k=3)
+    for q, hits in zip(queries, batched):
+        single = r.search_filtered(q, predicate=lambda d: True, k=3)
+        assert [round(s, 8) for s, _ in hits] == [round(s, 8) for s, _ in single]
+        assert len(hits) == 3
+
+    per_query = [{"type": "rubric"}, {"type": "question"}, None, {"type": "rubric", "path_contains": ["hw2"]}]
+    mixed = r.search_many(queries, k=2, filters=per_query)
+    assert {d["meta"]["type"] for _, d in mixed[0]} == {"rubric"}
+    assert [d["id"] for _, d in mixed[1]] == ["question-3"]
+    assert [d["id"] for _, d in mixed[3]] == ["rubric-2"]
@@ -0,0 +1,31 @@
+# test_pdf_extract.py
+from reportlab.pdfgen import canvas
+from src.rag.pdf_utils import extract_pdf_pages, extract_pdf_pages_many
+
+def _make_pdf(path, n_pages, label):
+    c = canvas.Canvas(str(path))
+    for i in range(n_pages):
+        c.drawString(72, 720, f"{label} page {i}")
+        c.showPage()
+    c.save()
+    return str(path)
+
+def test_parallel_matches_serial(tmp_path):
+    paths = [_make_pdf(tmp_path / f"s{i}.pdf", n, f"doc{i}") for i, n in enumerate([1, 5, 3])]
+    serial = [extract_pdf_pages(p) for p in paths]
+    parallel = extract_pdf_pages_many(paths, workers=2, pages_per_task=2)
+    assert parallel == serial
+    assert [pg["page_index"] for pg in parallel[1]] == [0, 1, 2, 3, 4]
+    assert "doc1 page 4" in parallel[1][4]["text"]
+
+def test_single_file_page_split(tmp_path):
+    p = _make_pdf(tmp_path / "long.pdf", 7, "long")
+    assert extract_pdf_pages(p, workers=3, pages_per_task=2) == extract_pdf_pages(p)
+
+def test_return_exceptions(tmp_path):
+    good = _make_pdf(tmp_path / "ok.pdf", 1, "ok")
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"not a pdf")
+    out = extract_pdf_pages_many([good, str(bad)], workers=2, return_exceptions=True)
+    assert "ok page 0" in out[0][0]["text"]
+    assert isinstance(out[1], Exception)
@@ -0,0 +1,49 @@
+# test_pipeline.py
+import asyncio
+import time
+
+from src.pipeline import Pipeline, Stage
+
+def test_stages_overlap_and_keep_order():
+    async def fetch(x):
+        await asyncio.sleep(0.02)
+        return x * 2
+
+    def write(x):
+        time.sleep(0.02)
+        return x + 1
+
+    pipeline = Pipeline([Stage("fetch", fetch, workers=4, kind="async"),
+                         Stage("write", write, workers=4, kind="thread")])
+    started = time.perf_counter()
+    assert asyncio.run(pipeline.run(range(8))) == [x * 2 + 1 for x in range(8)]
+    # Serial would take 8 * 0.04s; overlapped stages finish in a fraction of that.
+    assert time.perf_counter() - started < 0.25
+    stats = pipeline.stats()
+    assert stats["fetch"]["processed"] == stats["write"]["processed"] == 8
+    assert 0 < stats["write"]["utilization"] <= 1.0
+
+def test_failures_skip_later_stages():
+    seen = []
+
+    def parse(x):
+        if x == 2:
+            raise ValueError("bad input")
+        return x
+
+    pipeline = Pipeline([Stage("parse", parse, workers=2), Stage("sink", lambda x: seen.append(x) or x)])
+    results = asyncio.run(pipeline.run(range(4)))
+    assert isinstance(results[2], ValueError) and [r for r in results if not isinstance(r, Exception)] == [0, 1, 3]
+    assert sorted(seen) == [0, 1, 3] and pipeline.stats()["parse"]["failed"] == 1
+
+def test_bounded_queue_backs_up_before_slow_stage():
+    async def slow(x):
+        await asyncio.sleep(0.01)
+        return x
+
+    pipeline = Pipeline([Stage("fast", len, workers=2, kind="process"),
+                         Stage("slow", slow, workers=1, kind="async", queue_size=3)])
+    assert asyncio.run(pipeline.run(["a", "bb", "ccc"] * 5)) == [1, 2, 3] * 5
+    stats = pipeline.stats()
+    assert stats["slow"]["queue_max"] <= 3
+    assert pipeline.bottleneck() == "slow"
@@ -0,0 +1,126 @@
+# test_provider_pool.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.llm.groq_client import AsyncGroqClient
+from src.llm.provider_pool import EndpointHealth, ProviderPool, parse_endpoints
+from src.llm.rate_limiter import RateLimiter
+
+def _serve(delay_s=0.0, status=200, content='{"total_score": 90}'):
+    """A local OpenAI-compatible /chat/completions endpoint; returns (server, base_url)."""
+    class Handler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def do_POST(self):
+            Handler.calls += 1
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay_s)
+            body = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.handler = Handler
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def _pool(urls, **kw):
+    clients = {name: AsyncGroqClient("m", base_url=url, limiter=RateLimiter(), max_retries=0)
+               for name, url in urls.items()}
+    return ProviderPool(clients, **kw)
+
+MSG = [{"role": "user", "content": "grade"}]
+
+def test_routes_to_fastest_and_fails_over():
+    fast, fast_url = _serve(0.0)
+    slow, slow_url = _serve(0.15)
+    broken, broken_url = _serve(status=500)
+    try:
+        pool = _pool({"slow": slow_url, "broken": broken_url, "fast": fast_url}, hedge=False)
+
+        async def run():
+            for _ in range(3):
+                await pool.achat(MSG)          # every endpoint gets probed once
+            return await asyncio.gather(*(pool.achat(MSG) for _ in range(6)))
+
+        assert all(r == '{"total_score": 90}' for r in asyncio.run(run()))
+        stats = pool.stats()["endpoints"]
+        assert stats["broken"]["error_rate"] == 1.0
+        assert stats["fast"]["calls"] > stats["slow"]["calls"]
+    finally:
+        for s in (fast, slow, broken):
+            s.shutdown()
+
+def test_invalid_json_fails_over():
+    prose, prose_url = _serve(content="Sure, here is my assessment.")
+    good, good_url = _serve()
+    try:
+        pool = _pool({"prose": prose_url, "good": good_url}, hedge=False)
+        assert all(pool.chat(MSG) == '{"total_score": 90}' for _ in range(2))
+        assert pool.stats()["endpoints"]["prose"]["error_rate"] == 1.0
+    finally:
+        prose.shutdown(); good.shutdown()
+
+def test_hedges_past_p95():
+    fast, fast_url = _serve(0.01)
+    slow, slow_url = _serve(0.01)
+    try:
+        pool = _pool({"a": fast_url, "b": slow_url}, hedge=True, hedge_min_samples=2)
+
+        async def run():
+            for _ in range(4):
+                await pool.achat(MSG)
+            # The current favourite stalls well past its p95; the duplicate answers first.
+            favourite = pool.ranked()[0]
+            server = fast if favourite == "a" else slow
+            server.handler.calls = 0
+            original = server.handler.do_POST
+            server.handler.do_POST = lambda self: (time.sleep(0.5), original(self))
+            started = time.perf_counter()
+            reply = await pool.achat(MSG)
+            return reply, time.perf_counter() - started
+
+        reply, elapsed = asyncio.run(run())
+        assert reply == '{"total_score": 90}' and elapsed < 0.4
+        assert pool.stats()["hedges"] == 1 and pool.stats()["hedge_wins"] == 1
+    finally:
+        fast.shutdown(); slow.shutdown()
+
+def test_parse_endpoints(monkeypatch):
+    monkeypatch.setenv("ALT_KEY", "secret")
+    eps = parse_endpoints('[{"base_url": "http://x/v1", "model": "m", "api_key_env": "ALT_KEY", "rpm": 10}]')
+    assert eps[0].name == "endpoint0" and eps[0].api_key == "secret" and eps[0].rpm == 10
+    assert parse_endpoints("") == []
+
+def test_failed_endpoint_returns_to_rotation():
+    now = [0.0]
+    h = EndpointHealth(half_life_s=60, reprobe_s=300, clock=lambda: now[0])
+    h.record(None, False)  # one early failure, no successful call yet
+    assert 0 < h.cost() < float("inf")
+    fresh = h.cost()
+    now[0] += 120
+    assert h.cost() < fresh  # the failure is fading
+    now[0] += 300
+    assert h.cost() == 0.0   # probed again like a new endpoint
+    h.record(0.2, True)
+    assert h.cost() < 0.3
+
+def test_untried_endpoint_does_not_take_a_whole_burst():
+    known, untried = EndpointHealth(), EndpointHealth()
+    known.record(0.5, True)
+    assert untried.cost() == 0.0 < known.cost()
+    picks = []
+    for _ in range(6):  # concurrent calls: none has finished yet
+        h = min((untried, known), key=lambda e: e.cost())
+        h.in_flight += 1
+        picks.append(h is untried)
+    assert picks[0] and 1 <= sum(picks) < 6
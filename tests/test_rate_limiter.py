@@ -0,0 +1,95 @@
+# test_rate_limiter.py
+import asyncio
+import json
+
+import httpx
+import pytest
+import requests
+
+from src.llm.groq_client import AsyncGroqClient, GroqClient
+from src.llm.rate_limiter import RateLimiter, TokenBucket, parse_duration, retry_after
+from src.utils.tokens import estimate_message_tokens
+
+def test_bucket_paces_reservations_in_order():
+    b = TokenBucket(60, period_s=60)       # 1 unit per second
+    assert b.reserve(60, now=0.0) == 0.0
+    assert b.reserve(2, now=0.0) == 2.0    # waits for the refill
+    assert b.reserve(1, now=1.0) == 2.0    # queued behind the previous reservation
+    assert b.reserve(500, now=100.0) == 0.0  # oversized requests are capped at capacity
+
+def test_limiter_tracks_both_budgets_and_headers():
+    lim = RateLimiter(rpm=2, tpm=1000)
+    assert lim.reserve(400) == 0.0
+    assert lim.reserve(400) == 0.0
+    assert lim.reserve(10) > 0             # third request in the minute
+    lim = RateLimiter(rpm=0, tpm=1000)
+    lim.observe({"x-ratelimit-limit-tokens": "1000", "x-ratelimit-remaining-tokens": "0"})
+    assert lim.reserve(100) > 0
+    lim.settle(estimated=100, actual=0)
+    assert lim.backoff({"retry-after": "2"}) == 2.0 and lim.reserve(1) > 1.5
+
+def test_header_parsing():
+    assert parse_duration("2m59.56s") == 179.56
+    assert parse_duration("120ms") == 0.12
+    assert parse_duration("7") == 7.0
+    assert parse_duration("soon") is None
+    assert retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert estimate_message_tokens([{"role": "user", "content": "x" * 40}]) == 16
+
+def test_429_is_retried_after_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(429, headers={"retry-after": "0.01"}, json={"error": "slow down"})
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"choices": [{"message": {"content": body["messages"][0]["content"]}}],
+                                         "usage": {"total_tokens": 12}})
+
+    lim = RateLimiter(rpm=100, tpm=100000)
+    client = AsyncGroqClient("m", transport=httpx.MockTransport(handler), limiter=lim, max_retries=3)
+    assert asyncio.run(client.achat([{"role": "user", "content": "ok"}])) == "ok"
+    assert len(calls) == 3 and lim.throttled == 2
+
+def test_limits_come_from_headers_and_failures_refund():
+    lim = RateLimiter()  # nothing configured: no pacing until the provider says otherwise
+    assert lim.reserve(10**6) == 0.0
+    lim.observe({"x-ratelimit-limit-tokens": "1000", "x-ratelimit-remaining-tokens": "1000"})
+    assert lim.tokens.capacity == 1000
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 2:
+            return httpx.Response(503, json={"error": "overloaded"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 0}})
+
+    client = AsyncGroqClient("m", max_tokens=400, transport=httpx.MockTransport(handler), limiter=lim, max_retries=1)
+    assert asyncio.run(client.achat([{"role": "user", "content": "ok"}])) == "ok"
+    # The 503 gave its reservation back, so both attempts fit in the bucket with nothing charged.
+    assert len(calls) == 2 and lim.reserve(1000) == 0.0
+
+def test_unanswered_requests_refund():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    lim = RateLimiter(tpm=1000)
+    client = AsyncGroqClient("m", max_tokens=400, transport=httpx.MockTransport(handler), limiter=lim, max_retries=1)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.achat([{"role": "user", "content": "ok"}]))
+    assert lim.reserve(1000) == 0.0  # neither attempt kept its 400-token reservation
+
+    lim = RateLimiter(tpm=1000)
+    sync = GroqClient("m", max_tokens=400, limiter=lim, max_retries=0)
+
+    def timeout(*args, **kwargs):
+        raise requests.ReadTimeout("no reply")
+
+    sync.session.post = timeout
+    with pytest.raises(requests.ReadTimeout):
+        sync.chat([{"role": "user", "content": "ok"}])
+    with pytest.raises(requests.ReadTimeout):
+        list(sync.chat_stream([{"role": "user", "content": "ok"}]))
+    assert lim.reserve(1000) == 0.0
@@ -0,0 +1,75 @@
+# test_response_cache.py
+import asyncio
+
+import httpx
+
+from src.llm.groq_client import AsyncGroqClient
+from src.llm.rate_limiter import RateLimiter
+from src.llm.response_cache import ResponseCache
+
+MSGS = [{"role": "system", "content": "grade"}, {"role": "user", "content": "answer"}]
+
+def _client(cache, calls, temperature=0.0):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"reply {len(calls)}"}}]})
+    return AsyncGroqClient("m", temperature=temperature, transport=httpx.MockTransport(handler),
+                           limiter=RateLimiter(), cache=cache)
+
+def test_identical_requests_hit_across_instances(tmp_path):
+    calls = []
+    path = str(tmp_path / "llm.sqlite")
+    assert asyncio.run(_client(ResponseCache(path), calls).achat(MSGS)) == "reply 1"
+    cache = ResponseCache(path)             # a later run reopens the same file
+    assert asyncio.run(_client(cache, calls).achat_many([MSGS, MSGS])) == ["reply 1", "reply 1"]
+    assert len(calls) == 1 and cache.stats()["hit_rate"] == 1.0
+
+def test_key_covers_request_and_sampling_bypasses(tmp_path):
+    k = ResponseCache.make_key("m", 0.0, 100, MSGS)
+    assert k == ResponseCache.make_key("m", 0, 100, [dict(m) for m in MSGS])
+    assert k != ResponseCache.make_key("m", 0.0, 200, MSGS)
+    assert k != ResponseCache.make_key("other", 0.0, 100, MSGS)
+
+    calls = []
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"))
+    client = _client(cache, calls, temperature=0.7)
+    asyncio.run(client.achat(MSGS))
+    asyncio.run(client.achat(MSGS))
+    assert len(calls) == 2 and len(cache) == 0
+
+def test_size_eviction_and_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"), max_bytes=600)
+    payload = lambda i: f"{i}-" + "".join(chr(0x4e00 + (i * 131 + j * 17) % 2000) for j in range(100))
+    for i in range(5):
+        cache.put(f"k{i}", payload(i))
+    assert cache.stats()["bytes"] <= 600
+    assert cache.get("k4") == payload(4) and cache.get("k0") is None
+
+    now = [1000.0]
+    expiring = ResponseCache(str(tmp_path / "ttl.sqlite"), ttl_s=60, clock=lambda: now[0])
+    expiring.put("k", "v")
+    now[0] += 30
+    assert expiring.get("k") == "v"
+    now[0] += 31
+    assert expiring.get("k") is None
+
+def test_only_complete_valid_replies_are_cached(tmp_path):
+    replies = iter([
+        {"choices": [{"message": {"content": '{"score": 3'}, "finish_reason": "length"}]},
+        {"choices": [{"message": {"content": "I cannot grade this."}, "finish_reason": "stop"}]},
+        {"choices": [{"message": {"content": '{"rationale": "ok"}'}, "finish_reason": "stop"}]},
+        {"choices": [{"message": {"content": '{"score": 3, "rationale": "ok"}'}, "finish_reason": "stop"}]},
+    ])
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json=next(replies))
+
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"))
+    client = AsyncGroqClient("m", transport=httpx.MockTransport(handler), limiter=RateLimiter(), cache=cache)
+    fmt = {"type": "json_schema", "json_schema": {"name": "R", "schema": {"required": ["score", "rationale"]}}}
+    for _ in range(4):  # truncated, not JSON, missing a required key: each is asked for again
+        asyncio.run(client.achat(MSGS, response_format=fmt))
+    assert asyncio.run(client.achat(MSGS, response_format=fmt)) == '{"score": 3, "rationale": "ok"}'
+    assert len(calls) == 4 and len(cache) == 1
@@ -0,0 +1,31 @@
+# test_retrieval_cache.py
+from src.rag.retrieval_cache import RetrievalCache
+
+def test_lru_eviction_and_stats():
+    c = RetrievalCache(max_entries=2)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1          # "a" becomes most recent
+    c.put("c", 3)                   # evicts "b"
+    assert c.get("b") is None
+    assert c.get("c") == 3
+    assert c.stats() == {"hits": 2, "misses": 1, "size": 2}
+
+def test_context_memoized_until_index_changes(make_evaluator):
+    docs = [
+        {"id": "rubric-0", "text": "Gradient descent is worth 50 points.", "meta": {"path": "rubric/r.pdf", "type": "rubric", "page": 1}},
+        {"id": "question-0", "text": "Explain gradient descent.", "meta": {"path": "question/q.pdf", "type": "question", "page": 1}},
+    ]
+    ev = make_evaluator(docs)
+    q = "Use rubric r.pdf and question q.pdf"
+    first = ev._context_for(q, ["r.pdf"], ["q.pdf"])
+    for _ in range(5):
+        assert ev._context_for(q, ["r.pdf"], ["q.pdf"]) is first
+    assert ev.stats()["retrieval_cache"]["hits"] == 5
+    assert "rubric/r.pdf:p1" in first[1]
+
+    ev.retriever.add_documents([{"id": "rubric-1", "text": "Learning rate is worth 50 points.",
+                                 "meta": {"path": "rubric/r.pdf", "type": "rubric", "page": 2}}])
+    refreshed = ev._context_for(q, ["r.pdf"], ["q.pdf"])
+    assert refreshed is not first
+    assert len(refreshed[0]) == 3
@@ -0,0 +1,91 @@
+# test_rubric_parser.py
+import json
+
+from src.grader import grade_evaluator, rubric_parser
+from src.grader.rubric_parser import Criterion, RubricCompiler, parse_json_rubric, parse_text_rubric
+
+RUBRIC_MD = """# Assignment 2
+Students are assessed on the following.
+1. Clarity (20 points)
+   - Clear structure and definitions
+2. Correctness: 50%
+   Derivation of the update rule is right.
+## Analysis [30] - discusses convergence
+"""
+
+def test_text_rubric_criteria_and_descriptors():
+    crits = parse_text_rubric(RUBRIC_MD)
+    assert [(c.name, c.weight) for c in crits] == [("Clarity", 20), ("Correctness", 50), ("Analysis", 30)]
+    assert crits[0].descriptors == ["Clear structure and definitions"]
+    assert crits[2].descriptors == ["discusses convergence"]
+    table = parse_text_rubric("| Criterion | Points | Notes |\n|---|---|---|\n| Clarity | 5 | clear |\n| Depth | 15 | |\n| Total | 20 | |")
+    assert [(c.name, c.weight, c.descriptors) for c in table] == [("Clarity", 5, ["clear"]), ("Depth", 15, [])]
+    assert parse_text_rubric("Students should explain gradient descent.") == []
+
+def test_dates_and_totals_are_not_criteria():
+    text = "Due: 10/14/2025\nTotal: 100 points\nClarity (20 points)\nCorrectness (80 points)"
+    assert [(c.name, c.weight) for c in parse_text_rubric(text)] == [("Clarity", 20), ("Correctness", 80)]
+    assert parse_text_rubric("Week: 3\nClarity (20 points)\nDepth (80 points)") == [Criterion("Clarity", 20),
+                                                                                  Criterion("Depth", 80)]
+    # Weights that miss the stated total (100 when none is stated) mean the parse is wrong:
+    # fall back to rubric chunks.
+    assert parse_text_rubric("Total: 100 points\nClarity (20 points)\nCorrectness (30 points)") == []
+    assert parse_text_rubric("Clarity (20 points)\nCorrectness (30 points)") == []
+    table = "| Criterion | Points |\n|---|---|\n| Clarity | 40 |\n| Depth | 60 |\n| Total | 100 |"
+    assert [c.name for c in parse_text_rubric(table)] == ["Clarity", "Depth"]
+
+BANDED = """Essay Rubric (100 points)
+Analysis (40%)
+  - Excellent (36-40): insightful
+  - Adequate (28-35): some depth
+  - Weak (0-27): superficial
+Presentation (60%)
+  - Excellent (54-60): polished
+  - Weak (0-40): hard to follow
+Late penalty: 10% per day
+"""
+
+def test_level_bands_are_descriptors_not_criteria():
+    crits = parse_text_rubric(BANDED)
+    assert [(c.name, c.weight) for c in crits] == [("Analysis", 40), ("Presentation", 60)]
+    assert crits[0].descriptors == ["Excellent (36-40): insightful", "Adequate (28-35): some depth",
+                                    "Weak (0-27): superficial"]
+    assert crits[1].descriptors == ["Excellent (54-60): polished", "Weak (0-40): hard to follow"]
+    # Unindented bands with single-number levels, under headings.
+    flat = "## Clarity (30 points)\n- Excellent: 30\n- Poor: 0\n## Depth (70 points)\n- Excellent: 70\n- Weak: 10"
+    assert [(c.name, c.weight, len(c.descriptors)) for c in parse_text_rubric(flat)] == [("Clarity", 30, 2),
+                                                                                         ("Depth", 70, 2)]
+    # A band line that does read as a criterion leaves the weights off the total: use the chunks.
+    assert parse_text_rubric("Analysis (40%)\nInsight (36 points)\nPresentation (60%)") == []
+
+def test_json_rubric_shapes():
+    listed = parse_json_rubric({"criteria": [{"criterion": "Clarity", "points": "10 pts",
+                                              "levels": [{"level": "A", "description": "crisp"}]}]})
+    assert listed[0].name == "Clarity" and listed[0].weight == 10 and listed[0].descriptors == ["A: crisp"]
+    mapping = parse_json_rubric({"Clarity": 1, "Depth": {"weight": 3, "description": "goes deep"}})
+    assert [(c.name, c.weight) for c in mapping] == [("Clarity", 1), ("Depth", 3)]
+
+def test_compiled_once_per_content_hash(tmp_path, monkeypatch):
+    path = tmp_path / "r.json"
+    path.write_text(json.dumps({"criteria": [{"name": "Clarity", "weight": 1}, {"name": "Depth", "weight": 3}]}))
+    calls = []
+    real = rubric_parser.compile_rubric
+    monkeypatch.setattr(rubric_parser, "compile_rubric", lambda *a: calls.append(a) or real(*a))
+
+    first = RubricCompiler(str(tmp_path / "cache")).compile(str(path))
+    assert [c.weight for c in first.criteria] == [25.0, 75.0]
+    assert first.to_prompt() == "r — criteria and weights (total 100):\n1. Clarity (25%)\n2. Depth (75%)"
+    again = RubricCompiler(str(tmp_path / "cache")).compile(str(path))   # a later run, same content
+    assert again.to_prompt() == first.to_prompt() and len(calls) == 1
+
+def test_prompt_uses_compiled_rubric_instead_of_chunks(tmp_path, monkeypatch, make_evaluator):
+    (tmp_path / "r.md").write_text(RUBRIC_MD)
+    monkeypatch.setattr(grade_evaluator, "RUBRICS_DIR", str(tmp_path))
+    docs = [
+        {"id": "rubric-0", "text": "Clarity is worth 20 points.", "meta": {"path": "rubric/r.md", "type": "rubric"}},
+        {"id": "question-0", "text": "Explain clarity in gradient descent.", "meta": {"path": "question/q.md", "type": "question"}},
+    ]
+    ev = make_evaluator(docs)
+    messages, hits, _ = ev._messages("my answer", "clarity", ["r.md"], ["q.md"])
+    assert "2. Correctness (50%): Derivation of the update rule is right." in messages[1]["content"]
+    assert [d["meta"]["type"] for _, d in hits] == ["question"]
@@ -0,0 +1,52 @@
+# test_scanner.py
+import os
+
+from src.rag import scanner
+from src.rag.ingest import _load_dir
+from src.rag.scanner import Manifest, scan_tree
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+def test_scan_tree_filters_and_orders(tmp_path):
+    _write(tmp_path / "b.txt", "b")
+    _write(tmp_path / "a.md", "a")
+    _write(tmp_path / "sub" / "c.pdf", "c")
+    _write(tmp_path / "skip.docx", "x")
+    names = [os.path.relpath(p, tmp_path) for p, _, _ in scan_tree(str(tmp_path), {".txt", ".md", ".pdf"})]
+    assert names == ["a.md", "b.txt", os.path.join("sub", "c.pdf")]
+
+def test_manifest_reports_changes_and_skips_unchanged(tmp_path, monkeypatch):
+    root = tmp_path / "rubrics"
+    _write(root / "a.txt", "alpha")
+    _write(root / "b.txt", "beta")
+    m = Manifest(str(tmp_path / "manifest.json"))
+    first = m.refresh(str(root))
+    assert len(first.added) == 2 and first.dirty
+    fp = m.fingerprint([str(root)])
+    m.save()
+
+    hashed = []
+    real_digest = scanner.file_digest
+    monkeypatch.setattr(scanner, "file_digest", lambda p: hashed.append(p) or real_digest(p))
+    m = Manifest(str(tmp_path / "manifest.json"))
+    assert not m.refresh(str(root)).dirty
+    assert hashed == [] and m.fingerprint([str(root)]) == fp
+
+    _write(root / "a.txt", "alpha, revised")
+    (root / "b.txt").unlink()
+    _write(root / "c.txt", "gamma")
+    diff = m.refresh(str(root))
+    assert [os.path.basename(p) for p in diff.changed] == ["a.txt"]
+    assert [os.path.basename(p) for p in diff.added] == ["c.txt"]
+    assert [os.path.basename(p) for p in diff.removed] == ["b.txt"]
+    assert m.fingerprint([str(root)]) != fp
+
+def test_load_dir_with_manifest_matches_plain(tmp_path):
+    root = tmp_path / "questions"
+    _write(root / "q1.txt", "Derive the gradient of the loss. " * 30)
+    _write(root / "nested" / "q2.md", "State the convergence criterion.")
+    plain = _load_dir(str(root), 200, 40, tag="question")
+    with_manifest = _load_dir(str(root), 200, 40, tag="question", manifest=Manifest())
+    assert plain == with_manifest
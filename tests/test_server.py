@@ -0,0 +1,133 @@
+# test_server.py
+import threading
+
+import pytest
+
+import src.server as server_mod
+from src.server import GradingService, call, make_server
+
+class _Grader:
+    corpus = [{}, {}]
+
+    def __init__(self):
+        self.calls = []
+
+    async def agrade_many(self, texts, assignment_hint=None, rubric_allowlist=None, question_allowlist=None):
+        self.calls.append((texts[0], rubric_allowlist, question_allowlist))
+        if texts[0] == "boom":
+            raise RuntimeError("provider down")
+        return [{"result": {"total_score": 80}, "retrieved": []}]
+
+    def stats(self):
+        return {"retrieval_cache": {"hits": 0, "misses": len(self.calls)}}
+
+    def add_file(self, path, tag):
+        self.calls.append(("add_file", threading.current_thread().name))
+        return 3
+
+def _serve(monkeypatch, tmp_path, write_reports=None, **kw):
+    monkeypatch.setattr(server_mod, "list_files", lambda folder: [f"{folder}/r.pdf", f"{folder}/q.pdf"])
+    grader = _Grader()
+    service = GradingService(grader, write_reports, uploads_dir=str(tmp_path / "uploads"),
+                             submissions_dir=str(tmp_path / "subs"))
+    server = make_server(service, port=0, quiet=True, **kw)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return grader, service, server
+
+def _stop(service, server):
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+def test_warm_evaluator_serves_repeated_requests(monkeypatch, tmp_path):
+    grader, service, server = _serve(monkeypatch, tmp_path)
+    port = server.server_address[1]
+    try:
+        for i in range(3):
+            status, reply = call("POST", "/grade", {"rubric": "r.pdf", "question": "q.pdf", "text": f"essay {i}"}, port=port)
+            assert status == 200 and reply["result"]["total_score"] == 80
+        assert grader.calls[-1] == ("essay 2", ["r.pdf"], ["q.pdf"])
+
+        assert call("POST", "/grade", {"rubric": "nope.pdf", "question": "q.pdf", "text": "x"}, port=port)[0] == 404
+        assert call("POST", "/grade", {"rubric": "r.pdf", "question": "q.pdf"}, port=port)[0] == 400
+        status, reply = call("POST", "/grade", {"rubric": "r.pdf", "question": "q.pdf", "text": "boom"}, port=port)
+        assert status == 500 and "provider down" in reply["error"]
+
+        status, health = call("GET", "/health", port=port)
+        assert status == 200 and health["graded"] == 3 and health["failed"] == 1 and health["in_flight"] == 0
+    finally:
+        _stop(service, server)
+
+def test_unix_socket(monkeypatch, tmp_path):
+    sock = str(tmp_path / "grader.sock")
+    _, service, server = _serve(monkeypatch, tmp_path, socket_path=sock)
+    try:
+        status, reply = call("POST", "/grade", {"rubric": "r.pdf", "question": "q.pdf", "text": "hi"}, socket_path=sock)
+        assert status == 200 and "elapsed_s" in reply
+        assert call("GET", "/stats", socket_path=sock)[1]["grader"]["retrieval_cache"]["misses"] == 1
+    finally:
+        _stop(service, server)
+
+def test_reindex_runs_on_the_grading_loop_and_uploads_keep_their_text(monkeypatch, tmp_path):
+    rubrics = tmp_path / "rubrics"
+    rubrics.mkdir()
+    (rubrics / "r.pdf").write_bytes(b"%PDF")
+    monkeypatch.setitem(server_mod.TAG_DIRS, "rubric", str(rubrics))
+    written = []
+    grader, service, server = _serve(monkeypatch, tmp_path, write_reports=lambda text, path, out: written.append(path) or "rep.json")
+    port = server.server_address[1]
+    try:
+        assert call("POST", "/reindex", {"tag": "rubric", "name": "r.pdf"}, port=port) == (200, {"chunks": 3})
+        assert grader.calls[-1] == ("add_file", "grading-loop")  # never alongside a grade's retrieval
+
+        body = {"rubric": "r.pdf", "question": "q.pdf", "text": "my essay", "filename": "../alice.pdf",
+                "write_reports": True}
+        status, reply = call("POST", "/grade", body, port=port)
+        assert status == 200 and reply["report"] == "rep.json"
+        (saved,) = written
+        assert saved.startswith(str(tmp_path / "uploads")) and saved.endswith("alice.txt")
+        assert open(saved).read() == "my essay"
+    finally:
+        _stop(service, server)
+
+def test_paths_are_read_only_under_the_submissions_dir(monkeypatch, tmp_path):
+    subs = tmp_path / "subs"
+    subs.mkdir()
+    (subs / "bob.txt").write_text("bob's essay", encoding="utf-8")
+    (tmp_path / "secret.txt").write_text("api key", encoding="utf-8")
+    (subs / "link.txt").symlink_to(tmp_path / "secret.txt")
+    grader, service, server = _serve(monkeypatch, tmp_path)
+    port = server.server_address[1]
+    body = {"rubric": "r.pdf", "question": "q.pdf"}
+    try:
+        assert call("POST", "/grade", {**body, "path": str(subs / "bob.txt")}, port=port)[0] == 200
+        assert grader.calls[-1][0] == "bob's essay"
+        for outside in (str(tmp_path / "secret.txt"), str(subs / ".." / "secret.txt"), str(subs / "link.txt"), "/etc/passwd"):
+            assert call("POST", "/grade", {**body, "path": outside}, port=port)[0] == 403
+        assert call("POST", "/grade", {**body, "path": str(subs / "missing.txt")}, port=port)[0] == 404
+        assert len(grader.calls) == 1
+    finally:
+        _stop(service, server)
+    text_only = GradingService(_Grader(), submissions_dir="")
+    try:
+        with pytest.raises(server_mod.RequestError) as e:
+            text_only.grade({**body, "path": str(subs / "bob.txt")})
+        assert e.value.status == 403
+    finally:
+        text_only.close()
+
+def test_server_reports_have_their_own_names(monkeypatch, tmp_path):
+    import src.main
+    import src.reporting
+
+    monkeypatch.setattr(src.reporting, "REPORTS_DIR", tmp_path)
+    names = []
+    monkeypatch.setattr(src.main, "write_outputs", lambda grader, idx, *a, **kw: names.append(idx)
+                        or src.reporting.save_report_json(idx, "{}"))
+    write = server_mod._report_writer(object(), no_markdown=True)
+    first = write("essay one", "a.txt", {})
+    assert write("essay one", "b.txt", {}) == first  # same content, same report
+    assert write("essay two", "a.txt", {}) != first
+    assert first.name.startswith("report_server_") and first.parent == tmp_path
+    with pytest.raises(ValueError):
+        src.reporting.save_report_json("../escape", "{}")
@@ -0,0 +1,65 @@
+# test_streaming.py
+import json
+
+from src.grader.stream_json import IncrementalJSONParser
+from src.llm.groq_client import GroqClient
+from src.llm.rate_limiter import RateLimiter
+from src.llm.response_cache import ResponseCache
+
+REPLY = ('```json\n{"total_score": 150, "criteria": [{"name": "Clarity \\"}\\"", "score": 40, "rationale": "ok, fine"},'
+         ' {"name": "Depth", "score": 35, "rationale": "[thin]"}], "overall_feedback": "Solid {mostly}.",'
+         ' "improvable_sections": ["intro"], "plagiarism_or_policy_flags": []}\n```')
+
+def test_parser_emits_fields_as_they_close():
+    p = IncrementalJSONParser()
+    seen = []
+    for i in range(0, len(REPLY), 5):
+        if p.feed(REPLY[i:i + 5]):
+            seen.append((sorted(p.partial), len(p.partial.get("criteria", []))))
+    assert seen[0] == (["total_score"], 0)
+    assert (["criteria", "total_score"], 1) in seen      # first criterion before the second arrives
+    assert p.done and p.partial == json.loads(REPLY[REPLY.index("{"):REPLY.rindex("}") + 1])
+
+class _Resp:
+    status_code = 200
+    headers = {}
+    def __init__(self, lines): self.lines = lines
+    def raise_for_status(self): pass
+    def iter_lines(self, decode_unicode=True): return iter(self.lines)
+    def close(self): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+
+def test_chat_stream_reads_sse_deltas():
+    pieces = [REPLY[i:i + 7] for i in range(0, len(REPLY), 7)]
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': d}}]})}" for d in pieces]
+    usage = {"choices": [], "usage": {"prompt_tokens": 20, "completion_tokens": 80, "total_tokens": 100}}
+    lines = [": keep-alive", ""] + lines + [f"data: {json.dumps(usage)}", "data: [DONE]"]
+    sent = []
+    client = GroqClient("m", max_tokens=900, limiter=RateLimiter(tpm=1000))
+    client.session.post = lambda *a, **kw: sent.append(kw["json"]) or _Resp(lines)
+    assert list(client.chat_stream([{"role": "user", "content": "x"}])) == pieces
+    assert sent[0]["stream_options"] == {"include_usage": True}
+    # Settled from the reported usage: the unused part of the 900+ token reservation is back.
+    assert client.limiter.reserve(850) == 0.0
+
+def test_dropped_stream_is_not_cached(tmp_path):
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': REPLY[:40]}}]})}"]  # connection lost, no [DONE]
+    client = GroqClient("m", limiter=RateLimiter(), cache=ResponseCache(str(tmp_path / "llm.sqlite")))
+    client.session.post = lambda *a, **kw: _Resp(lines)
+    assert list(client.chat_stream([{"role": "user", "content": "x"}])) == [REPLY[:40]]
+    assert len(client.cache) == 0
+    client.session.post = lambda *a, **kw: _Resp(lines + ["data: [DONE]"])
+    list(client.chat_stream([{"role": "user", "content": "x"}]))
+    assert len(client.cache) == 1
+
+def test_grade_stream_partials_then_final(make_evaluator):
+    llm = type("L", (), {"chat_stream": lambda self, m, response_format=None: iter([REPLY[i:i + 4] for i in range(0, len(REPLY), 4)])})()
+    ev = make_evaluator(llm=llm)
+    ev._messages = lambda *a: ([], [], None)
+    events = list(ev.grade_stream("answer"))
+    assert "total_score" in events[0]["partial"]
+    final = events[-1]
+    assert final["result"]["total_score"] == 100.0
+    assert 0 <= final["timings"]["ttfs_s"] <= final["timings"]["total_s"]
+    assert ev.ttfs == [final["timings"]["ttfs_s"]]
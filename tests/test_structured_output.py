@@ -0,0 +1,92 @@
+# test_structured_output.py
+import json
+
+import pytest
+
+from src.grader.structured_output import CriterionReply, GradingReply, StructuredOutput, check_reply
+from src.llm.groq_client import GroqClient
+from src.llm.rate_limiter import RateLimiter
+
+GOOD = {"total_score": 72, "criteria": [{"name": "Clarity", "score": 70, "rationale": "clear"}],
+        "overall_feedback": "Fine.", "improvable_sections": [], "plagiarism_or_policy_flags": []}
+
+def test_check_reply_names_invalid_fields():
+    assert check_reply("```json\n" + json.dumps(GOOD) + "\n```", GradingReply).ok
+    bad = {**GOOD, "criteria": [{"name": "Clarity", "score": "high"}]}
+    del bad["overall_feedback"]
+    checked = check_reply(json.dumps(bad), GradingReply)
+    assert checked.parsed and checked.invalid == ["criteria", "overall_feedback"]
+    assert check_reply("I think it deserves a B.", CriterionReply).invalid == ["score", "rationale", "improvable_sections"]
+
+class _LLM:
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    def chat(self, messages, max_tokens=None, response_format=None):
+        self.calls.append((messages, max_tokens, response_format))
+        return self.replies.pop(0)
+
+def _evaluator(make_evaluator, replies):
+    ev = make_evaluator(llm=_LLM(replies), structured=StructuredOutput(mode="json_schema", repair_max_tokens=120))
+    ev._messages = lambda *a: ([{"role": "user", "content": "grade this"}], [], None)
+    return ev
+
+def test_only_invalid_fields_are_repaired(make_evaluator):
+    partial = {k: v for k, v in GOOD.items() if k != "overall_feedback"}
+    ev = _evaluator(make_evaluator, [json.dumps(partial), '{"overall_feedback": "Needs more depth."}'])
+    out = ev.grade("answer")
+    assert out["result"]["total_score"] == 72.0
+    assert out["result"]["overall_feedback"] == "Needs more depth."
+    (first, _, fmt), (repair, max_tokens, repair_fmt) = ev.llm.calls
+    assert fmt["type"] == "json_schema" and "criteria" in fmt["json_schema"]["schema"]["properties"]
+    assert max_tokens == 120 and repair_fmt == {"type": "json_object"}
+    assert "overall_feedback" in repair[-1]["content"] and "total_score" not in repair[-1]["content"]
+    assert ev.structured.stats()["repair_rate"] == 1.0
+
+def test_failed_repair_keeps_the_original_reply(make_evaluator):
+    ev = _evaluator(make_evaluator, ["not json at all", "still not json"])
+    out = ev.grade("answer")
+    assert out["result"]["plagiarism_or_policy_flags"] == ["JSON_PARSE_ERROR"]
+    stats = ev.structured.stats()
+    assert stats["parse_failures"] == 1 and stats["repairs"] == 1 and stats["repaired"] == 0
+
+class _Resp:
+    def __init__(self, status, body):
+        self.status_code, self._body, self.headers = status, body, {}
+    def json(self): return self._body
+    @property
+    def text(self): return json.dumps(self._body)
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+def test_client_drops_rejected_response_format():
+    sent = []
+    def post(url, json=None, **kw):
+        sent.append(json)
+        if "response_format" in json:
+            return _Resp(400, {"error": "response_format not supported"})
+        return _Resp(200, {"choices": [{"message": {"content": "{}"}}]})
+    client = GroqClient("m", limiter=RateLimiter(), max_retries=0)
+    client.session.post = post
+    fmt = StructuredOutput().response_format(GradingReply)
+    assert client.chat([{"role": "user", "content": "x"}], response_format=fmt) == "{}"
+    assert client.chat([{"role": "user", "content": "y"}], response_format=fmt) == "{}"
+    assert ["response_format" in s for s in sent] == [True, False, False]
+
+def test_only_format_errors_disable_structured_output():
+    acquired = []
+    limiter = RateLimiter()
+    limiter.acquire = acquired.append
+    replies = iter([_Resp(400, {"error": "context_length_exceeded"}),
+                    _Resp(400, {"error": "json_schema is not supported by this model"}),
+                    _Resp(200, {"choices": [{"message": {"content": "{}"}}]})])
+    client = GroqClient("m", limiter=limiter, max_retries=0)
+    client.session.post = lambda url, **kw: next(replies)
+    fmt = StructuredOutput().response_format(GradingReply)
+    with pytest.raises(RuntimeError):
+        client.chat([{"role": "user", "content": "x"}], response_format=fmt)
+    assert client.structured                    # an unrelated 400 keeps structured output on
+    assert client.chat([{"role": "user", "content": "x"}], response_format=fmt) == "{}"
+    assert not client.structured and len(acquired) == 3  # the re-post waited on the limiter too
@@ -0,0 +1,80 @@
+# test_tfidf_incremental.py
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from src.rag.retriever_tfidf import TfidfRetriever
+from src.rag.vector_store import TfidfStore
+
+def _doc(i, path, text, tag="rubric"):
+    return {"id": f"{tag}-{i}", "text": text, "meta": {"path": path, "type": tag}}
+
+BASE = [
+    _doc(0, "rubric/a.txt", "Explain gradient descent and the learning rate."),
+    _doc(1, "rubric/a.txt", "Discuss convergence of the loss function."),
+    _doc(2, "question/q.txt", "Derive the update rule for linear regression.", tag="question"),
+]
+NEW = [_doc(3, "rubric/b.txt", "Cite sources and discuss regularization.")]
+
+def _ranked(r, q):
+    return [(round(s, 8), d["id"]) for s, d in r.search(q, k=10)]
+
+def test_add_matches_full_build():
+    inc = TfidfRetriever(BASE)
+    v0 = inc.version
+    inc.add_documents(NEW)
+    assert inc.version > v0
+    full = TfidfRetriever(BASE + NEW)
+    assert np.array_equal(inc.df, full.df)
+    assert _ranked(inc, "regularization learning rate") == _ranked(full, "regularization learning rate")
+
+def test_scores_match_fitted_tfidf_cosine():
+    # The vectorizer the hashed index replaced; scores must be its cosine similarities.
+    docs = BASE + NEW + [_doc(5, "rubric/c.txt", "Gradient descent: gradient steps scale with the learning rate rate.")]
+    fitted = TfidfVectorizer(strip_accents="unicode", lowercase=True, stop_words="english", ngram_range=(1, 2))
+    matrix = fitted.fit_transform(d["text"] for d in docs)
+    r = TfidfRetriever(docs[:3])
+    r.add_documents(docs[3:5])
+    r.add_documents(docs[5:])
+    for q in ["gradient descent learning rate", "discuss convergence regularization", "rate"]:
+        sims = cosine_similarity(fitted.transform([q]), matrix)[0]
+        expected = [(round(float(sims[i]), 8), docs[i]["id"]) for i in sorted(range(len(docs)), key=lambda i: (-sims[i], i))]
+        assert _ranked(r, q) == expected
+        assert np.allclose(r._scores(q), sims)
+
+def test_remove_and_update_by_path():
+    r = TfidfRetriever(BASE + NEW)
+    assert r.remove_documents("rubric/a.txt") == 2
+    assert _ranked(r, "gradient convergence") == _ranked(TfidfRetriever([BASE[2]] + NEW), "gradient convergence")
+
+    r.update_documents("rubric/b.txt", [_doc(4, "rubric/b.txt", "Plagiarism policy applies.")])
+    assert [d["id"] for d in r.docs] == ["question-2", "rubric-4"]
+    assert r.search("plagiarism", k=1)[0][1]["id"] == "rubric-4"
+    assert r.df.sum() == TfidfRetriever(r.docs).df.sum()
+
+def test_loaded_index_accepts_updates(tmp_path):
+    TfidfRetriever(BASE).save(str(tmp_path / "idx"))
+    r = TfidfRetriever.load(str(tmp_path / "idx"))
+    r.add_documents(NEW)
+    assert _ranked(r, "cite sources") == _ranked(TfidfRetriever(BASE + NEW), "cite sources")
+
+def test_store_incremental():
+    s = TfidfStore(persist_path="unused.pkl")
+    s.add_documents([("notes/a.txt::chunk_0", "gradient descent notes")])
+    s.add_documents([("notes/b.txt::chunk_0", "bayesian inference notes")])
+    assert s.search("bayesian", k=1)[0][0] == "notes/b.txt::chunk_0"
+    assert s.remove_documents("notes/b.txt") == 1
+    assert [h[0] for h in s.search("bayesian", k=5)] == ["notes/a.txt::chunk_0"]
+
+def test_updates_leave_existing_rows_alone():
+    r = TfidfRetriever([_doc(i, f"rubric/f{i}.txt", f"topic{i} words") for i in range(64)])
+    base = r.segments[0].tf
+    r.add_documents(NEW)
+    assert r.remove_documents("rubric/f5.txt") == 1
+    assert r.segments[0].tf is base and not r.segments[0].alive[5]  # tombstoned, not copied
+    assert r.search_partitioned("topic5 words", k=1, filters={"type": "rubric"})[0][1]["id"] != "rubric-5"
+
+    for i in range(100):
+        r.add_documents([_doc(100 + i, f"rubric/n{i}.txt", f"fresh{i}")])
+    assert len(r.segments) <= 2 * np.log2(r.n_docs)
+    assert r.search("fresh42", k=1)[0][1]["id"] == "rubric-142"
+    assert len(r.docs) == r.n_docs == 164
@@ -0,0 +1,68 @@
+# test_token_budget.py
+from src.grader import grade_evaluator
+from src.grader.token_budget import SEGMENT_SEPARATOR, allocate, budget_prompt, fit_context, fit_submission
+from src.utils.tokens import estimate_tokens
+
+def _hit(i, n_chars):
+    return (1.0 / (i + 1), {"id": f"rubric-{i}", "text": "x" * n_chars, "meta": {"path": f"r{i}.md", "type": "rubric"}})
+
+def test_allocate_hands_slack_to_the_other_side():
+    a = allocate(1000, 200, context_wanted=100, submission_wanted=5000, context_share=0.5)
+    assert (a.context, a.submission) == (100, 700)
+    a = allocate(1000, 200, context_wanted=5000, submission_wanted=100, context_share=0.5)
+    assert (a.context, a.submission) == (700, 100)
+    a = allocate(100, 500, 10, 10, 0.5)
+    assert (a.context, a.submission) == (0, 0)
+
+def test_fit_context_keeps_rank_order_and_drops_the_rest():
+    hits = [_hit(0, 400), _hit(1, 4000), _hit(2, 400)]
+    included, dropped = fit_context(hits, 300)
+    assert [d["id"] for _, d in included] == ["rubric-0", "rubric-2"]
+    assert [d["id"] for _, d in dropped] == ["rubric-1"]
+
+def test_fit_submission_keeps_opening_and_relevant_segments():
+    filler = "Unrelated notes about the weather and the commute to campus this week. "
+    text = ("Introduction to my answer on optimisation. " + filler * 20
+            + filler * 20
+            + "The gradient follows from the chain rule applied to the loss function. " + filler * 14
+            + filler * 30)
+    out, spans, n_dropped = fit_submission(text, 700, "gradient chain rule loss")
+    assert out.startswith("Introduction") and "chain rule" in out
+    assert SEGMENT_SEPARATOR in out and n_dropped > 0
+    assert estimate_tokens(out) <= 700
+    assert spans == sorted(spans) and spans[0][0] == 0
+    assert fit_submission("short", 10, "q") == ("short", [(0, 5)], 0)
+
+def test_fit_submission_never_trades_the_opening_away():
+    text = "Opening words. " * 90 + "Final point on gradients."  # a full first segment, a short last one
+    out, spans, _ = fit_submission(text, 100, "gradients")    # only the last segment would fit whole
+    assert out.startswith("Opening words.") and spans == [(0, spans[0][1])]
+    assert estimate_tokens(out) <= 100
+
+def test_budget_prompt_respects_the_window():
+    hits = [_hit(i, 2000) for i in range(5)]
+    text = "A sentence about gradients and step sizes. " * 400
+    kept, sub, report = budget_prompt("system " * 400, hits, text, "gradient", budget=2000, context_share=0.5)
+    assert not report.over_budget
+    assert len(kept) == 1 and len(report.context_dropped) == 4
+    d = report.to_dict()
+    assert d["submission"]["truncated"] and d["submission"]["tokens_kept"] == estimate_tokens(sub)
+
+def test_evaluator_records_budget(monkeypatch, make_evaluator):
+    monkeypatch.setattr(grade_evaluator, "PROMPT_TOKEN_BUDGET", 2500)
+    docs = [{"id": f"rubric-{i}", "text": f"Rubric criterion {i}: " + "explain clearly. " * 40,
+             "meta": {"path": f"rubric/r{i}.md", "type": "rubric"}} for i in range(4)]
+    docs += [{"id": f"question-{i}", "text": f"Question part {i} on the criterion. " + "background. " * 120,
+              "meta": {"path": f"question/q{i}.md", "type": "question"}} for i in range(2)]
+    ev = make_evaluator(docs)
+    ev.compiled_rubric = lambda allowlist: None
+
+    messages, hits, report = ev._messages("My answer explains the criterion. " * 300, "criterion", None, None)
+    assert report is not None and not report.over_budget
+    # Uncompiled, the rubric chunks are the rubric: all kept; only reference context is traded away.
+    assert sorted(report.context_pinned) == [f"rubric-{i}" for i in range(4)]
+    assert report.context_dropped and all(h.startswith("question") for h in report.context_dropped)
+    assert len(hits) == 4 + len(report.context_included)
+    assert estimate_tokens(messages[0]["content"] + messages[1]["content"]) <= 2500
+    out = ev._finish('{"total_score": 50}', hits, budget=report)
+    assert out["budget"]["context"]["dropped"] == report.context_dropped
@@ -0,0 +1,78 @@
+# test_watcher.py
+import asyncio
+import threading
+import time
+
+from src.batch import BatchState
+from src.watcher import Debouncer, SubmissionWatcher, is_submission
+
+def test_debouncer_waits_for_quiet_file(tmp_path):
+    p = tmp_path / "a.txt"
+    p.write_text("part")
+    d = Debouncer(quiet_s=1.0)
+    d.touch(str(p), now=0.0)
+    assert d.ready(now=0.0) == []           # first look records the size
+    p.write_text("partial but longer")
+    assert d.ready(now=0.9) == []           # still growing: the clock restarts
+    assert d.ready(now=1.5) == []
+    assert d.ready(now=2.0) == [str(p)] and len(d) == 0
+    assert not is_submission(str(tmp_path / ".a.txt.Xy12")) and not is_submission("x.pdf.part")
+
+def test_watcher_grades_new_files_once(tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    (inbox / "early.txt").write_text("answer early")
+    graded, events = [], []
+
+    async def grade(text):
+        await asyncio.sleep(0.01)
+        return {"text": text}
+
+    watcher = SubmissionWatcher(
+        str(inbox), BatchState(str(tmp_path / "state.json")), grade,
+        lambda path, text, out: graded.append(out["text"]), quiet_s=0.1, poll_s=0.05,
+        on_event=lambda path, status, latency, error: events.append(status),
+    )
+
+    def drop_files():
+        time.sleep(0.3)
+        (inbox / "late.txt").write_text("answer late")
+        (inbox / "copy.txt").write_text("answer late")      # same content under another name
+        (inbox / "notes.txt.part").write_text("ignored")
+        deadline = time.time() + 5
+        while len(graded) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.3)
+        watcher.stop()
+
+    threading.Thread(target=drop_files).start()
+    asyncio.run(asyncio.wait_for(watcher.run(), timeout=10))
+    assert sorted(graded) == ["answer early", "answer late"]
+    assert events == ["done", "done"] and watcher.state.counts()["done"] == 2
+
+def test_unreadable_file_is_retried_then_dead_lettered(tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    (inbox / "broken.pdf").write_bytes(b"not a pdf")
+    events = []
+
+    async def grade(text):
+        raise AssertionError("nothing readable to grade")
+
+    watcher = SubmissionWatcher(
+        str(inbox), BatchState(str(tmp_path / "state.json"), max_attempts=2), grade, lambda *a: None,
+        quiet_s=0.05, poll_s=0.02, retry_delay_s=0.05,
+        on_event=lambda path, status, latency, error: events.append((status, error)),
+    )
+
+    def stop_when_settled():
+        deadline = time.time() + 5
+        while not (events and events[-1][0] == "dead") and time.time() < deadline:
+            time.sleep(0.02)
+        watcher.stop()
+
+    threading.Thread(target=stop_when_settled).start()
+    asyncio.run(asyncio.wait_for(watcher.run(), timeout=10))
+    assert [status for status, _ in events] == ["failed", "dead"]
+    assert all("could not extract" in error for _, error in events)
+    assert watcher.queued == set()  # settled: not stuck as in flight